@@ -1,27 +1,150 @@
 import psycopg2
-from psycopg2.extras import RealDictCursor
 import os
+import threading
+
+from .utils.metrics import TrackedCursor, record_connection
+
+# Connections kept open per process; 0 opens a fresh connection per call.
+# backend.server sets this from each worker's share of max_connections.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "0"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+
+def connect(dsn: str):
+    # TrackedCursor returns dict rows like RealDictCursor and feeds /api/metrics
+    record_connection()
+    return psycopg2.connect(dsn, cursor_factory=TrackedCursor)
+
+class PooledConnection:
+    """
+    Wraps a pooled psycopg2 connection; close() hands it back instead of
+    closing it. Handlers that raise before closing still free their slot
+    when the wrapper is garbage collected.
+    """
+
+    def __init__(self, pool, conn):
+        object.__setattr__(self, "_pool", pool)
+        object.__setattr__(self, "_conn", conn)
+
+    def __getattr__(self, name):
+        conn = self.__dict__["_conn"]
+        if conn is None:
+            if name == "closed":
+                return 1
+            raise psycopg2.InterfaceError("connection already closed")
+        return getattr(conn, name)
+
+    def __setattr__(self, name, value):
+        # e.g. conn.autocommit = True
+        setattr(self._conn, name, value)
+
+    def close(self):
+        conn = self._conn
+        if conn is not None:
+            object.__setattr__(self, "_conn", None)
+            self._pool.put(conn)
+
+    def __del__(self):
+        conn = self.__dict__.get("_conn")
+        if conn is not None:
+            object.__setattr__(self, "_conn", None)
+            # No I/O from a finalizer: drop the connection rather than reset it
+            self._pool.discard(conn)
+
+class ConnectionPool:
+    def __init__(self, dsn: str, size: int, timeout: float = DB_POOL_TIMEOUT):
+        self.dsn = dsn
+        self.size = size
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(size)
+        self.idle = []
+        self.lock = threading.Lock()
+        self.closed = False
+        self.pid = os.getpid()
+
+    def get(self):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise psycopg2.OperationalError(f"No database connection free after {self.timeout:g}s")
+        try:
+            with self.lock:
+                conn = self.idle.pop() if self.idle else None
+            if conn is None or conn.closed:
+                conn = connect(self.dsn)
+        except Exception:
+            self.slots.release()
+            raise
+        return PooledConnection(self, conn)
+
+    def put(self, conn):
+        try:
+            if not conn.closed and not self.closed:
+                # Back to a clean session: no open transaction, advisory locks,
+                # temp tables or SET values leak into the next borrower
+                conn.rollback()
+                conn.autocommit = True
+                cur = conn.cursor()
+                cur.execute("DISCARD ALL")
+                cur.close()
+                conn.autocommit = False
+                with self.lock:
+                    self.idle.append(conn)
+                conn = None
+        except psycopg2.Error:
+            pass
+        finally:
+            if conn is not None and not conn.closed:
+                conn.close()
+            self.slots.release()
+
+    def discard(self, conn):
+        try:
+            conn.close()
+        finally:
+            self.slots.release()
+
+    def close(self):
+        self.closed = True
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            conn.close()
+
+_pools = {}
+_pool_lock = threading.Lock()
+
+def get_pool(dsn: str):
+    with _pool_lock:
+        pool = _pools.get(dsn)
+        # Never share sockets with a parent process that forked us
+        if pool is None or pool.pid != os.getpid():
+            pool = _pools[dsn] = ConnectionPool(dsn, DB_POOL_SIZE)
+        return pool
+
+def close_pool():
+    with _pool_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+def connect_to(dsn: str):
+    """Connection to dsn, pooled when DB_POOL_SIZE is set"""
+    if DB_POOL_SIZE > 0:
+        return get_pool(dsn).get()
+    return connect(dsn)
 
 def get_connection():
     DATABASE_URL = os.getenv("DATABASE_URL")
     if not DATABASE_URL:
         raise ValueError("DATABASE_URL environment variable not set")
     
-    return psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
+    return connect_to(DATABASE_URL)
 
 def init_database():
-    conn = get_connection()
-    cur = conn.cursor()
-    
-    # Create tables if they don't exist
-    with open('database/schema.sql', 'r') as f:
-        sql = f.read()
-        cur.execute(sql)
-    
-    conn.commit()
-    cur.close()
-    conn.close()
+    # Apply any migrations from database/migrations that have not run yet
+    from .migrations import migrate
+    migrate()
     print("Database initialized successfully")
 
 if __name__ == "__main__":
+    # Run with: python -m backend.database
     init_database()
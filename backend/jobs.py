@@ -0,0 +1,293 @@
+import argparse
+import logging
+import os
+import signal
+import threading
+
+from .database import get_connection
+from .utils import cloudinary, events, idempotency, partitions, rate_limit, referrals, storage_gc, telegram, user_stats
+from .utils.events import event_bus
+from .utils.job_queue import JOB_WORKER_THREADS, RetryLater, job_queue
+from .utils.scheduler import SCHEDULER_TIMEZONE, scheduler
+
+logger = logging.getLogger(__name__)
+
+TASK_EXPIRY_INTERVAL = float(os.getenv("TASK_EXPIRY_INTERVAL", "60"))
+TASK_COUNTERS_INTERVAL = float(os.getenv("TASK_COUNTERS_INTERVAL", "60"))
+# Submissions newer than this are recounted on every run rather than settled,
+# so a submit whose transaction commits late isn't skipped by the watermark
+TASK_COUNTERS_SETTLE_LAG = 600
+TASK_COUNTERS_WATERMARK = "task_counters"
+USER_STATS_CHECK_INTERVAL = float(os.getenv("USER_STATS_CHECK_INTERVAL", "3600"))
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "0") == "1"
+IDEMPOTENCY_PURGE_INTERVAL = float(os.getenv("IDEMPOTENCY_PURGE_INTERVAL", "3600"))
+REFERRAL_SETTLEMENT_INTERVAL = float(os.getenv("REFERRAL_SETTLEMENT_INTERVAL", "300"))
+STORAGE_GC_INTERVAL = float(os.getenv("STORAGE_GC_INTERVAL", "60"))
+RATE_LIMIT_PURGE_INTERVAL = float(os.getenv("RATE_LIMIT_PURGE_INTERVAL", "600"))
+
+
+@scheduler.job(cron="0 0 * * *")
+def reset_daily_counters():
+    """
+    Zero micro_jobs.today_submissions at local midnight
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("UPDATE micro_jobs SET today_submissions = 0 WHERE today_submissions <> 0")
+    logger.info(f"Reset daily counters on {cur.rowcount} tasks")
+    # Keep yesterday's per-user counters for requests straddling midnight
+    cur.execute("""
+        DELETE FROM user_task_counters
+        WHERE day < (NOW() AT TIME ZONE %s)::date - 1
+    """, (SCHEDULER_TIMEZONE,))
+    conn.commit()
+    cur.close()
+    conn.close()
+
+
+@scheduler.job(interval=TASK_EXPIRY_INTERVAL)
+def expire_tasks():
+    """
+    Mark active tasks past expires_at as expired
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        UPDATE micro_jobs SET status = 'expired'
+        WHERE status = 'active' AND expires_at <= NOW()
+        RETURNING task_id
+    """)
+    expired = [row['task_id'] for row in cur.fetchall()]
+    for task_id in expired:
+        events.notify(cur, events.TASK_CHANGED, task_id=task_id)
+    conn.commit()
+    cur.close()
+    conn.close()
+    if expired:
+        logger.info(f"Expired {len(expired)} tasks")
+
+
+@scheduler.job(interval=TASK_COUNTERS_INTERVAL)
+def refresh_task_counters():
+    """
+    Bring total/today submission counters of active tasks up to date, writing
+    only the rows that drifted. Submissions older than the watermark are
+    folded into settled_submissions once; each run reads only those since
+    the previous watermark and today's, both found through created_at
+    partitions and index.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO settlement_watermarks (name, last_processed_at, last_id)
+        VALUES (%s, 'epoch', 0)
+        ON CONFLICT (name) DO NOTHING
+    """, (TASK_COUNTERS_WATERMARK,))
+    # Row lock serialises overlapping runs
+    cur.execute("""
+        SELECT last_processed_at as settled_to, (NOW() - make_interval(secs => %s))::timestamp as settle_to
+        FROM settlement_watermarks WHERE name = %s FOR UPDATE
+    """, (TASK_COUNTERS_SETTLE_LAG, TASK_COUNTERS_WATERMARK))
+    bounds = cur.fetchone()
+    params = {"tz": SCHEDULER_TIMEZONE, "settled_to": bounds['settled_to'], "settle_to": bounds['settle_to']}
+    if bounds['settle_to'] > bounds['settled_to']:
+        cur.execute("""
+            UPDATE micro_jobs mj
+            SET settled_submissions = mj.settled_submissions + s.submissions
+            FROM (
+                SELECT task_id, COUNT(*) as submissions FROM task_submissions
+                WHERE created_at >= %(settled_to)s AND created_at < %(settle_to)s
+                GROUP BY task_id
+            ) s
+            WHERE mj.task_id = s.task_id
+        """, params)
+        cur.execute("""
+            UPDATE settlement_watermarks SET last_processed_at = %s, updated_at = NOW() WHERE name = %s
+        """, (bounds['settle_to'], TASK_COUNTERS_WATERMARK))
+    cur.execute("""
+        WITH today AS (
+            SELECT date_trunc('day', NOW() AT TIME ZONE %(tz)s) AT TIME ZONE %(tz)s as start
+        )
+        UPDATE micro_jobs mj
+        SET total_submissions = c.total, today_submissions = c.today
+        FROM (
+            SELECT a.task_id,
+                   a.settled_submissions + COALESCE(r.recent, 0) as total,
+                   COALESCE(r.today, 0) as today
+            FROM micro_jobs a
+            LEFT JOIN (
+                SELECT ts.task_id,
+                       COUNT(*) FILTER (WHERE ts.created_at >= %(settle_to)s) as recent,
+                       COUNT(*) FILTER (WHERE ts.created_at >= today.start) as today
+                FROM task_submissions ts, today
+                WHERE ts.created_at >= LEAST(%(settle_to)s, today.start)
+                GROUP BY ts.task_id
+            ) r ON r.task_id = a.task_id
+            WHERE a.status = 'active'
+        ) c
+        WHERE mj.task_id = c.task_id
+          AND (mj.total_submissions, mj.today_submissions) IS DISTINCT FROM (c.total, c.today)
+    """, params)
+    if cur.rowcount:
+        logger.info(f"Refreshed submission counters on {cur.rowcount} tasks")
+    conn.commit()
+    cur.close()
+    conn.close()
+
+
+@scheduler.job(cron="0 3 * * *")
+def ensure_partitions():
+    """
+    Keep task_submissions partitions created ahead of time
+    """
+    created = partitions.ensure_partitions()
+    if created:
+        logger.info(f"Created {created} task_submissions partitions")
+
+
+@scheduler.job(interval=IDEMPOTENCY_PURGE_INTERVAL)
+def purge_idempotency_keys():
+    """
+    Delete Idempotency-Key results older than IDEMPOTENCY_TTL_HOURS
+    """
+    deleted = idempotency.purge_expired()
+    if deleted:
+        logger.info(f"Purged {deleted} expired idempotency keys")
+
+
+@scheduler.job(interval=RATE_LIMIT_PURGE_INTERVAL)
+def purge_rate_limits():
+    """
+    Delete rate limit counters for windows that are long over
+    """
+    rate_limit.purge_expired()
+
+
+@scheduler.job(interval=USER_STATS_CHECK_INTERVAL)
+def check_user_stats():
+    """
+    Recount user_stats in batches and repair rows the write paths missed
+    """
+    drifted = user_stats.check_consistency()
+    if drifted:
+        logger.warning(f"Repaired user_stats for {drifted} users")
+
+
+@scheduler.job(interval=REFERRAL_SETTLEMENT_INTERVAL)
+def settle_referrals():
+    """
+    Credit referral bonuses for friends' first completed withdrawals
+    """
+    def notify_referrers(cur, credited):
+        for row in credited:
+            friends = "friend" if row['referrals'] == 1 else "friends"
+            job_queue.enqueue(cur, NOTIFY_USER, {
+                "user_id": row['user_id'],
+                "text": f"🎁 ৳{row['total']} referral bonus: {row['referrals']} {friends} completed "
+                        f"their first withdrawal.",
+            })
+
+    referrals.settle(on_credit=notify_referrers)
+
+
+@scheduler.job(interval=STORAGE_GC_INTERVAL)
+def collect_screenshots():
+    """
+    Delete Cloudinary screenshots of rejected and long-approved submissions,
+    as many as the GC's call rate allows right now
+    """
+    summary = storage_gc.collect(max_seconds=storage_gc.CLOUDINARY_GC_MAX_SECONDS, wait=False)
+    # Running out of tokens is the normal end of a run while there's a backlog
+    if summary["stopped"] not in (None, "paced"):
+        logger.info(f"Screenshot GC stopped early: {summary['stopped']}")
+
+
+if ARCHIVE_ENABLED:
+    scheduler.add_job("archive_partitions", partitions.archive_partitions, cron="30 3 1 * *")
+
+
+# Queued jobs: enqueued by request handlers with job_queue.enqueue(cur, kind, payload)
+
+NOTIFY_USER = "telegram.notify_user"
+DELETE_SCREENSHOTS = "cloudinary.delete_screenshots"
+
+
+@job_queue.handler(NOTIFY_USER, max_attempts=8, priority=50)
+def notify_user(payload: dict):
+    """
+    Send payload["text"] to the Telegram chat of user payload["user_id"]
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT telegram_id FROM users WHERE id = %s", (payload["user_id"],))
+    user = cur.fetchone()
+    cur.close()
+    conn.close()
+    if not user:
+        return
+    try:
+        telegram.send_message(user['telegram_id'], payload["text"])
+    except telegram.TelegramError as e:
+        if e.permanent:
+            logger.warning(f"Not notifying user {payload['user_id']}: {e}")
+            return
+        if e.retry_after:
+            raise RetryLater(e.retry_after, str(e))
+        raise
+
+
+@job_queue.handler(DELETE_SCREENSHOTS, max_attempts=10, priority=200)
+def delete_screenshots(payload: dict):
+    """
+    Remove up to 100 screenshots (payload["public_ids"]) from Cloudinary
+    """
+    cloudinary.delete_screenshots(payload["public_ids"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scheduled maintenance jobs")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="show jobs and their last run")
+    run = sub.add_parser("run", help="run a job now")
+    run.add_argument("name", choices=sorted(scheduler.jobs))
+    run.add_argument("--force", action="store_true", help="run even if another worker just did")
+    work = sub.add_parser("work", help="drain the job queue until interrupted")
+    work.add_argument("--threads", type=int, default=max(JOB_WORKER_THREADS, 1))
+    sub.add_parser("queue", help="show queued and dead jobs per kind")
+    retry = sub.add_parser("retry-dead", help="requeue dead jobs")
+    retry.add_argument("--kind", choices=sorted(job_queue.handlers))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "run":
+        print(f"{args.name}: {scheduler.run_job(args.name, force=args.force)}")
+    elif args.command == "work":
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        job_queue.attach(event_bus)
+        event_bus.start()
+        job_queue.start(args.threads)
+        logger.info(f"Working the job queue with {args.threads} threads")
+        try:
+            stop.wait()
+        except KeyboardInterrupt:
+            pass
+        # Finishes the batches in hand before exiting
+        job_queue.stop()
+        event_bus.stop()
+    elif args.command == "queue":
+        for row in job_queue.stats():
+            print(f"{row['kind']:32} ready {row['ready']:6} scheduled {row['scheduled']:6} "
+                  f"running {row['running']:6} dead {row['dead']:6}")
+    elif args.command == "retry-dead":
+        print(f"Requeued {job_queue.retry_dead(args.kind)} jobs")
+    else:
+        for job in scheduler.status():
+            last = f"{job['last_status']} at {job['last_started_at']:%Y-%m-%d %H:%M} ({job['last_duration_ms']} ms)" \
+                if job.get('last_started_at') else "never run"
+            print(f"{job['name']:24} {job['schedule']:32} {last}")
+
+
+if __name__ == "__main__":
+    # Run with: python -m backend.jobs list|run <job>|work|queue|retry-dead
+    main()
@@ -0,0 +1,163 @@
+import argparse
+import hashlib
+import os
+import re
+import time
+
+import psycopg2.extensions
+
+from .database import get_connection
+
+# Repository paths
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MIGRATIONS_DIR = os.path.join(ROOT_DIR, "database", "migrations")
+SEED_FILE = os.path.join(ROOT_DIR, "database", "init_data.sql")
+
+# Arbitrary key so only one process migrates at a time
+MIGRATION_LOCK_ID = 720331
+
+NO_TRANSACTION_MARKER = "-- migrate: no-transaction"
+_FILENAME = re.compile(r"^(\d+)_(\w+)\.sql$")
+_INDEX_NAME = re.compile(r"INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)", re.IGNORECASE)
+
+
+def load_migrations():
+    """
+    Migration files as (version, name, sql, checksum), ordered by version
+    """
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = _FILENAME.match(filename)
+        if not match:
+            continue
+        with open(os.path.join(MIGRATIONS_DIR, filename), "r") as f:
+            sql = f.read()
+        checksum = hashlib.sha256(sql.encode()).hexdigest()
+        migrations.append((int(match.group(1)), match.group(2), sql, checksum))
+    return migrations
+
+
+def split_statements(sql: str):
+    # Only used for no-transaction files, which must not contain function bodies
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    return [s.strip() for s in "\n".join(lines).split(";") if s.strip()]
+
+
+def _ensure_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR(200) NOT NULL,
+            checksum VARCHAR(64) NOT NULL,
+            duration_ms INTEGER,
+            applied_at TIMESTAMP DEFAULT NOW()
+        )
+    """)
+
+
+def _drop_invalid_index(cur, statement: str):
+    # A failed CREATE INDEX CONCURRENTLY leaves an INVALID index behind that
+    # IF NOT EXISTS would silently keep; drop it so the build is retried
+    match = _INDEX_NAME.search(statement)
+    if not match or not statement.lstrip().upper().startswith("CREATE"):
+        return
+    cur.execute("""
+        SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s AND NOT i.indisvalid
+    """, (match.group(1),))
+    if cur.fetchone():
+        print(f"  dropping invalid index {match.group(1)}")
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {match.group(1)}")
+
+
+def migrate(target: int = None, seed: bool = False):
+    """
+    Apply pending migrations in order and record them in schema_migrations
+    """
+    conn = get_connection()
+    conn.autocommit = True
+    cur = conn.cursor(cursor_factory=psycopg2.extensions.cursor)
+    cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+    try:
+        _ensure_table(cur)
+        cur.execute("SELECT version, checksum FROM schema_migrations")
+        applied = dict(cur.fetchall())
+
+        for version, name, sql, checksum in load_migrations():
+            if target is not None and version > target:
+                break
+            if version in applied:
+                if applied[version] != checksum:
+                    print(f"Warning: migration {version}_{name} changed after it was applied")
+                continue
+
+            print(f"Applying {version:03d}_{name}")
+            started = time.perf_counter()
+            if sql.lstrip().startswith(NO_TRANSACTION_MARKER):
+                # CREATE INDEX CONCURRENTLY cannot run inside a transaction;
+                # each statement is idempotent so a partial run can be resumed
+                for statement in split_statements(sql):
+                    _drop_invalid_index(cur, statement)
+                    cur.execute(statement)
+                cur.execute("""
+                    INSERT INTO schema_migrations (version, name, checksum, duration_ms)
+                    VALUES (%s, %s, %s, %s)
+                """, (version, name, checksum, int((time.perf_counter() - started) * 1000)))
+            else:
+                conn.autocommit = False
+                try:
+                    cur.execute(sql)
+                    cur.execute("""
+                        INSERT INTO schema_migrations (version, name, checksum, duration_ms)
+                        VALUES (%s, %s, %s, %s)
+                    """, (version, name, checksum, int((time.perf_counter() - started) * 1000)))
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    conn.autocommit = True
+            print(f"  done in {time.perf_counter() - started:.2f}s")
+
+        if seed:
+            with open(SEED_FILE, "r") as f:
+                cur.execute(f.read())
+            print("Seed data loaded")
+    finally:
+        cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+        cur.close()
+        conn.close()
+
+
+def status():
+    conn = get_connection()
+    cur = conn.cursor()
+    _ensure_table(cur)
+    conn.commit()
+    cur.execute("SELECT version, applied_at, duration_ms FROM schema_migrations")
+    applied = {row['version']: row for row in cur.fetchall()}
+    cur.close()
+    conn.close()
+
+    for version, name, _, _ in load_migrations():
+        row = applied.get(version)
+        state = f"applied {row['applied_at']:%Y-%m-%d %H:%M} ({row['duration_ms']} ms)" if row else "pending"
+        print(f"{version:03d}_{name:40} {state}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply database migrations")
+    parser.add_argument("--target", type=int, help="stop after this version")
+    parser.add_argument("--seed", action="store_true", help="load database/init_data.sql afterwards")
+    parser.add_argument("--status", action="store_true", help="list migrations and exit")
+    args = parser.parse_args()
+
+    if args.status:
+        status()
+    else:
+        migrate(args.target, args.seed)
+
+
+if __name__ == "__main__":
+    # Run with: python -m backend.migrations
+    main()
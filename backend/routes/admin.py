@@ -1,11 +1,53 @@
 from fastapi import APIRouter, HTTPException, Depends, Request, Form
 from typing import List
 import json
+import os
 
 from ..database import get_connection
+from ..jobs import DELETE_SCREENSHOTS, NOTIFY_USER
+from ..utils import events, query_log, user_stats
+from ..utils.audit import log_admin_action
+from ..utils.cloudinary import public_id_from_url
+from ..utils.identity import identity_map
+from ..utils.job_queue import job_queue
+from ..utils.replicas import get_read_connection, mark_write
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
+# Read-your-writes key shared by all admins: listings stay on the primary
+# for a short while after any review or deletion
+ADMIN_READS = "admin"
+
+# How long a claimed submission stays with its reviewer
+REVIEW_LEASE_SECONDS = int(os.getenv("REVIEW_LEASE_SECONDS", "600"))
+REVIEW_CLAIM_MAX = 50
+
+# Next pending submissions that are unclaimed, whose lease has run out, or
+# that the reviewer already holds (claiming again renews them). Reviewers
+# never wait on each other's rows.
+CLAIM_SQL = """
+    WITH claimed AS (
+        UPDATE task_submissions ts
+        SET claimed_by = %(reviewer)s,
+            claimed_until = NOW() + make_interval(secs => %(lease)s)
+        FROM (
+            SELECT id, created_at FROM task_submissions
+            WHERE status = 'pending'
+              AND (claimed_until IS NULL OR claimed_until < NOW() OR claimed_by = %(reviewer)s)
+            ORDER BY created_at, id
+            LIMIT %(limit)s
+            FOR UPDATE SKIP LOCKED
+        ) next
+        WHERE ts.id = next.id AND ts.created_at = next.created_at
+        RETURNING ts.*
+    )
+    SELECT claimed.*, u.telegram_id, u.username, u.first_name, mj.title as task_title, mj.amount
+    FROM claimed
+    JOIN users u ON claimed.user_id = u.id
+    JOIN micro_jobs mj ON claimed.task_id = mj.task_id
+    ORDER BY claimed.created_at, claimed.id
+"""
+
 # Simple authentication check
 def verify_admin(request: Request):
     # In production, use proper JWT or session auth
@@ -14,9 +56,16 @@ def verify_admin(request: Request):
     if not auth_token or auth_token != "Bearer admin_token":
         raise HTTPException(status_code=401, detail="Unauthorized")
 
+def reviewer_name(request: Request) -> str:
+    # Admins share one token, so each reviewer names themselves for leases
+    reviewer = request.headers.get("X-Reviewer", "").strip()
+    if not reviewer:
+        raise HTTPException(status_code=400, detail="X-Reviewer header required")
+    return reviewer[:100]
+
 @router.get("/stats")
-def get_admin_stats(_: Request = Depends(verify_admin)):
-    conn = get_connection()
+def get_admin_stats(_: None = Depends(verify_admin)):
+    conn = get_read_connection(ADMIN_READS)
     cur = conn.cursor()
     
     # Total stats
@@ -44,21 +93,21 @@ def get_admin_stats(_: Request = Depends(verify_admin)):
     cur.execute("""
         SELECT COUNT(*) as today_users 
         FROM users 
-        WHERE DATE(created_at) = CURRENT_DATE
+        WHERE created_at >= CURRENT_DATE
     """)
     today_users = cur.fetchone()['today_users']
     
     cur.execute("""
         SELECT SUM(amount) as today_revenue 
         FROM withdrawals 
-        WHERE DATE(created_at) = CURRENT_DATE AND status = 'completed'
+        WHERE created_at >= CURRENT_DATE AND status = 'completed'
     """)
     today_revenue = cur.fetchone()['today_revenue'] or 0
     
     cur.execute("""
         SELECT COUNT(*) as today_submissions 
         FROM task_submissions 
-        WHERE DATE(created_at) = CURRENT_DATE
+        WHERE created_at >= CURRENT_DATE
     """)
     today_submissions = cur.fetchone()['today_submissions']
     
@@ -76,8 +125,8 @@ def get_admin_stats(_: Request = Depends(verify_admin)):
     }
 
 @router.get("/submissions/pending")
-def get_pending_submissions(_: Request = Depends(verify_admin)):
-    conn = get_connection()
+def get_pending_submissions(_: None = Depends(verify_admin)):
+    conn = get_read_connection(ADMIN_READS)
     cur = conn.cursor()
     
     cur.execute("""
@@ -95,11 +144,67 @@ def get_pending_submissions(_: Request = Depends(verify_admin)):
     
     return submissions
 
+@router.post("/submissions/claim")
+def claim_submissions(
+    request: Request,
+    limit: int = 10,
+    _: None = Depends(verify_admin),
+    reviewer: str = Depends(reviewer_name)
+):
+    """
+    Lease the next `limit` pending submissions to this reviewer for
+    REVIEW_LEASE_SECONDS; only they can review them until it runs out
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    
+    cur.execute(CLAIM_SQL, {
+        "reviewer": reviewer,
+        "lease": REVIEW_LEASE_SECONDS,
+        "limit": max(1, min(limit, REVIEW_CLAIM_MAX)),
+    })
+    submissions = cur.fetchall()
+    mark_write(cur, ADMIN_READS)
+    conn.commit()
+    cur.close()
+    conn.close()
+    
+    return submissions
+
+@router.post("/submissions/{submission_id}/release")
+def release_submission(
+    submission_id: int,
+    _: None = Depends(verify_admin),
+    reviewer: str = Depends(reviewer_name)
+):
+    """
+    Give a claimed submission back to the queue without reviewing it
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    
+    cur.execute("""
+        UPDATE task_submissions
+        SET claimed_by = NULL, claimed_until = NULL
+        WHERE id = %s AND status = 'pending' AND claimed_by = %s
+    """, (submission_id, reviewer))
+    released = cur.rowcount
+    mark_write(cur, ADMIN_READS)
+    conn.commit()
+    cur.close()
+    conn.close()
+    
+    if not released:
+        raise HTTPException(status_code=409, detail="Submission is not claimed by you")
+    return {"released": submission_id}
+
 @router.post("/submissions/{submission_id}/review")
 def review_submission(
     submission_id: int, 
     review_data: dict,
-    _: Request = Depends(verify_admin)
+    request: Request,
+    _: None = Depends(verify_admin),
+    reviewer: str = Depends(reviewer_name)
 ):
     conn = get_connection()
     cur = conn.cursor()
@@ -117,6 +222,7 @@ def review_submission(
         FROM task_submissions ts
         JOIN users u ON ts.user_id = u.id
         WHERE ts.id = %s
+        FOR UPDATE OF ts
     """, (submission_id,))
     
     submission = cur.fetchone()
@@ -126,6 +232,20 @@ def review_submission(
         conn.close()
         raise HTTPException(status_code=404, detail="Submission not found")
     
+    # The row lock above serialises reviews of one submission; only a
+    # pending one held by this reviewer can be credited. A lapsed lease is
+    # still honoured until someone else claims the submission.
+    if submission['status'] != 'pending' or submission['claimed_by'] != reviewer:
+        cur.close()
+        conn.close()
+        if submission['status'] != 'pending':
+            raise HTTPException(status_code=409, detail=f"Submission already reviewed ({submission['status']})")
+        holder = submission['claimed_by']
+        raise HTTPException(
+            status_code=409,
+            detail=f"Submission is claimed by {holder}" if holder else "Claim the submission before reviewing it"
+        )
+    
     # Update submission status
     amount = adjusted_amount if adjusted_amount else submission['original_amount']
     
@@ -133,7 +253,8 @@ def review_submission(
         UPDATE task_submissions 
         SET status = %s, 
             admin_review = %s,
-            amount = %s
+            amount = %s,
+            claimed_until = NULL
         WHERE id = %s
         RETURNING *
     """, (status, admin_review, amount, submission_id))
@@ -148,15 +269,36 @@ def review_submission(
             WHERE id = %s
         """, (amount, submission['user_id']))
     
+    user_stats.record_review(cur, submission['user_id'], submission['status'], submission['original_amount'],
+                             status, amount)
+    events.notify(cur, events.SUBMISSION_REVIEWED, id=submission_id, user_id=submission['user_id'], status=status)
+    mark_write(cur, ADMIN_READS)
+    if status == "success":
+        text = f"✅ Your submission for {submission['task_id']} was approved. ৳{amount} has been added to your balance."
+    else:
+        text = f"❌ Your submission for {submission['task_id']} was rejected."
+        if admin_review:
+            text += f"\nReason: {admin_review}"
+    job_queue.enqueue(cur, NOTIFY_USER, {"user_id": submission['user_id'], "text": text})
     conn.commit()
     cur.close()
     conn.close()
     
+    log_admin_action(request, "review_submission", {
+        "submission_id": submission_id,
+        "user_id": submission['user_id'],
+        "task_id": submission['task_id'],
+        "status": status,
+        "amount": amount,
+        "admin_review": admin_review,
+        "reviewer": reviewer
+    })
+    
     return updated_submission
 
 @router.get("/withdrawals/pending")
-def get_pending_withdrawals(_: Request = Depends(verify_admin)):
-    conn = get_connection()
+def get_pending_withdrawals(_: None = Depends(verify_admin)):
+    conn = get_read_connection(ADMIN_READS)
     cur = conn.cursor()
     
     cur.execute("""
@@ -177,7 +319,8 @@ def get_pending_withdrawals(_: Request = Depends(verify_admin)):
 def process_withdrawal(
     withdrawal_id: int,
     process_data: dict,
-    _: Request = Depends(verify_admin)
+    request: Request,
+    _: None = Depends(verify_admin)
 ):
     conn = get_connection()
     cur = conn.cursor()
@@ -194,6 +337,7 @@ def process_withdrawal(
         FROM withdrawals w
         JOIN users u ON w.user_id = u.id
         WHERE w.id = %s
+        FOR UPDATE OF w
     """, (withdrawal_id,))
     
     withdrawal = cur.fetchone()
@@ -223,19 +367,35 @@ def process_withdrawal(
             WHERE id = %s
         """, (withdrawal['amount'], withdrawal['user_id']))
     
+    user_stats.record_withdrawal(cur, withdrawal['user_id'], withdrawal['status'], status)
+    events.notify(cur, events.WITHDRAWAL_PROCESSED, id=withdrawal_id, user_id=withdrawal['user_id'], status=status)
+    mark_write(cur, ADMIN_READS)
+    if status == "completed":
+        text = f"💸 Your withdrawal of ৳{withdrawal['amount']} via {withdrawal['method']} has been sent."
+    else:
+        text = f"↩️ Your withdrawal of ৳{withdrawal['amount']} was cancelled and returned to your cash wallet."
+    job_queue.enqueue(cur, NOTIFY_USER, {"user_id": withdrawal['user_id'], "text": text})
     conn.commit()
     cur.close()
     conn.close()
     
+    log_admin_action(request, "process_withdrawal", {
+        "withdrawal_id": withdrawal_id,
+        "user_id": withdrawal['user_id'],
+        "amount": withdrawal['amount'],
+        "status": status,
+        "admin_note": admin_note
+    })
+    
     return updated_withdrawal
 
 @router.get("/users/all")
 def get_all_users(
     page: int = 1,
     limit: int = 20,
-    _: Request = Depends(verify_admin)
+    _: None = Depends(verify_admin)
 ):
-    conn = get_connection()
+    conn = get_read_connection(ADMIN_READS)
     cur = conn.cursor()
     
     offset = (page - 1) * limit
@@ -243,10 +403,11 @@ def get_all_users(
     cur.execute("""
         SELECT 
             u.*,
-            (SELECT COUNT(*) FROM task_submissions ts WHERE ts.user_id = u.id AND ts.status = 'success') as completed_tasks,
-            (SELECT COUNT(*) FROM withdrawals w WHERE w.user_id = u.id AND w.status = 'completed') as withdrawals_count,
-            (SELECT COUNT(*) FROM users u2 WHERE u2.referred_by = u.refer_code) as referrals_count
+            COALESCE(s.completed_tasks, 0) as completed_tasks,
+            COALESCE(s.withdrawals_count, 0) as withdrawals_count,
+            COALESCE(s.referrals_count, 0) as referrals_count
         FROM users u
+        LEFT JOIN user_stats s ON s.user_id = u.id
         ORDER BY u.created_at DESC
         LIMIT %s OFFSET %s
     """, (limit, offset))
@@ -269,3 +430,56 @@ def get_all_users(
             "pages": (total + limit - 1) // limit
         }
     }
+
+@router.delete("/users/{telegram_id}")
+def delete_user(telegram_id: int, request: Request, _: None = Depends(verify_admin)):
+    conn = get_connection()
+    cur = conn.cursor()
+    
+    # Screenshots outlive the cascade below; they're removed in the background
+    cur.execute("""
+        SELECT ts.screenshot_url
+        FROM task_submissions ts
+        JOIN users u ON u.id = ts.user_id
+        WHERE u.telegram_id = %s
+    """, (telegram_id,))
+    public_ids = [public_id for public_id in (public_id_from_url(row['screenshot_url']) for row in cur.fetchall())
+                  if public_id]
+    
+    # Submissions, withdrawals and stats go with the user (ON DELETE CASCADE)
+    cur.execute("DELETE FROM users WHERE telegram_id = %s RETURNING id, username", (telegram_id,))
+    deleted_user = cur.fetchone()
+    if deleted_user:
+        events.notify(cur, events.USER_DELETED, telegram_id=telegram_id, user_id=deleted_user['id'])
+        mark_write(cur, ADMIN_READS)
+        # The bulk delete API takes at most 100 ids per call
+        for start in range(0, len(public_ids), 100):
+            job_queue.enqueue(cur, DELETE_SCREENSHOTS, {"public_ids": public_ids[start:start + 100]})
+    conn.commit()
+    cur.close()
+    conn.close()
+    
+    if not deleted_user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    # Other workers drop their mapping when the event arrives
+    identity_map.invalidate(telegram_id)
+    log_admin_action(request, "delete_user", {"telegram_id": telegram_id, "user_id": deleted_user['id']})
+    
+    return {"message": "User deleted successfully"}
+
+@router.get("/slow-queries")
+def get_slow_queries(
+    limit: int = 20,
+    order_by: str = "total_ms",
+    _: None = Depends(verify_admin)
+):
+    return {
+        "threshold_ms": query_log.SLOW_QUERY_MS,
+        "queries": query_log.top_queries(limit, order_by)
+    }
+
+@router.delete("/slow-queries")
+def reset_slow_queries(_: None = Depends(verify_admin)):
+    query_log.reset()
+    return {"message": "Slow query log cleared"}
@@ -0,0 +1,76 @@
+from fastapi import APIRouter, HTTPException, Request
+
+from ..utils.http_cache import etag_json_response
+from ..utils.replicas import get_read_connection
+from ..utils.task_feed import task_feed
+
+router = APIRouter(prefix="/api/bootstrap", tags=["bootstrap"])
+
+RECENT_LIMIT = 10
+
+# Run one after another on the request's single connection, once the user
+# has been found
+SECTIONS = {
+    "stats": ("one", """
+        SELECT total_tasks, completed_tasks, total_earned, withdrawals_count,
+               referrals_count as referrals
+        FROM user_stats
+        WHERE user_id = %(user_id)s
+    """),
+    "referrals": ("one", """
+        SELECT
+            COUNT(*) as total_referrals,
+            COUNT(*) FILTER (WHERE EXISTS (SELECT 1 FROM withdrawals w WHERE w.user_id = r.id)) as active_referrals,
+            (SELECT COALESCE(SUM(b.amount), 0) FROM referral_bonuses b
+             WHERE b.referrer_id = %(user_id)s) as total_bonus_earned
+        FROM users r
+        WHERE r.referred_by = %(refer_code)s
+    """),
+    "submissions": ("all", """
+        SELECT ts.*, mj.title as task_title
+        FROM task_submissions ts
+        JOIN micro_jobs mj ON ts.task_id = mj.task_id
+        WHERE ts.user_id = %(user_id)s
+        ORDER BY ts.created_at DESC
+        LIMIT %(recent_limit)s
+    """),
+    "withdrawals": ("all", """
+        SELECT * FROM withdrawals
+        WHERE user_id = %(user_id)s
+        ORDER BY created_at DESC
+        LIMIT %(recent_limit)s
+    """),
+}
+
+
+@router.get("/{telegram_id}")
+def get_bootstrap(telegram_id: int, request: Request):
+    """
+    Everything the Mini App needs for its first render in one response,
+    read over a single connection
+    """
+    conn = get_read_connection(telegram_id)
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT * FROM users WHERE telegram_id = %s", (telegram_id,))
+        user = cur.fetchone()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        params = {"user_id": user["id"], "refer_code": user["refer_code"], "recent_limit": RECENT_LIMIT}
+        data = {"user": user}
+        for name, (mode, sql) in SECTIONS.items():
+            cur.execute(sql, params)
+            data[name] = cur.fetchone() if mode == "one" else cur.fetchall()
+        data["tasks"] = task_feed.get(telegram_id, cur)
+    finally:
+        cur.close()
+        conn.close()
+
+    data["stats"] = data["stats"] or {
+        "total_tasks": 0, "completed_tasks": 0, "total_earned": 0, "withdrawals_count": 0, "referrals": 0
+    }
+    data["balances"] = {"balance": user["balance"], "cash_wallet": user["cash_wallet"]}
+    data["referrals"]["refer_code"] = user["refer_code"]
+
+    return etag_json_response(request, data)
@@ -1,16 +1,24 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Request, UploadFile, File
+from typing import List, Optional
+import io
 import uuid
 from datetime import datetime
 
 from ..database import get_connection
 from ..models import MicroJob
+from .admin import verify_admin
+from ..utils import bulk_tasks, events, partitions
+from ..utils.audit import log_admin_action
+from ..utils.http_cache import cache_response
+from ..utils.identity import identity_map
+from ..utils.replicas import get_read_connection
+from ..utils.task_feed import task_feed
 
 router = APIRouter(prefix="/api/tasks", tags=["tasks"])
 
 @router.get("/", response_model=List[dict])
 def get_all_tasks(status: str = "active", limit: int = 50):
-    conn = get_connection()
+    conn = get_read_connection()
     cur = conn.cursor()
     
     cur.execute("""
@@ -26,7 +34,13 @@ def get_all_tasks(status: str = "active", limit: int = 50):
     
     return tasks
 
+@router.get("/feed/{telegram_id}")
+def get_task_feed(telegram_id: int):
+    # Active tasks this user can still submit today
+    return task_feed.get(telegram_id)
+
 @router.get("/{task_id}")
+@cache_response(max_age=60, ttl=60, key_param="task_id", invalidate_on=[events.TASK_CHANGED])
 def get_task(task_id: str):
     conn = get_connection()
     cur = conn.cursor()
@@ -43,7 +57,7 @@ def get_task(task_id: str):
     return task
 
 @router.post("/")
-def create_task(task_data: dict):
+def create_task(task_data: dict, request: Request, _: None = Depends(verify_admin)):
     conn = get_connection()
     cur = conn.cursor()
     
@@ -66,14 +80,59 @@ def create_task(task_data: dict):
     ))
     
     new_task = cur.fetchone()
+    events.notify(cur, events.TASK_CHANGED, task_id=task_id)
     conn.commit()
     cur.close()
     conn.close()
     
+    log_admin_action(request, "create_task", {"task_id": task_id, "task": task_data})
+    
     return new_task
 
+@router.post("/import")
+def import_tasks(request: Request, file: UploadFile = File(...), format: Optional[str] = None,
+                 dry_run: bool = False, skip_invalid: bool = False, _: None = Depends(verify_admin)):
+    # CSV, JSON array or JSON lines; see backend.utils.bulk_tasks for the columns
+    fmt = format or bulk_tasks.guess_format(file.filename)
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        result = bulk_tasks.import_tasks(bulk_tasks.read_rows(stream, fmt), dry_run=dry_run,
+                                         skip_invalid=skip_invalid)
+    except ValueError as e:
+        # Malformed file (bad JSON, unknown format) rather than a bad row
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if result["invalid"] and not skip_invalid:
+        raise HTTPException(status_code=422, detail=result)
+    
+    if not dry_run:
+        log_admin_action(request, "import_tasks", {
+            "filename": file.filename,
+            "inserted": result["inserted"],
+            "updated": result["updated"],
+            "skipped": result["invalid"],
+        })
+    
+    return result
+
+@router.post("/bulk-status")
+def bulk_update_status(payload: dict, request: Request, _: None = Depends(verify_admin)):
+    # {"action": "pause" | "activate" | "expire", "filter": {"task_ids": [...], "status": ..., ...}}
+    try:
+        changed = bulk_tasks.set_status(payload.get("action"), payload.get("filter") or {})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    log_admin_action(request, "bulk_task_status", {
+        "action": payload.get("action"),
+        "filter": payload.get("filter"),
+        "task_ids": changed,
+    })
+    
+    return {"updated": len(changed), "task_ids": changed}
+
 @router.put("/{task_id}")
-def update_task(task_id: str, task_data: dict):
+def update_task(task_id: str, task_data: dict, request: Request, _: None = Depends(verify_admin)):
     conn = get_connection()
     cur = conn.cursor()
     
@@ -100,6 +159,8 @@ def update_task(task_id: str, task_data: dict):
     
     cur.execute(query, values)
     updated_task = cur.fetchone()
+    if updated_task:
+        events.notify(cur, events.TASK_CHANGED, task_id=task_id)
     conn.commit()
     cur.close()
     conn.close()
@@ -107,15 +168,19 @@ def update_task(task_id: str, task_data: dict):
     if not updated_task:
         raise HTTPException(status_code=404, detail="Task not found")
     
+    log_admin_action(request, "update_task", {"task_id": task_id, "changes": task_data})
+    
     return updated_task
 
 @router.delete("/{task_id}")
-def delete_task(task_id: str):
+def delete_task(task_id: str, request: Request, _: None = Depends(verify_admin)):
     conn = get_connection()
     cur = conn.cursor()
     
     cur.execute("DELETE FROM micro_jobs WHERE task_id = %s RETURNING *", (task_id,))
     deleted_task = cur.fetchone()
+    if deleted_task:
+        events.notify(cur, events.TASK_CHANGED, task_id=task_id)
     conn.commit()
     cur.close()
     conn.close()
@@ -123,18 +188,18 @@ def delete_task(task_id: str):
     if not deleted_task:
         raise HTTPException(status_code=404, detail="Task not found")
     
+    log_admin_action(request, "delete_task", {"task_id": task_id, "title": deleted_task['title']})
+    
     return {"message": "Task deleted successfully"}
 
 @router.get("/user/{telegram_id}/submissions")
 def get_user_submissions(telegram_id: int):
-    conn = get_connection()
+    conn = get_read_connection(telegram_id)
     cur = conn.cursor()
     
-    # Get user id first
-    cur.execute("SELECT id FROM users WHERE telegram_id = %s", (telegram_id,))
-    user = cur.fetchone()
+    user_id = identity_map.resolve(telegram_id, cur)
     
-    if not user:
+    if user_id is None:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Get submissions
@@ -144,10 +209,21 @@ def get_user_submissions(telegram_id: int):
         JOIN micro_jobs mj ON ts.task_id = mj.task_id
         WHERE ts.user_id = %s
         ORDER BY ts.created_at DESC
-    """, (user['id'],))
+    """, (user_id,))
     
     submissions = cur.fetchall()
     cur.close()
     conn.close()
     
     return submissions
+
+@router.get("/user/{telegram_id}/submissions/archived")
+def get_user_archived_submissions(telegram_id: int, limit: int = 100):
+    # Slow path: submissions older than the live partitions are read from the
+    # gzipped exports written by backend.utils.partitions
+    user_id = identity_map.resolve(telegram_id)
+    
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    return partitions.read_archived_submissions(user_id=user_id, limit=limit)
@@ -3,10 +3,16 @@ from typing import List, Optional
 import uuid
 
 from ..database import get_connection
+from ..utils import user_stats
+from ..utils.identity import identity_map
+from ..utils.replicas import get_read_connection, mark_write
+from ..utils.idempotency import idempotent
+from .admin import verify_admin
 
 router = APIRouter(prefix="/api/users", tags=["users"])
 
 @router.post("/register")
+@idempotent
 def register_user(telegram_data: dict):
     conn = get_connection()
     cur = conn.cursor()
@@ -30,6 +36,7 @@ def register_user(telegram_data: dict):
     if existing_user:
         cur.close()
         conn.close()
+        identity_map.put(telegram_id, existing_user['id'])
         return existing_user
     
     # Create new user
@@ -40,6 +47,8 @@ def register_user(telegram_data: dict):
     """, (telegram_id, username, first_name, refer_code))
     
     new_user = cur.fetchone()
+    user_stats.create_row(cur, new_user['id'])
+    mark_write(cur, telegram_id)
     conn.commit()
     
     # If referred by someone
@@ -49,16 +58,18 @@ def register_user(telegram_data: dict):
             UPDATE users SET referred_by = %s 
             WHERE telegram_id = %s
         """, (referred_by, telegram_id))
+        user_stats.record_referral(cur, referred_by)
         conn.commit()
     
     cur.close()
     conn.close()
     
+    identity_map.put(telegram_id, new_user['id'])
     return new_user
 
 @router.get("/{telegram_id}")
 def get_user_profile(telegram_id: int):
-    conn = get_connection()
+    conn = get_read_connection(telegram_id)
     cur = conn.cursor()
     
     cur.execute("""
@@ -75,16 +86,12 @@ def get_user_profile(telegram_id: int):
     
     # Get user stats
     cur.execute("""
-        SELECT 
-            COUNT(*) as total_tasks,
-            SUM(CASE WHEN status = 'success' THEN 1 ELSE 0 END) as completed_tasks,
-            SUM(CASE WHEN status = 'success' THEN amount ELSE 0 END) as total_earned,
-            COUNT(DISTINCT referred_by) as referrals
-        FROM task_submissions ts
+        SELECT total_tasks, completed_tasks, total_earned, referrals_count as referrals
+        FROM user_stats
         WHERE user_id = %s
     """, (user['id'],))
     
-    stats = cur.fetchone()
+    stats = cur.fetchone() or {"total_tasks": 0, "completed_tasks": 0, "total_earned": 0, "referrals": 0}
     
     cur.close()
     conn.close()
@@ -95,7 +102,7 @@ def get_user_profile(telegram_id: int):
     }
 
 @router.put("/{telegram_id}/balance")
-def update_balance(telegram_id: int, update_data: dict):
+def update_balance(telegram_id: int, update_data: dict, _: None = Depends(verify_admin)):
     conn = get_connection()
     cur = conn.cursor()
     
@@ -135,6 +142,7 @@ def update_balance(telegram_id: int, update_data: dict):
     """, (new_balance, telegram_id))
     
     updated_user = cur.fetchone()
+    mark_write(cur, telegram_id)
     conn.commit()
     cur.close()
     conn.close()
@@ -142,6 +150,7 @@ def update_balance(telegram_id: int, update_data: dict):
     return updated_user
 
 @router.post("/{telegram_id}/transfer")
+@idempotent
 def transfer_to_cash_wallet(telegram_id: int, transfer_data: dict):
     conn = get_connection()
     cur = conn.cursor()
@@ -173,6 +182,7 @@ def transfer_to_cash_wallet(telegram_id: int, transfer_data: dict):
     """, (amount, amount, telegram_id))
     
     updated_user = cur.fetchone()
+    mark_write(cur, telegram_id)
     conn.commit()
     cur.close()
     conn.close()
@@ -181,7 +191,7 @@ def transfer_to_cash_wallet(telegram_id: int, transfer_data: dict):
 
 @router.get("/{telegram_id}/referrals")
 def get_user_referrals(telegram_id: int):
-    conn = get_connection()
+    conn = get_read_connection(telegram_id)
     cur = conn.cursor()
     
     # Get user's referral code
@@ -209,10 +219,11 @@ def get_user_referrals(telegram_id: int):
         SELECT 
             COUNT(*) as total_referrals,
             SUM(CASE WHEN (SELECT COUNT(*) FROM withdrawals w WHERE w.user_id = u.id) > 0 THEN 1 ELSE 0 END) as active_referrals,
-            SUM(CASE WHEN (SELECT COUNT(*) FROM withdrawals w WHERE w.user_id = u.id) > 0 THEN 5 ELSE 0 END) as total_bonus_earned
+            (SELECT COALESCE(SUM(b.amount), 0) FROM referral_bonuses b
+             WHERE b.referrer_id = (SELECT id FROM users WHERE refer_code = %s)) as total_bonus_earned
         FROM users u
         WHERE u.referred_by = %s
-    """, (user['refer_code'],))
+    """, (user['refer_code'], user['refer_code']))
     
     stats = cur.fetchone()
     
@@ -3,19 +3,23 @@ from typing import List
 from datetime import datetime
 
 from ..database import get_connection
+from ..utils import events
+from ..utils.http_cache import cache_response
+from ..utils.identity import identity_map
+from ..utils.replicas import get_read_connection, mark_write
+from ..utils.idempotency import idempotent
+from ..utils.rate_limit import rate_limit
 
 router = APIRouter(prefix="/api/withdrawals", tags=["withdrawals"])
 
 @router.get("/user/{telegram_id}")
 def get_user_withdrawals(telegram_id: int):
-    conn = get_connection()
+    conn = get_read_connection(telegram_id)
     cur = conn.cursor()
     
-    # Get user id
-    cur.execute("SELECT id FROM users WHERE telegram_id = %s", (telegram_id,))
-    user = cur.fetchone()
+    user_id = identity_map.resolve(telegram_id, cur)
     
-    if not user:
+    if user_id is None:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Get withdrawals
@@ -24,7 +28,7 @@ def get_user_withdrawals(telegram_id: int):
         WHERE user_id = %s 
         ORDER BY created_at DESC
         LIMIT 50
-    """, (user['id'],))
+    """, (user_id,))
     
     withdrawals = cur.fetchall()
     cur.close()
@@ -33,8 +37,9 @@ def get_user_withdrawals(telegram_id: int):
     return withdrawals
 
 @router.get("/calculate/{telegram_id}")
+@rate_limit(per_user=30, per_ip=120)
 def calculate_withdrawal(telegram_id: int, amount: float):
-    conn = get_connection()
+    conn = get_read_connection(telegram_id)
     cur = conn.cursor()
     
     # Check if it's first withdrawal
@@ -77,6 +82,7 @@ def calculate_withdrawal(telegram_id: int, amount: float):
     }
 
 @router.post("/request/{telegram_id}")
+@idempotent
 def request_withdrawal(telegram_id: int, request_data: dict):
     conn = get_connection()
     cur = conn.cursor()
@@ -147,10 +153,12 @@ def request_withdrawal(telegram_id: int, request_data: dict):
         WHERE id = %s
     """, (amount, user['id']))
     
+    # Admin notification goes out through the event bus once this commits
+    events.notify(cur, events.WITHDRAWAL_CREATED, id=withdrawal['id'], user_id=user['id'],
+                  amount=amount, method=method)
+    mark_write(cur, telegram_id)
     conn.commit()
     
-    # TODO: Send notification to admin via Telegram bot
-    
     cur.close()
     conn.close()
     
@@ -161,6 +169,7 @@ def request_withdrawal(telegram_id: int, request_data: dict):
     }
 
 @router.get("/methods")
+@cache_response(max_age=86400)
 def get_withdrawal_methods():
     return {
         "methods": [
@@ -171,6 +180,7 @@ def get_withdrawal_methods():
     }
 
 @router.get("/rules")
+@cache_response(max_age=86400)
 def get_withdrawal_rules():
     return {
         "rules": {
@@ -0,0 +1,137 @@
+"""
+Production entry point: several worker processes behind one socket.
+
+    python -m backend.server
+
+Workers default to 2 * CPUs + 1. Each worker's DB_POOL_SIZE is its share of
+the server's max_connections after DB_RESERVED_CONNECTIONS (migrations, the
+bot, psql sessions) and the connections each worker holds outside its pool
+(event bus LISTEN, rate limit counters, scheduler locks); the worker count is
+lowered if the shares would be too small to be useful. Job queue threads
+and scheduled jobs only borrow pool slots for their queries.
+
+Runs under gunicorn with uvicorn workers when gunicorn is installed (the app
+is imported once in the master and forked, and workers are recycled after
+MAX_REQUESTS). Otherwise falls back to uvicorn's own process manager. Either
+way uvloop and httptools are used when available. On SIGTERM workers stop
+accepting, finish in-flight requests within GRACEFUL_TIMEOUT, then run the
+app's shutdown (scheduler, event bus, audit buffer, connection pool).
+"""
+import logging
+import multiprocessing
+import os
+
+import psycopg2
+
+from .utils.rate_limit import RATE_LIMIT_CONNECTIONS
+
+logger = logging.getLogger(__name__)
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "0"))
+MAX_REQUESTS = int(os.getenv("MAX_REQUESTS", "10000"))
+MAX_REQUESTS_JITTER = int(os.getenv("MAX_REQUESTS_JITTER", "1000"))
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+# Connections left for everything that isn't a web worker
+DB_RESERVED_CONNECTIONS = int(os.getenv("DB_RESERVED_CONNECTIONS", "5"))
+# Smallest pool worth running a worker with
+MIN_POOL_SIZE = 3
+# Used when max_connections can't be read at startup
+DEFAULT_POOL_SIZE = 10
+# Connections a worker holds outside its pool: the event bus LISTEN, the
+# scheduler's advisory-lock session and the rate limiter's
+UNPOOLED_PER_WORKER = 2 + RATE_LIMIT_CONNECTIONS
+
+
+def max_connections():
+    """Connection budget of the server, or None if it can't be reached"""
+    try:
+        conn = psycopg2.connect(os.getenv("DATABASE_URL"))
+    except psycopg2.Error as e:
+        logger.warning(f"Could not read max_connections: {e}")
+        return None
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT current_setting('max_connections')::int
+               - current_setting('superuser_reserved_connections')::int
+    """)
+    budget = cur.fetchone()[0]
+    cur.close()
+    conn.close()
+    return budget
+
+
+def plan(cpus: int, budget):
+    """(workers, pool size per worker) for cpus cores and budget connections"""
+    workers = WEB_CONCURRENCY or 2 * cpus + 1
+    if budget is None:
+        return workers, DEFAULT_POOL_SIZE
+    available = budget - DB_RESERVED_CONNECTIONS
+    workers = max(1, min(workers, available // (MIN_POOL_SIZE + UNPOOLED_PER_WORKER)))
+    pool_size = max(1, available // workers - UNPOOLED_PER_WORKER)
+    return workers, pool_size
+
+
+def run_gunicorn(workers: int):
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self):
+            for key, value in {
+                "bind": f"{HOST}:{PORT}",
+                "workers": workers,
+                # UvicornWorker picks uvloop/httptools when they're importable
+                "worker_class": "uvicorn.workers.UvicornWorker",
+                "preload_app": True,
+                "max_requests": MAX_REQUESTS,
+                "max_requests_jitter": MAX_REQUESTS_JITTER,
+                "graceful_timeout": GRACEFUL_TIMEOUT,
+                "timeout": GRACEFUL_TIMEOUT + 30,
+                "keepalive": 5,
+            }.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from .app import app
+            return app
+
+    Server().run()
+
+
+def run_uvicorn(workers: int):
+    import uvicorn
+
+    uvicorn.run(
+        "backend.app:app",
+        host=HOST,
+        port=PORT,
+        workers=workers,
+        loop="auto",
+        http="auto",
+        limit_max_requests=MAX_REQUESTS,
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT,
+    )
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    workers, pool_size = plan(multiprocessing.cpu_count(), max_connections())
+    if os.getenv("DB_POOL_SIZE"):
+        # An explicit size wins over the computed share
+        pool_size = int(os.getenv("DB_POOL_SIZE"))
+    # Read by backend.database when the app is imported, so set it first
+    os.environ["DB_POOL_SIZE"] = str(pool_size)
+    logger.info(f"Starting {workers} workers with {pool_size} database connections each")
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        logger.info("gunicorn not installed; using uvicorn's process manager")
+        run_uvicorn(workers)
+    else:
+        run_gunicorn(workers)
+
+
+if __name__ == "__main__":
+    # Run with: python -m backend.server
+    main()
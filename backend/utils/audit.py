@@ -0,0 +1,166 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from ..database import get_connection
+from .metrics import Counter, register_collector
+from .rate_limit import peer_ip
+
+logger = logging.getLogger(__name__)
+
+# Audit log settings
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1.0"))
+AUDIT_SHUTDOWN_TIMEOUT = float(os.getenv("AUDIT_SHUTDOWN_TIMEOUT", "10.0"))
+# How long an admin action waits for room in a full queue before its event is dropped
+AUDIT_PUT_TIMEOUT = float(os.getenv("AUDIT_PUT_TIMEOUT", "2.0"))
+
+# admin_logs column sizes
+ACTION_MAX_LENGTH = 100
+IP_MAX_LENGTH = 50
+USER_AGENT_MAX_LENGTH = 1000
+
+_queue = queue.Queue(maxsize=AUDIT_QUEUE_SIZE)
+_stop = threading.Event()
+_worker = None
+
+audit_dropped = Counter()
+
+
+def client_ip(request):
+    """
+    Client address as seen by our own proxy; X-Forwarded-For entries the
+    client wrote itself are ignored
+    """
+    return peer_ip(request.scope)
+
+
+def _clip(value, length: int):
+    return value[:length] if value is not None else None
+
+
+def log_admin_action(request, action: str, details: dict = None, admin_id: int = 1):
+    """
+    Queue an admin_logs row. Waits up to AUDIT_PUT_TIMEOUT while the queue is
+    full, so a slow database slows admin actions down; past that the event is
+    dropped and counted rather than tying up the request thread for good.
+    """
+    row = (
+        admin_id,
+        _clip(action, ACTION_MAX_LENGTH),
+        json.dumps(details or {}, default=str),
+        _clip(client_ip(request), IP_MAX_LENGTH) if request else None,
+        _clip(request.headers.get("user-agent"), USER_AGENT_MAX_LENGTH) if request else None,
+        datetime.now(),
+    )
+    try:
+        _queue.put(row, timeout=AUDIT_PUT_TIMEOUT)
+    except queue.Full:
+        audit_dropped.inc(("queue_full",))
+        logger.error(f"Audit log queue full, dropped {action} event: {row[2]}")
+
+
+def _write_batch(batch):
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        execute_values(cur, """
+            INSERT INTO admin_logs (admin_id, action, details, ip_address, user_agent, created_at)
+            VALUES %s
+        """, batch, template="(%s, %s, %s::jsonb, %s, %s, %s)", page_size=AUDIT_BATCH_SIZE)
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+
+
+def _drain(batch):
+    while len(batch) < AUDIT_BATCH_SIZE:
+        try:
+            batch.append(_queue.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+
+def _run():
+    batch = []
+    while True:
+        if not batch:
+            try:
+                batch.append(_queue.get(timeout=AUDIT_FLUSH_INTERVAL))
+            except queue.Empty:
+                if _stop.is_set():
+                    return
+                continue
+        _drain(batch)
+
+        try:
+            _write_batch(batch)
+            batch = []
+        except psycopg2.OperationalError as e:
+            # Database unreachable: keep the batch and retry; the bounded
+            # queue applies backpressure meanwhile
+            logger.error(f"Failed to write {len(batch)} audit log rows: {e}")
+            if _stop.is_set() and _queue.empty():
+                return
+            time.sleep(AUDIT_FLUSH_INTERVAL)
+        except Exception as e:
+            # Some row was rejected; write them one by one so it can't hold up the rest
+            logger.error(f"Failed to write {len(batch)} audit log rows, retrying one at a time: {e}")
+            batch = _write_each(batch)
+
+
+def _write_each(batch):
+    """
+    Write rows individually, dropping those the database rejects. Returns the
+    rows still to write if the database went away part way.
+    """
+    for i, row in enumerate(batch):
+        try:
+            _write_batch([row])
+        except psycopg2.OperationalError:
+            return batch[i:]
+        except Exception as e:
+            audit_dropped.inc(("rejected",))
+            logger.error(f"Dropped audit log row {row[1]} {row[2]}: {e}")
+    return []
+
+
+def render_metrics():
+    lines = [
+        "# HELP audit_log_dropped_total Admin audit events not written, by reason",
+        "# TYPE audit_log_dropped_total counter",
+    ]
+    lines += audit_dropped.render("audit_log_dropped_total", ("reason",))
+    return lines
+
+
+register_collector(render_metrics)
+
+
+def start():
+    """Start the background flusher (called from the app lifespan)"""
+    global _worker
+    if _worker and _worker.is_alive():
+        return
+    _stop.clear()
+    _worker = threading.Thread(target=_run, name="audit-log-writer", daemon=True)
+    _worker.start()
+
+
+def stop():
+    """Flush everything still queued and stop the background flusher"""
+    _stop.set()
+    if _worker:
+        _worker.join(timeout=AUDIT_SHUTDOWN_TIMEOUT)
+        if _worker.is_alive():
+            logger.error(f"Audit log writer did not finish; {_queue.qsize()} events left in queue")
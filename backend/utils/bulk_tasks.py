@@ -0,0 +1,314 @@
+"""
+Bulk creation and status changes for micro_jobs.
+
+Imports are validated row by row as the file is read, spooled to CSV, COPY'd
+into a temporary staging table and upserted with a single statement. Each
+batch publishes one TASK_CHANGED event, so every cache drops its task lists
+once rather than once per row.
+
+    python -m backend.utils.bulk_tasks import campaign.csv [--dry-run] [--skip-invalid]
+    python -m backend.utils.bulk_tasks pause --task-id MJ-1A2B3C4D --task-id MJ-5E6F7A8B
+    python -m backend.utils.bulk_tasks expire --title-like "Eid %" --status active
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import re
+import tempfile
+import uuid
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from ..database import get_connection
+from . import events
+
+logger = logging.getLogger(__name__)
+
+# Validation errors reported before giving up on a file
+MAX_ERRORS = 100
+# Rows spooled in memory before the staging file moves to disk
+SPOOL_SIZE = 8 * 1024 * 1024
+
+TASK_STATUSES = ("active", "paused", "expired")
+STATUS_ACTIONS = {"pause": "paused", "activate": "active", "expire": "expired"}
+
+# Staging column order; also the COPY column list
+COLUMNS = ("task_id", "title", "description", "cpa_link", "amount", "max_submissions",
+           "daily_limit", "status", "expires_at")
+
+_TASK_ID = re.compile(r"^[A-Za-z0-9_-]{1,50}$")
+
+
+def read_rows(stream, fmt: str):
+    """
+    Yield dict rows from a text stream. fmt is csv, jsonl (one object per
+    line) or json (a single array, which has to be read whole).
+    """
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+    elif fmt == "jsonl":
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+    elif fmt == "json":
+        rows = json.load(stream)
+        if not isinstance(rows, list):
+            raise ValueError("JSON import must be an array of task objects")
+        yield from rows
+    else:
+        raise ValueError(f"Unknown import format: {fmt}")
+
+
+def guess_format(filename: str) -> str:
+    name = (filename or "").lower()
+    if name.endswith(".jsonl") or name.endswith(".ndjson"):
+        return "jsonl"
+    if name.endswith(".json"):
+        return "json"
+    return "csv"
+
+
+def _text(row, field, required=True, max_length=None):
+    value = row.get(field)
+    value = str(value).strip() if value is not None else ""
+    if not value:
+        if required:
+            raise ValueError(f"{field} is required")
+        return None
+    if max_length and len(value) > max_length:
+        raise ValueError(f"{field} longer than {max_length} characters")
+    return value
+
+
+def _int(row, field, default):
+    value = row.get(field)
+    if value is None or str(value).strip() == "":
+        return default
+    try:
+        number = int(str(value).strip())
+    except ValueError:
+        raise ValueError(f"{field} must be an integer")
+    if number < 1:
+        raise ValueError(f"{field} must be at least 1")
+    return number
+
+
+def validate_row(row: dict) -> tuple:
+    """Normalise one input row into COLUMNS order, raising ValueError if it's unusable"""
+    if not isinstance(row, dict):
+        raise ValueError("row must be an object")
+    task_id = _text(row, "task_id", required=False, max_length=50)
+    if task_id is not None and not _TASK_ID.match(task_id):
+        raise ValueError("task_id may only contain letters, digits, '-' and '_'")
+
+    cpa_link = _text(row, "cpa_link")
+    if not cpa_link.startswith(("http://", "https://")):
+        raise ValueError("cpa_link must be an http(s) URL")
+
+    try:
+        amount = Decimal(str(row.get("amount", "")).strip())
+    except InvalidOperation:
+        raise ValueError("amount must be a number")
+    if not amount.is_finite() or amount <= 0 or amount >= Decimal("100000000"):
+        raise ValueError("amount must be positive and below 100000000")
+
+    status = _text(row, "status", required=False) or "active"
+    if status not in TASK_STATUSES:
+        raise ValueError(f"status must be one of {', '.join(TASK_STATUSES)}")
+
+    expires_at = _text(row, "expires_at", required=False)
+    if expires_at is not None:
+        try:
+            expires_at = datetime.fromisoformat(expires_at)
+        except ValueError:
+            raise ValueError("expires_at must be an ISO 8601 timestamp")
+
+    return (
+        task_id or f"MJ-{str(uuid.uuid4())[:8].upper()}",
+        _text(row, "title", max_length=200),
+        _text(row, "description"),
+        cpa_link,
+        amount.quantize(Decimal("0.01")),
+        _int(row, "max_submissions", 100),
+        _int(row, "daily_limit", 3),
+        status,
+        expires_at,
+    )
+
+
+def import_tasks(rows, admin_id: int = 1, dry_run: bool = False, skip_invalid: bool = False):
+    """
+    Validate rows and upsert them into micro_jobs on task_id.
+
+    Any invalid row aborts the import unless skip_invalid is set, in which case
+    it's reported and left out. Returns counts and up to MAX_ERRORS errors as
+    {"row": n, "error": message} with n counting data rows from 1.
+    """
+    errors = []
+    seen = set()
+    valid = 0
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE, mode="w+", newline="") as staged:
+        writer = csv.writer(staged, lineterminator="\n")
+        for number, row in enumerate(rows, start=1):
+            try:
+                clean = validate_row(row)
+                if clean[0] in seen:
+                    raise ValueError(f"duplicate task_id {clean[0]}")
+            except ValueError as e:
+                errors.append({"row": number, "error": str(e)})
+                if len(errors) >= MAX_ERRORS and not skip_invalid:
+                    break
+                continue
+            seen.add(clean[0])
+            writer.writerow(clean)
+            valid += 1
+
+        result = {"valid": valid, "invalid": len(errors), "inserted": 0, "updated": 0,
+                  "errors": errors[:MAX_ERRORS]}
+        if (errors and not skip_invalid) or dry_run or not valid:
+            return result
+
+        staged.seek(0)
+        conn = get_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                CREATE TEMP TABLE micro_jobs_import (
+                    task_id VARCHAR(50),
+                    title VARCHAR(200),
+                    description TEXT,
+                    cpa_link TEXT,
+                    amount DECIMAL(10,2),
+                    max_submissions INTEGER,
+                    daily_limit INTEGER,
+                    status VARCHAR(20),
+                    expires_at TIMESTAMP
+                ) ON COMMIT DROP
+            """)
+            cur.copy_expert(f"COPY micro_jobs_import ({', '.join(COLUMNS)}) FROM STDIN WITH CSV", staged)
+            cur.execute(f"""
+                INSERT INTO micro_jobs ({', '.join(COLUMNS)}, admin_id, created_at, updated_at)
+                SELECT {', '.join(COLUMNS)}, %s, NOW(), NOW() FROM micro_jobs_import
+                ON CONFLICT (task_id) DO UPDATE SET
+                    title = EXCLUDED.title,
+                    description = EXCLUDED.description,
+                    cpa_link = EXCLUDED.cpa_link,
+                    amount = EXCLUDED.amount,
+                    max_submissions = EXCLUDED.max_submissions,
+                    daily_limit = EXCLUDED.daily_limit,
+                    status = EXCLUDED.status,
+                    expires_at = EXCLUDED.expires_at,
+                    updated_at = NOW()
+                RETURNING (xmax = 0) as inserted
+            """, (admin_id,))
+            inserted = sum(1 for row in cur.fetchall() if row['inserted'])
+            events.notify(cur, events.TASK_CHANGED, bulk="import", count=valid)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+            conn.close()
+
+    result["inserted"] = inserted
+    result["updated"] = valid - inserted
+    logger.info(f"Imported {valid} tasks ({inserted} new)")
+    return result
+
+
+def _filter_sql(filters: dict):
+    clauses = []
+    params = []
+    if filters.get("task_ids"):
+        clauses.append("task_id = ANY(%s)")
+        params.append(list(filters["task_ids"]))
+    if filters.get("status"):
+        clauses.append("status = %s")
+        params.append(filters["status"])
+    if filters.get("title_like"):
+        clauses.append("title ILIKE %s")
+        params.append(filters["title_like"])
+    if filters.get("admin_id") is not None:
+        clauses.append("admin_id = %s")
+        params.append(filters["admin_id"])
+    if filters.get("created_after"):
+        clauses.append("created_at >= %s")
+        params.append(filters["created_after"])
+    if filters.get("created_before"):
+        clauses.append("created_at < %s")
+        params.append(filters["created_before"])
+    return clauses, params
+
+
+def set_status(action: str, filters: dict):
+    """
+    Pause, activate or expire every task matching filters in one UPDATE.
+    filters may hold task_ids, status, title_like, admin_id, created_after and
+    created_before; at least one is required so a typo can't hit every task.
+    Returns the task_ids that changed.
+    """
+    if action not in STATUS_ACTIONS:
+        raise ValueError(f"action must be one of {', '.join(STATUS_ACTIONS)}")
+    clauses, params = _filter_sql(filters or {})
+    if not clauses:
+        raise ValueError("At least one filter is required")
+    new_status = STATUS_ACTIONS[action]
+
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(f"""
+        UPDATE micro_jobs SET status = %s, updated_at = NOW()
+        WHERE status <> %s AND {' AND '.join(clauses)}
+        RETURNING task_id
+    """, [new_status, new_status] + params)
+    changed = [row['task_id'] for row in cur.fetchall()]
+    if changed:
+        events.notify(cur, events.TASK_CHANGED, bulk=action, count=len(changed))
+    conn.commit()
+    cur.close()
+    conn.close()
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="bulk micro_jobs import and status changes")
+    sub = parser.add_subparsers(dest="command", required=True)
+    load = sub.add_parser("import", help="create or update tasks from CSV/JSON")
+    load.add_argument("path")
+    load.add_argument("--format", choices=("csv", "json", "jsonl"), help="default: from the file extension")
+    load.add_argument("--admin-id", type=int, default=1)
+    load.add_argument("--dry-run", action="store_true", help="validate only")
+    load.add_argument("--skip-invalid", action="store_true", help="import the valid rows anyway")
+    for action in STATUS_ACTIONS:
+        change = sub.add_parser(action, help=f"{action} tasks matching the filters")
+        change.add_argument("--task-id", action="append", dest="task_ids")
+        change.add_argument("--status", choices=TASK_STATUSES)
+        change.add_argument("--title-like", help="ILIKE pattern")
+        change.add_argument("--admin-id", type=int)
+        change.add_argument("--created-after")
+        change.add_argument("--created-before")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "import":
+        with io.open(args.path, encoding="utf-8-sig", newline="") as f:
+            result = import_tasks(read_rows(f, args.format or guess_format(args.path)),
+                                  args.admin_id, args.dry_run, args.skip_invalid)
+        for error in result["errors"]:
+            print(f"row {error['row']}: {error['error']}")
+        print(f"{result['valid']} valid, {result['invalid']} invalid, "
+              f"{result['inserted']} inserted, {result['updated']} updated")
+        if result["invalid"] and not args.skip_invalid:
+            raise SystemExit(1)
+    else:
+        filters = {key: getattr(args, key) for key in
+                   ("task_ids", "status", "title_like", "admin_id", "created_after", "created_before")}
+        changed = set_status(args.command, filters)
+        print(f"{len(changed)} tasks -> {STATUS_ACTIONS[args.command]}")
+
+
+if __name__ == "__main__":
+    main()
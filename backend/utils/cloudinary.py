@@ -3,12 +3,15 @@ import cloudinary.uploader
 import cloudinary.api
 from fastapi import UploadFile, HTTPException
 import os
+import re
 
 # Configure Cloudinary
 cloudinary.config(
     cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME", "dvt-cloud"),
     api_key=os.getenv("CLOUDINARY_API_KEY", "764846719658924"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET", "OmdiuCF8")
+    api_secret=os.getenv("CLOUDINARY_API_SECRET", "OmdiuCF8"),
+    # Admin/Upload API base; point at a local fake (benchmarks/fake_cloudinary.py) in tests
+    upload_prefix=os.getenv("CLOUDINARY_API_URL")
 )
 
 async def upload_screenshot(file: UploadFile, user_id: int = None):
@@ -70,6 +73,40 @@ def delete_screenshot(public_id: str):
         print(f"Failed to delete image: {e}")
         return None
 
+def bulk_delete_screenshots(public_ids):
+    """
+    Delete up to 100 images in one Admin API call. Returns (public ids that
+    are gone, {public_id: status} for the rest, the API response); images
+    that were already gone count as deleted.
+    """
+    result = cloudinary.api.delete_resources(list(public_ids))
+    statuses = result.get("deleted", {})
+    gone = [public_id for public_id in public_ids if statuses.get(public_id) in ("deleted", "not_found")]
+    failed = {public_id: statuses.get(public_id) for public_id in public_ids
+              if statuses.get(public_id) not in ("deleted", "not_found")}
+    return gone, failed, result
+
+def delete_screenshots(public_ids):
+    """
+    bulk_delete_screenshots, raising if any image could not be deleted
+    """
+    _, failed, result = bulk_delete_screenshots(list(public_ids))
+    if failed:
+        raise RuntimeError(f"Cloudinary did not delete {len(failed)} images: {failed}")
+    return result
+
+_UPLOAD_PATH = re.compile(r"/upload/(?:v\d+/)?(.+?)(?:\.\w+)?$")
+
+def public_id_from_url(url: str):
+    """
+    Public id of a Cloudinary delivery URL (folder/name without version or
+    extension), or None if url isn't one
+    """
+    if not url or "res.cloudinary.com" not in url:
+        return None
+    match = _UPLOAD_PATH.search(url)
+    return match.group(1) if match else None
+
 def get_screenshot_info(public_id: str):
     """
     Get screenshot information
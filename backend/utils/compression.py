@@ -0,0 +1,154 @@
+import gzip
+import mimetypes
+import os
+import re
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# JSON bodies below this size are sent as is
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+# Names produced by frontend/build.py: name.<10 hex chars>.ext
+_FINGERPRINTED = re.compile(r"\.[0-9a-f]{10}\.\w+$")
+
+
+def accepted_encodings(header: str):
+    encodings = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name and quality > 0:
+            encodings.add(name.strip().lower())
+    return encodings
+
+
+def choose_encoding(header: str):
+    accepted = accepted_encodings(header or "")
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class JSONCompressionMiddleware:
+    """
+    Pure ASGI middleware compressing application/json responses larger than
+    COMPRESS_MIN_SIZE. Streaming responses (SSE) and anything already encoded
+    pass through untouched.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+
+        async def send_wrapper(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if headers.get("content-type", "").startswith("application/json") \
+                        and "content-encoding" not in headers:
+                    # Hold the start message until the body shows whether it's worth it
+                    start = message
+                    return
+                await send(message)
+                return
+
+            if start is None:
+                await send(message)
+                return
+            body = message.get("body", b"")
+            if message.get("more_body"):
+                # Not a single-chunk JSON body; give up on compressing it
+                await send(start)
+                start = None
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if len(body) >= self.minimum_size:
+                body = compress(body, encoding)
+                headers["content-encoding"] = encoding
+                headers["content-length"] = str(len(body))
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    # The encoded bytes differ, so the validator is only weakly equal
+                    headers["etag"] = "W/" + etag
+            await send(start)
+            start = None
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles that serves the .br/.gz siblings written by frontend/build.py
+    when the client accepts them, and marks fingerprinted files immutable
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        request_headers = Headers(scope=scope)
+        accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+        media_type = mimetypes.guess_type(str(full_path))[0] or "text/plain"
+
+        response = None
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if encoding not in accepted:
+                continue
+            try:
+                compressed_stat = os.stat(str(full_path) + suffix)
+            except OSError:
+                continue
+            response = FileResponse(str(full_path) + suffix, status_code=status_code,
+                                    stat_result=compressed_stat, media_type=media_type)
+            response.headers["content-encoding"] = encoding
+            break
+        if response is None:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result,
+                                    media_type=media_type)
+
+        response.headers["vary"] = "Accept-Encoding"
+        if _FINGERPRINTED.search(os.path.basename(str(full_path))):
+            response.headers["cache-control"] = IMMUTABLE_CACHE
+        else:
+            # HTML entry points must be revalidated to pick up new asset hashes
+            response.headers["cache-control"] = "no-cache"
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
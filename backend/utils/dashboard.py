@@ -0,0 +1,185 @@
+import asyncio
+import json
+import logging
+import os
+
+from starlette.concurrency import run_in_threadpool
+
+from ..database import get_connection
+from . import events
+
+logger = logging.getLogger(__name__)
+
+# Dashboard feed settings; the interval is a fallback, events wake the feed early
+DASHBOARD_POLL_INTERVAL = float(os.getenv("DASHBOARD_POLL_INTERVAL", "30"))
+DASHBOARD_DEBOUNCE = 0.5
+DASHBOARD_KEEPALIVE = float(os.getenv("DASHBOARD_KEEPALIVE", "15"))
+DASHBOARD_QUEUE_SIZE = 100
+PENDING_BATCH_LIMIT = 50
+
+STATS_SQL = """
+    SELECT
+        (SELECT COUNT(*) FROM users) as total_users,
+        (SELECT COUNT(*) FROM micro_jobs WHERE created_at >= CURRENT_DATE) as today_tasks,
+        (SELECT COUNT(*) FROM task_submissions WHERE status = 'pending') as pending_tasks,
+        (SELECT COUNT(*) FROM withdrawals WHERE status = 'pending') as pending_withdrawals,
+        (SELECT COALESCE(SUM(amount), 0) FROM withdrawals WHERE status = 'completed') as total_revenue
+"""
+
+
+def fetch_stats(cur):
+    cur.execute(STATS_SQL)
+    return {key: value for key, value in cur.fetchone().items()}
+
+
+def format_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class DashboardFeed:
+    """
+    Single producer that polls dashboard stats and new pending items and
+    fans the changes out to every connected admin stream. The database sees
+    one poll per interval no matter how many dashboards are open.
+    """
+
+    def __init__(self, interval: float = DASHBOARD_POLL_INTERVAL):
+        self.interval = interval
+        self.subscribers = set()
+        self.stats = None
+        self.last_submission_id = None
+        self.last_withdrawal_id = None
+        self.task = None
+        self.wakeup = asyncio.Event()
+
+    def wake(self):
+        """Poll now instead of waiting for the next interval"""
+        self.wakeup.set()
+
+    def attach(self, bus, loop):
+        """
+        Wake the feed from the event bus listener thread whenever something
+        the dashboard shows has changed
+        """
+        bus.subscribe([
+            events.SUBMISSION_CREATED, events.SUBMISSION_REVIEWED,
+            events.WITHDRAWAL_CREATED, events.WITHDRAWAL_PROCESSED,
+            events.TASK_CHANGED, events.RECONNECTED,
+        ], lambda event: loop.call_soon_threadsafe(self.wake))
+
+    def _poll(self):
+        conn = get_connection()
+        cur = conn.cursor()
+        try:
+            stats = fetch_stats(cur)
+
+            if self.last_submission_id is None:
+                # Start from the current tail; the stats already count older items
+                cur.execute("SELECT COALESCE(MAX(id), 0) as id FROM task_submissions")
+                self.last_submission_id = cur.fetchone()['id']
+                cur.execute("SELECT COALESCE(MAX(id), 0) as id FROM withdrawals")
+                self.last_withdrawal_id = cur.fetchone()['id']
+                return stats, [], []
+
+            cur.execute("""
+                SELECT ts.id, ts.task_id, ts.amount, ts.created_at,
+                       u.telegram_id, u.username, u.first_name
+                FROM task_submissions ts
+                JOIN users u ON ts.user_id = u.id
+                WHERE ts.id > %s AND ts.status = 'pending'
+                ORDER BY ts.id
+                LIMIT %s
+            """, (self.last_submission_id, PENDING_BATCH_LIMIT))
+            submissions = cur.fetchall()
+
+            cur.execute("""
+                SELECT w.id, w.amount, w.method, w.created_at,
+                       u.telegram_id, u.username, u.first_name
+                FROM withdrawals w
+                JOIN users u ON w.user_id = u.id
+                WHERE w.id > %s AND w.status = 'pending'
+                ORDER BY w.id
+                LIMIT %s
+            """, (self.last_withdrawal_id, PENDING_BATCH_LIMIT))
+            withdrawals = cur.fetchall()
+
+            if submissions:
+                self.last_submission_id = submissions[-1]['id']
+            if withdrawals:
+                self.last_withdrawal_id = withdrawals[-1]['id']
+            return stats, submissions, withdrawals
+        finally:
+            cur.close()
+            conn.close()
+
+    def _publish(self, event: str):
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Slow client: drop its backlog and resend the full state
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(format_event("snapshot", {"stats": self.stats}))
+
+    async def _run(self):
+        while self.subscribers:
+            try:
+                stats, submissions, withdrawals = await run_in_threadpool(self._poll)
+            except Exception as e:
+                logger.error(f"Dashboard poll failed: {e}")
+            else:
+                if self.stats is None:
+                    self.stats = stats
+                    self._publish(format_event("snapshot", {"stats": stats}))
+                else:
+                    changed = {k: v for k, v in stats.items() if self.stats.get(k) != v}
+                    self.stats = stats
+                    if changed:
+                        self._publish(format_event("stats", changed))
+                for row in submissions:
+                    self._publish(format_event("pending_submission", row))
+                for row in withdrawals:
+                    self._publish(format_event("pending_withdrawal", row))
+
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.interval)
+                # Let a burst of events settle into a single poll
+                await asyncio.sleep(DASHBOARD_DEBOUNCE)
+            except asyncio.TimeoutError:
+                pass
+        # Nobody is watching; the next subscriber restarts from the current tail
+        # with fresh stats rather than a snapshot from when the last one left
+        self.stats = None
+        self.last_submission_id = None
+        self.last_withdrawal_id = None
+        self.task = None
+
+    async def stream(self, request):
+        """
+        Server-Sent Events generator for one connected dashboard
+        """
+        queue = asyncio.Queue(maxsize=DASHBOARD_QUEUE_SIZE)
+        self.subscribers.add(queue)
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+        try:
+            if self.stats is not None:
+                yield format_event("snapshot", {"stats": self.stats})
+            while not await request.is_disconnected():
+                try:
+                    yield await asyncio.wait_for(queue.get(), DASHBOARD_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            self.subscribers.discard(queue)
+
+    async def stop(self):
+        self.subscribers.clear()
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+
+dashboard_feed = DashboardFeed()
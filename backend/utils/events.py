@@ -0,0 +1,137 @@
+import json
+import logging
+import os
+import select
+import threading
+import time
+
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+# Postgres channel carrying all application events
+EVENTS_CHANNEL = "dvt_events"
+LISTEN_HEALTHCHECK_INTERVAL = 30.0
+LISTEN_MAX_BACKOFF = 30.0
+
+# Event types
+SUBMISSION_CREATED = "submission_created"
+SUBMISSION_REVIEWED = "submission_reviewed"
+WITHDRAWAL_CREATED = "withdrawal_created"
+WITHDRAWAL_PROCESSED = "withdrawal_processed"
+TASK_CHANGED = "task_changed"
+USER_DELETED = "user_deleted"
+# Pins reads for a key (usually a telegram_id) to the primary; see replicas
+USER_WROTE = "user_wrote"
+# Wakes idle job queue workers; see job_queue
+JOB_ENQUEUED = "job_enqueued"
+# Synthetic event sent to subscribers after the listener reconnects, since
+# anything published while it was down was lost and must be caught up on
+RECONNECTED = "reconnected"
+
+
+def notify(cur, event: str, **payload):
+    """
+    Publish an event from a write path. NOTIFY is transactional, so listeners
+    only see it once the caller commits, and never if it rolls back.
+    """
+    payload["type"] = event
+    cur.execute("SELECT pg_notify(%s, %s)", (EVENTS_CHANNEL, json.dumps(payload, default=str)))
+
+
+class EventBus:
+    """
+    One LISTEN connection per process, dispatching events to in-process
+    subscribers from a background thread
+    """
+
+    def __init__(self, channel: str = EVENTS_CHANNEL):
+        self.channel = channel
+        self.handlers = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.connected = False
+
+    def subscribe(self, events, callback):
+        """
+        Call callback(event) for the given event types ("*" for all).
+        Callbacks run on the listener thread and must not block.
+        """
+        if isinstance(events, str):
+            events = [events]
+        with self.lock:
+            for event in events:
+                self.handlers.setdefault(event, []).append(callback)
+
+    def dispatch(self, event: dict):
+        with self.lock:
+            handlers = self.handlers.get(event.get("type"), []) + self.handlers.get("*", [])
+        for handler in handlers:
+            try:
+                handler(event)
+            except Exception as e:
+                logger.error(f"Event handler {handler!r} failed for {event.get('type')}: {e}")
+
+    def start(self):
+        if not os.getenv("DATABASE_URL"):
+            logger.warning("DATABASE_URL not set; event listener disabled")
+            return
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="event-listener", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+
+    def _listen(self, conn, cur):
+        last_check = time.monotonic()
+        while not self.stop_event.is_set():
+            if select.select([conn], [], [], 1.0) == ([], [], []):
+                if time.monotonic() - last_check > LISTEN_HEALTHCHECK_INTERVAL:
+                    # Surface half-open connections that select() would never report
+                    cur.execute("SELECT 1")
+                    last_check = time.monotonic()
+                continue
+            conn.poll()
+            while conn.notifies:
+                notification = conn.notifies.pop(0)
+                try:
+                    event = json.loads(notification.payload)
+                except ValueError:
+                    logger.warning(f"Ignoring malformed event payload: {notification.payload!r}")
+                    continue
+                self.dispatch(event)
+
+    def _run(self):
+        backoff = 1.0
+        reconnecting = False
+        while not self.stop_event.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(os.getenv("DATABASE_URL"))
+                conn.autocommit = True
+                cur = conn.cursor()
+                cur.execute(f"LISTEN {self.channel}")
+                self.connected = True
+                backoff = 1.0
+                if reconnecting:
+                    # Only after LISTEN, so nothing falls between catch-up and live events
+                    self.dispatch({"type": RECONNECTED})
+                self._listen(conn, cur)
+            except Exception as e:
+                logger.error(f"Event listener connection lost: {e}; retrying in {backoff:.0f}s")
+                reconnecting = True
+                self.stop_event.wait(backoff)
+                backoff = min(backoff * 2, LISTEN_MAX_BACKOFF)
+            finally:
+                self.connected = False
+                if conn is not None:
+                    conn.close()
+
+
+event_bus = EventBus()
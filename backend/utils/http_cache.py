@@ -0,0 +1,231 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from starlette.routing import Match
+
+from . import events
+from .metrics import Counter, register_collector
+
+# Cached bodies kept per decorated route
+HTTP_CACHE_MAX_ENTRIES = 1000
+
+cache_requests = Counter()
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def _if_none_match(header: str, etag: str) -> bool:
+    if not header:
+        return False
+    # Weak validators compare equal for GET revalidation
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    return _if_none_match(request.headers.get("if-none-match"), etag)
+
+
+def etag_json_response(request: Request, payload) -> Response:
+    """
+    JSON response carrying an ETag of its body; 304 when the client already has it
+    """
+    body = json.dumps(jsonable_encoder(payload), separators=(",", ":")).encode()
+    etag = make_etag(body)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def match_route(scope):
+    """
+    The route the router will pick for scope, resolved ahead of routing so
+    middleware can read per-endpoint attributes set by decorators
+    """
+    for route in getattr(scope["app"], "routes", []):
+        match, child_scope = route.matches(scope)
+        if match == Match.FULL:
+            return route, child_scope
+    return None, {}
+
+
+class CachePolicy:
+    def __init__(self, max_age: int, public: bool = True, ttl: float = None, key_param: str = None,
+                 invalidate_on=()):
+        self.max_age = max_age
+        self.public = public
+        # How long the server keeps the body; None means until invalidated
+        self.ttl = ttl
+        self.key_param = key_param
+        self.invalidate_on = tuple(invalidate_on)
+        self.cache_control = f"{'public' if public else 'private'}, max-age={max_age}"
+        self.entries = OrderedDict()
+        # Bumped on invalidation; a body is only stored if its version is still current
+        self.generation = 0
+        self.versions = {}
+        self.lock = threading.Lock()
+
+    def _version(self, key):
+        return self.generation, self.versions.get(key[0], 0)
+
+    def lookup(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry["expires"] is not None and entry["expires"] <= time.monotonic():
+                del self.entries[key]
+                entry = None
+            return entry, self._version(key)
+
+    def store(self, key, version, body: bytes, headers: list):
+        with self.lock:
+            if self._version(key) != version:
+                # Invalidated while the handler ran; the body may predate the change
+                return
+            self.entries[key] = {
+                "etag": make_etag(body),
+                "body": body,
+                "headers": headers,
+                "expires": time.monotonic() + self.ttl if self.ttl is not None else None,
+            }
+            while len(self.entries) > HTTP_CACHE_MAX_ENTRIES:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, param_value=None):
+        """Drop entries for one key_param value, or all of them"""
+        with self.lock:
+            if param_value is None or self.key_param is None:
+                self.generation += 1
+                self.entries.clear()
+                return
+            value = str(param_value)
+            self.versions[value] = self.versions.get(value, 0) + 1
+            for key in [k for k in self.entries if k[0] == value]:
+                del self.entries[key]
+
+
+def cache_response(max_age: int, public: bool = True, ttl: float = None, key_param: str = None,
+                   invalidate_on=()):
+    """
+    Declare an HTTP caching policy on a GET route. HTTPCacheMiddleware then
+    answers repeat requests from memory (or with 304) without calling the handler.
+
+    key_param names the path parameter that identifies the resource, so events
+    in invalidate_on carrying that field only drop the matching entries.
+    """
+    def decorator(func):
+        func.cache_policy = CachePolicy(max_age, public, ttl, key_param, invalidate_on)
+        return func
+    return decorator
+
+
+class HTTPCacheMiddleware:
+    """
+    Pure ASGI middleware serving GET routes decorated with cache_response.
+    Must sit inside CORSMiddleware so cached responses still get CORS headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _match(self, scope):
+        route, child_scope = match_route(scope)
+        policy = getattr(getattr(route, "endpoint", None), "cache_policy", None)
+        return route, policy, child_scope
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        route, policy, child_scope = self._match(scope)
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Lets MetricsMiddleware label requests that never reach the router
+        scope["endpoint"] = route.endpoint
+        params = child_scope.get("path_params", {})
+        key = (str(params.get(policy.key_param)) if policy.key_param else None, scope.get("query_string", b""))
+        if_none_match = None
+        for name, value in scope["headers"]:
+            if name == b"if-none-match":
+                if_none_match = value.decode("latin-1")
+
+        entry, version = policy.lookup(key)
+        if entry is not None:
+            if _if_none_match(if_none_match, entry["etag"]):
+                cache_requests.inc((route.path, "not_modified"))
+                await self._send(send, 304, [], b"", entry["etag"], policy)
+            else:
+                cache_requests.inc((route.path, "hit"))
+                await self._send(send, 200, entry["headers"], entry["body"], entry["etag"], policy)
+            return
+
+        cache_requests.inc((route.path, "miss"))
+        start = {}
+        chunks = []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+        body = b"".join(chunks)
+        headers = [(k, v) for k, v in start.get("headers", []) if k.lower() not in (b"content-length", b"etag")]
+        if start.get("status") != 200:
+            await send({"type": "http.response.start", "status": start.get("status", 500),
+                        "headers": start.get("headers", [])})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        policy.store(key, version, body, headers)
+        etag = make_etag(body)
+        if _if_none_match(if_none_match, etag):
+            await self._send(send, 304, [], b"", etag, policy)
+        else:
+            await self._send(send, 200, headers, body, etag, policy)
+
+    async def _send(self, send, status: int, headers: list, body: bytes, etag: str, policy: CachePolicy):
+        headers = list(headers) + [
+            (b"etag", etag.encode()),
+            (b"cache-control", policy.cache_control.encode()),
+        ]
+        if status == 200:
+            headers.append((b"content-length", str(len(body)).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+def attach(app, bus):
+    """Subscribe every decorated route's policy to its invalidating events"""
+    for route in app.routes:
+        policy = getattr(getattr(route, "endpoint", None), "cache_policy", None)
+        if policy is None or not policy.invalidate_on:
+            continue
+        bus.subscribe(
+            list(policy.invalidate_on),
+            lambda event, policy=policy: policy.invalidate(event.get(policy.key_param) if policy.key_param else None),
+        )
+        # Events published while the listener was down were missed
+        bus.subscribe(events.RECONNECTED, lambda event, policy=policy: policy.invalidate())
+
+
+def render_metrics():
+    lines = [
+        "# HELP http_cache_requests_total Requests to cached routes by outcome",
+        "# TYPE http_cache_requests_total counter",
+    ]
+    lines += cache_requests.render("http_cache_requests_total", ("route", "result"))
+    return lines
+
+
+register_collector(render_metrics)
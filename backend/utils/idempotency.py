@@ -0,0 +1,318 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+from ..database import get_connection
+from .http_cache import match_route
+from .metrics import Counter, register_collector
+
+logger = logging.getLogger(__name__)
+
+# How long a key (and its stored response) is honoured
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+# How long a duplicate waits for the original request before giving up with 409
+IDEMPOTENCY_WAIT_MS = int(os.getenv("IDEMPOTENCY_WAIT_MS", "30000"))
+# An in-progress key older than this is reported as stuck. Its request may
+# or may not have committed, so it is never taken over: retries get 409 until
+# an operator checks the outcome and clears it (see main below)
+IDEMPOTENCY_LEASE_SECONDS = int(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "120"))
+# Attempts at storing a response before the key is left stuck
+COMPLETE_ATTEMPTS = 6
+# Interval at which duplicates re-read an in-progress key, doubling up to the max
+POLL_INITIAL_SECONDS = 0.05
+POLL_MAX_SECONDS = 0.5
+MAX_KEY_LENGTH = 200
+
+idempotency_requests = Counter()
+
+
+def idempotent(func):
+    """
+    Mark a mutating route as honouring the Idempotency-Key header.
+    IdempotencyMiddleware then runs it at most once per key and replays the
+    stored response to retries.
+    """
+    func.idempotent = True
+    return func
+
+
+def request_hash(method: str, path: str, query_string: bytes, body: bytes) -> str:
+    digest = hashlib.sha256()
+    for part in (method.encode(), path.encode(), query_string, body):
+        digest.update(part)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def claim(key: str, route: str, hashed: str):
+    """
+    Commit an in-progress marker for the key (status_code NULL) so no
+    transaction or connection is held while the handler runs. Returns
+    ("owner", None) if this request should run, ("done", row) for a stored
+    response or a key used for a different request, ("in_progress", row)
+    while another request holds it and ("stuck", row) once that has gone on
+    longer than IDEMPOTENCY_LEASE_SECONDS.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            INSERT INTO idempotency_keys (key, route, request_hash, created_at)
+            VALUES (%s, %s, %s, NOW())
+            ON CONFLICT (key) DO NOTHING
+            RETURNING key
+        """, (key, route, hashed))
+        if cur.fetchone() is not None:
+            conn.commit()
+            return "owner", None
+        cur.execute("""
+            SELECT route, request_hash, status_code, content_type, response_body, created_at,
+                   created_at < NOW() - make_interval(secs => %s) as stuck
+            FROM idempotency_keys WHERE key = %s
+        """, (IDEMPOTENCY_LEASE_SECONDS, key))
+        row = cur.fetchone()
+        conn.rollback()
+        if row is None:
+            # Released between the two statements; the caller polls again
+            return "in_progress", None
+        if row['status_code'] is not None or row['request_hash'] != hashed or row['route'] != route:
+            return "done", row
+        return ("stuck" if row['stuck'] else "in_progress"), row
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+
+def complete(key: str, status: int, content_type: str, body: bytes):
+    """
+    Store the response for the key. Server errors are not stored, so a retry
+    after a 5xx runs the request again. The handler has already committed,
+    so this retries with backoff; if every attempt fails the key stays in
+    progress (and later stuck) rather than letting a retry run it twice.
+    """
+    if status >= 500:
+        release(key)
+        return
+    delay = 0.1
+    for attempt in range(1, COMPLETE_ATTEMPTS + 1):
+        try:
+            conn = get_connection()
+            cur = conn.cursor()
+            try:
+                cur.execute("""
+                    UPDATE idempotency_keys
+                    SET status_code = %s, content_type = %s, response_body = %s
+                    WHERE key = %s
+                """, (status, content_type, body, key))
+                conn.commit()
+                return
+            finally:
+                cur.close()
+                conn.close()
+        except Exception as e:
+            if attempt == COMPLETE_ATTEMPTS:
+                raise
+            logger.warning(f"Storing response for Idempotency-Key {key} failed (attempt {attempt}): {e}")
+            time.sleep(delay)
+            delay *= 2
+
+
+def release(key: str):
+    """Give the key up without a result, e.g. when the handler raised"""
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("DELETE FROM idempotency_keys WHERE key = %s AND status_code IS NULL", (key,))
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+
+def purge_expired(ttl_hours: int = IDEMPOTENCY_TTL_HOURS) -> int:
+    conn = get_connection()
+    cur = conn.cursor()
+    # Stuck keys stay until an operator clears them
+    cur.execute("""
+        DELETE FROM idempotency_keys
+        WHERE created_at < NOW() - make_interval(hours => %s) AND status_code IS NOT NULL
+    """, (ttl_hours,))
+    deleted = cur.rowcount
+    conn.commit()
+    cur.close()
+    conn.close()
+    return deleted
+
+
+class IdempotencyMiddleware:
+    """
+    Pure ASGI middleware for routes decorated with idempotent. Requests
+    without an Idempotency-Key header pass straight through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT", "PATCH", "DELETE"):
+            await self.app(scope, receive, send)
+            return
+        key = None
+        for name, value in scope["headers"]:
+            if name == b"idempotency-key":
+                key = value.decode("latin-1").strip()
+        if not key:
+            await self.app(scope, receive, send)
+            return
+        route, _ = match_route(scope)
+        if not getattr(getattr(route, "endpoint", None), "idempotent", False):
+            await self.app(scope, receive, send)
+            return
+        if len(key) > MAX_KEY_LENGTH:
+            await self._send_json(send, 400, {"detail": f"Idempotency-Key longer than {MAX_KEY_LENGTH} characters"})
+            return
+
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        body = b"".join(chunks)
+        hashed = request_hash(scope["method"], scope["path"], scope.get("query_string", b""), body)
+
+        # Duplicates poll the committed marker rather than blocking on a row lock
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_MS / 1000
+        delay = POLL_INITIAL_SECONDS
+        while True:
+            state, row = await run_in_threadpool(claim, key, route.path, hashed)
+            if state == "stuck":
+                idempotency_requests.inc((route.path, "stuck"))
+                await self._send_json(send, 409, {
+                    "detail": "A request with this Idempotency-Key did not finish and may have been applied; "
+                              "it has to be checked before the key can be used again",
+                })
+                return
+            if state != "in_progress":
+                break
+            if time.monotonic() + delay > deadline:
+                idempotency_requests.inc((route.path, "in_progress"))
+                await self._send_json(send, 409, {"detail": "A request with this Idempotency-Key is still in progress"})
+                return
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, POLL_MAX_SECONDS)
+
+        if state == "done":
+            if row["request_hash"] != hashed or row["route"] != route.path:
+                idempotency_requests.inc((route.path, "mismatch"))
+                await self._send_json(send, 422, {"detail": "Idempotency-Key was already used for a different request"})
+                return
+            idempotency_requests.inc((route.path, "replayed"))
+            await self._send(send, row["status_code"], row["content_type"], bytes(row["response_body"]),
+                             [(b"idempotent-replayed", b"true")])
+            return
+
+        idempotency_requests.inc((route.path, "executed"))
+        sent = False
+
+        async def replay_body():
+            nonlocal sent
+            if sent:
+                return await receive()
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        start = {}
+        response_chunks = []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                response_chunks.append(message.get("body", b""))
+
+        try:
+            await self.app(scope, replay_body, capture)
+        except BaseException:
+            await run_in_threadpool(release, key)
+            raise
+
+        status = start.get("status", 500)
+        headers = start.get("headers", [])
+        response_body = b"".join(response_chunks)
+        content_type = next((v.decode("latin-1") for k, v in headers if k.lower() == b"content-type"), None)
+        try:
+            await run_in_threadpool(complete, key, status, content_type, response_body)
+        except Exception:
+            # The request went through; the key stays in progress so retries
+            # get 409 instead of running it again
+            logger.exception("Failed to store response for Idempotency-Key %s; key left stuck", key)
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": response_body})
+
+    async def _send(self, send, status: int, content_type: str, body: bytes, extra_headers=()):
+        headers = [(b"content-length", str(len(body)).encode())] + list(extra_headers)
+        if content_type:
+            headers.append((b"content-type", content_type.encode("latin-1")))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _send_json(self, send, status: int, payload: dict):
+        await self._send(send, status, "application/json", json.dumps(payload).encode())
+
+
+def render_metrics():
+    lines = [
+        "# HELP idempotency_requests_total Requests carrying an Idempotency-Key by outcome",
+        "# TYPE idempotency_requests_total counter",
+    ]
+    lines += idempotency_requests.render("idempotency_requests_total", ("route", "result"))
+    return lines
+
+
+register_collector(render_metrics)
+
+
+def stuck_keys():
+    """In-progress keys older than IDEMPOTENCY_LEASE_SECONDS, oldest first"""
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT key, route, created_at FROM idempotency_keys
+        WHERE status_code IS NULL AND created_at < NOW() - make_interval(secs => %s)
+        ORDER BY created_at
+    """, (IDEMPOTENCY_LEASE_SECONDS,))
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Idempotency-Key maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stuck", help="keys whose request never stored a response")
+    clear = sub.add_parser("clear", help="let a stuck key run again, once its outcome has been checked")
+    clear.add_argument("key")
+    args = parser.parse_args()
+
+    if args.command == "stuck":
+        for row in stuck_keys():
+            print(f"{row['created_at']}  {row['route']:40} {row['key']}")
+    else:
+        release(args.key)
+        print(f"Cleared {args.key}")
+
+
+if __name__ == "__main__":
+    # Run with: python -m backend.utils.idempotency stuck|clear KEY
+    main()
@@ -0,0 +1,87 @@
+import os
+import threading
+from collections import OrderedDict
+
+from ..database import get_connection
+from . import events
+from .metrics import register_collector
+
+IDENTITY_MAP_SIZE = int(os.getenv("IDENTITY_MAP_SIZE", "100000"))
+
+
+class IdentityMap:
+    """
+    Bounded LRU of telegram_id -> users.id. The mapping never changes for a
+    live user, so entries only leave on eviction or when the user is deleted.
+    Unknown telegram_ids are not cached; they may register a moment later.
+    """
+
+    def __init__(self, max_size: int = IDENTITY_MAP_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, telegram_id: int, user_id: int):
+        with self.lock:
+            self.entries[telegram_id] = user_id
+            self.entries.move_to_end(telegram_id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def resolve(self, telegram_id: int, cur=None):
+        """
+        Internal user id for telegram_id, or None if there is no such user.
+        On a miss the lookup runs on cur, or on a short-lived connection.
+        """
+        with self.lock:
+            user_id = self.entries.get(telegram_id)
+            if user_id is not None:
+                self.entries.move_to_end(telegram_id)
+                self.hits += 1
+                return user_id
+            self.misses += 1
+
+        if cur is not None:
+            cur.execute("SELECT id FROM users WHERE telegram_id = %s", (telegram_id,))
+            row = cur.fetchone()
+        else:
+            conn = get_connection()
+            own_cur = conn.cursor()
+            own_cur.execute("SELECT id FROM users WHERE telegram_id = %s", (telegram_id,))
+            row = own_cur.fetchone()
+            own_cur.close()
+            conn.close()
+        if row is None:
+            return None
+        self.put(telegram_id, row['id'])
+        return row['id']
+
+    def invalidate(self, telegram_id: int = None):
+        with self.lock:
+            if telegram_id is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(telegram_id, None)
+
+    def attach(self, bus):
+        """Drop users deleted by any worker"""
+        bus.subscribe(events.USER_DELETED, lambda event: self.invalidate(event.get("telegram_id")))
+
+    def render_metrics(self):
+        with self.lock:
+            hits, misses, size = self.hits, self.misses, len(self.entries)
+        return [
+            "# HELP identity_map_lookups_total telegram_id to user id lookups by result",
+            "# TYPE identity_map_lookups_total counter",
+            f'identity_map_lookups_total{{result="hit"}} {hits}',
+            f'identity_map_lookups_total{{result="miss"}} {misses}',
+            "# HELP identity_map_entries Cached telegram_id mappings",
+            "# TYPE identity_map_entries gauge",
+            f"identity_map_entries {size}",
+        ]
+
+
+identity_map = IdentityMap()
+register_collector(identity_map.render_metrics)
@@ -0,0 +1,314 @@
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+
+from psycopg2.extras import Json
+
+from ..database import get_connection
+from . import events
+from .metrics import Counter, Histogram, register_collector
+
+logger = logging.getLogger(__name__)
+
+# Worker threads per process; 0 leaves the queue to `python -m backend.jobs work`
+JOB_WORKER_THREADS = int(os.getenv("JOB_WORKER_THREADS", "2"))
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", "10"))
+# Fallback poll while idle; enqueues wake the workers through the event bus
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "5"))
+# A claimed batch is invisible to other workers for this long
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+
+RETRY_BASE_SECONDS = 10
+RETRY_MAX_SECONDS = 3600
+DEFAULT_PRIORITY = 100
+DEFAULT_MAX_ATTEMPTS = 5
+
+JOB_DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+job_duration = Histogram(JOB_DURATION_BUCKETS)
+job_results = Counter()
+
+CLAIM_SQL = """
+    UPDATE job_queue q
+    SET locked_until = NOW() + make_interval(secs => %(lease)s),
+        locked_by = %(worker)s,
+        attempts = q.attempts + 1
+    FROM (
+        SELECT id FROM job_queue
+        WHERE kind = ANY(%(kinds)s)
+          AND run_at <= NOW()
+          AND (locked_until IS NULL OR locked_until < NOW())
+        ORDER BY priority, run_at
+        LIMIT %(limit)s
+        FOR UPDATE SKIP LOCKED
+    ) ready
+    WHERE q.id = ready.id
+    RETURNING q.*
+"""
+
+
+class RetryLater(Exception):
+    """Raise from a handler to retry after delay seconds instead of the backoff"""
+
+    def __init__(self, delay: float, message: str = ""):
+        super().__init__(message or f"retry in {delay:.0f}s")
+        self.delay = delay
+
+
+class Handler:
+    def __init__(self, kind: str, func, max_attempts: int, priority: int):
+        self.kind = kind
+        self.func = func
+        self.max_attempts = max_attempts
+        self.priority = priority
+
+
+def backoff(attempts: int) -> float:
+    """Delay before retry number attempts, doubling up to RETRY_MAX_SECONDS with +-20% jitter"""
+    delay = min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+class JobQueue:
+    """
+    Durable queue on the job_queue table. Write paths enqueue inside their
+    own transaction, so a job exists exactly when the change that caused it
+    commits. Any number of worker threads and processes can drain it: each
+    claims a batch with FOR UPDATE SKIP LOCKED and never waits on another.
+    """
+
+    def __init__(self):
+        self.handlers = {}
+        self.stop_event = threading.Event()
+        self.wake_event = threading.Event()
+        self.threads = []
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+
+    def handler(self, kind: str, max_attempts: int = DEFAULT_MAX_ATTEMPTS, priority: int = DEFAULT_PRIORITY):
+        """Register func(payload) as the handler for kind"""
+        def decorator(func):
+            self.handlers[kind] = Handler(kind, func, max_attempts, priority)
+            return func
+        return decorator
+
+    def enqueue(self, cur, kind: str, payload: dict = None, priority: int = None, delay: float = 0,
+                dedupe_key: str = None, max_attempts: int = None):
+        """
+        Queue a job on cur; it becomes visible when the caller commits.
+        Returns the job id, or None if dedupe_key was already queued.
+        """
+        handler = self.handlers.get(kind)
+        cur.execute("""
+            INSERT INTO job_queue (kind, payload, priority, run_at, max_attempts, dedupe_key)
+            VALUES (%s, %s, %s, NOW() + make_interval(secs => %s), %s, %s)
+            ON CONFLICT (dedupe_key) DO NOTHING
+            RETURNING id
+        """, (
+            kind,
+            Json(payload or {}),
+            priority if priority is not None else (handler.priority if handler else DEFAULT_PRIORITY),
+            delay,
+            max_attempts or (handler.max_attempts if handler else DEFAULT_MAX_ATTEMPTS),
+            dedupe_key,
+        ))
+        row = cur.fetchone()
+        if row is None:
+            return None
+        if not delay:
+            events.notify(cur, events.JOB_ENQUEUED, kind=kind)
+        return row['id']
+
+    def claim(self, cur, limit: int = JOB_BATCH_SIZE, kinds=None):
+        cur.execute(CLAIM_SQL, {
+            "lease": JOB_LEASE_SECONDS,
+            "worker": f"{self.worker}:{threading.current_thread().name}",
+            "kinds": list(kinds or self.handlers),
+            "limit": limit,
+        })
+        return sorted(cur.fetchall(), key=lambda row: (row['priority'], row['run_at']))
+
+    def _run(self, job):
+        handler = self.handlers[job['kind']]
+        payload = job['payload']
+        if isinstance(payload, str):
+            payload = json.loads(payload)
+        started = time.perf_counter()
+        try:
+            handler.func(payload)
+            result, error, delay = "ok", None, None
+        except RetryLater as e:
+            result, error, delay = "retry", str(e), e.delay
+        except Exception as e:
+            logger.exception(f"Job {job['id']} ({job['kind']}) failed")
+            result, error, delay = "failed", f"{type(e).__name__}: {e}", backoff(job['attempts'])
+        job_duration.observe((job['kind'], result), time.perf_counter() - started)
+        return result, error, delay
+
+    def run_batch(self, limit: int = JOB_BATCH_SIZE, kinds=None) -> int:
+        """Claim up to limit ready jobs, run them and record the outcomes. Returns the number claimed."""
+        conn = get_connection()
+        cur = conn.cursor()
+        try:
+            jobs = self.claim(cur, limit, kinds)
+            conn.commit()
+        finally:
+            cur.close()
+            conn.close()
+        if not jobs:
+            return 0
+
+        # Handlers call Telegram/Cloudinary; no pooled connection is held
+        # meanwhile, the lease keeps the batch away from other workers
+        outcomes = [(job, *self._run(job)) for job in jobs]
+
+        conn = get_connection()
+        cur = conn.cursor()
+        try:
+            done = []
+            for job, result, error, delay in outcomes:
+                if error is None:
+                    done.append(job['id'])
+                elif result != "retry" and job['attempts'] >= job['max_attempts']:
+                    cur.execute("""
+                        WITH dead AS (DELETE FROM job_queue WHERE id = %s RETURNING *)
+                        INSERT INTO job_queue_dead (id, kind, payload, priority, attempts, last_error,
+                                                    dedupe_key, created_at)
+                        SELECT id, kind, payload, priority, attempts, %s, dedupe_key, created_at FROM dead
+                    """, (job['id'], error))
+                    logger.error(f"Job {job['id']} ({job['kind']}) dead after {job['attempts']} attempts")
+                    result = "dead"
+                else:
+                    # A RetryLater doesn't use up an attempt
+                    cur.execute("""
+                        UPDATE job_queue
+                        SET run_at = NOW() + make_interval(secs => %s), locked_until = NULL,
+                            locked_by = NULL, last_error = %s, attempts = attempts - %s
+                        WHERE id = %s
+                    """, (delay, error, 1 if result == "retry" else 0, job['id']))
+                job_results.inc((job['kind'], result))
+            if done:
+                cur.execute("DELETE FROM job_queue WHERE id = ANY(%s)", (done,))
+            # Delivery is at least once: if the worker dies before this commit,
+            # the batch runs again when its lease expires
+            conn.commit()
+            return len(jobs)
+        finally:
+            cur.close()
+            conn.close()
+
+    def wake(self, event=None):
+        self.wake_event.set()
+
+    def attach(self, bus):
+        """Start on new work as soon as any process enqueues it"""
+        bus.subscribe(events.JOB_ENQUEUED, self.wake)
+
+    def work(self):
+        while not self.stop_event.is_set():
+            try:
+                claimed = self.run_batch()
+            except Exception as e:
+                logger.error(f"Job worker could not claim work: {e}")
+                claimed = 0
+            if claimed:
+                continue
+            self.wake_event.wait(JOB_POLL_INTERVAL)
+            self.wake_event.clear()
+
+    def start(self, threads: int = JOB_WORKER_THREADS):
+        if threads <= 0 or not self.handlers:
+            return
+        if not os.getenv("DATABASE_URL"):
+            logger.warning("DATABASE_URL not set; job workers disabled")
+            return
+        self.stop_event.clear()
+        self.threads = [threading.Thread(target=self.work, name=f"job-worker-{i}", daemon=True)
+                        for i in range(threads)]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake_event.set()
+        for thread in self.threads:
+            thread.join(timeout=30)
+        self.threads = []
+
+    def stats(self):
+        """Jobs per kind: ready, scheduled (waiting on run_at), running and dead"""
+        conn = get_connection()
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT kind,
+                   COUNT(*) FILTER (WHERE run_at <= NOW() AND (locked_until IS NULL OR locked_until < NOW())) as ready,
+                   COUNT(*) FILTER (WHERE run_at > NOW() AND locked_until IS NULL) as scheduled,
+                   COUNT(*) FILTER (WHERE locked_until >= NOW()) as running,
+                   0 as dead
+            FROM job_queue GROUP BY kind
+        """)
+        stats = {row['kind']: dict(row) for row in cur.fetchall()}
+        cur.execute("SELECT kind, COUNT(*) as dead FROM job_queue_dead GROUP BY kind")
+        for row in cur.fetchall():
+            stats.setdefault(row['kind'], {"kind": row['kind'], "ready": 0, "scheduled": 0, "running": 0})
+            stats[row['kind']]["dead"] = row['dead']
+        cur.close()
+        conn.close()
+        return sorted(stats.values(), key=lambda row: row['kind'])
+
+    def retry_dead(self, kind: str = None) -> int:
+        """
+        Move dead jobs (of kind, or all) back into the queue with fresh
+        attempts. A job whose dedupe_key is already queued stays dead, to be
+        retried once that one is gone.
+        """
+        conn = get_connection()
+        cur = conn.cursor()
+        # Jobs go back under their original id, so exactly the rows that were
+        # inserted can be removed from job_queue_dead
+        cur.execute("""
+            WITH dead AS (
+                SELECT * FROM job_queue_dead WHERE %(kind)s::text IS NULL OR kind = %(kind)s FOR UPDATE
+            ),
+            revived AS (
+                INSERT INTO job_queue (id, kind, payload, priority, max_attempts, dedupe_key, created_at)
+                SELECT id, kind, payload, priority, %(max_attempts)s, dedupe_key, created_at FROM dead
+                ON CONFLICT DO NOTHING
+                RETURNING id
+            ),
+            removed AS (
+                DELETE FROM job_queue_dead WHERE id IN (SELECT id FROM revived) RETURNING id
+            )
+            SELECT (SELECT COUNT(*) FROM dead) as dead, (SELECT COUNT(*) FROM removed) as revived
+        """, {"kind": kind, "max_attempts": DEFAULT_MAX_ATTEMPTS})
+        counts = cur.fetchone()
+        revived = counts['revived']
+        if counts['dead'] > revived:
+            logger.warning(f"Kept {counts['dead'] - revived} dead jobs whose dedupe_key is already queued")
+        events.notify(cur, events.JOB_ENQUEUED, kind=kind)
+        conn.commit()
+        cur.close()
+        conn.close()
+        return revived
+
+
+def render_metrics():
+    lines = [
+        "# HELP job_queue_job_duration_seconds Background job run time by kind and outcome",
+        "# TYPE job_queue_job_duration_seconds histogram",
+    ]
+    lines += job_duration.render("job_queue_job_duration_seconds", ("kind", "result"))
+    lines += [
+        "# HELP job_queue_jobs_total Background job runs by kind and result (ok, retry, failed, dead)",
+        "# TYPE job_queue_jobs_total counter",
+    ]
+    lines += job_results.render("job_queue_jobs_total", ("kind", "result"))
+    return lines
+
+
+register_collector(render_metrics)
+
+job_queue = JobQueue()
@@ -0,0 +1,231 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from psycopg2.extras import RealDictCursor
+
+from . import query_log
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Per-request database counters: [queries, seconds, rows, connections]
+_db_stats = ContextVar("db_stats", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                # One slot per bucket plus +Inf, then sum
+                series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self, name: str, label_names: tuple):
+        lines = []
+        with self.lock:
+            items = [(labels, list(series)) for labels, series in self.series.items()]
+        for labels, series in sorted(items):
+            base = ",".join(f'{k}="{v}"' for k, v in zip(label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{base},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{base}}} {series[-1]:.6f}")
+            lines.append(f"{name}_count{{{base}}} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self):
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def inc(self, labels: tuple, value=1):
+        with self.lock:
+            self.series[labels] = self.series.get(labels, 0) + value
+
+    def render(self, name: str, label_names: tuple):
+        with self.lock:
+            items = sorted(self.series.items())
+        lines = []
+        for labels, value in items:
+            base = ",".join(f'{k}="{v}"' for k, v in zip(label_names, labels))
+            lines.append(f"{name}{{{base}}} {value:g}")
+        return lines
+
+
+request_latency = Histogram(LATENCY_BUCKETS)
+request_db_time = Histogram(DB_TIME_BUCKETS)
+db_queries = Counter()
+db_rows = Counter()
+db_connections = Counter()
+
+# Extra exporters registered by other modules: callables returning text lines
+_collectors = []
+
+
+def register_collector(func):
+    """Add a callable whose returned lines are appended to /api/metrics"""
+    _collectors.append(func)
+    return func
+
+
+register_collector(query_log.render_metrics)
+
+
+def _route_label(scope):
+    # Label by route template, not raw path, to keep series cardinality bounded
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    paths = _endpoint_paths(scope["app"])
+    return paths.get(endpoint, "unmatched")
+
+
+_paths_cache = {}
+
+
+def _endpoint_paths(app):
+    paths = _paths_cache.get(id(app))
+    if paths is None:
+        paths = {
+            route.endpoint: route.path
+            for route in getattr(app, "routes", [])
+            if hasattr(route, "endpoint")
+        }
+        _paths_cache[id(app)] = paths
+    return paths
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording latency and DB usage per route and status
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = [0, 0.0, 0, 0]
+        token = _db_stats.set(stats)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _db_stats.reset(token)
+            route = _route_label(scope)
+            request_latency.observe((scope["method"], route, str(status[0])), elapsed)
+            if stats[0] or stats[3]:
+                request_db_time.observe((route,), stats[1])
+                db_queries.inc((route,), stats[0])
+                db_rows.inc((route,), stats[2])
+                db_connections.inc((route,), stats[3])
+
+
+def current_db_stats():
+    """Database counters of the request being handled, or None outside a request"""
+    return _db_stats.get()
+
+
+def record_connection():
+    stats = _db_stats.get()
+    if stats is not None:
+        stats[3] += 1
+    else:
+        db_connections.inc(("background",))
+
+
+def record_query(seconds: float, rows: int):
+    stats = _db_stats.get()
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += seconds
+        stats[2] += rows
+    else:
+        db_queries.inc(("background",))
+        db_rows.inc(("background",), rows)
+
+
+class TrackedCursor(RealDictCursor):
+    """
+    RealDictCursor that reports query count, time and rows to the metrics
+    and hands statements slower than SLOW_QUERY_MS to the slow query log
+    """
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            elapsed = time.perf_counter() - start
+            record_query(elapsed, max(self.rowcount, 0))
+            if elapsed >= query_log.SLOW_QUERY_SECONDS:
+                query_log.record_slow(self, query, vars, elapsed)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            elapsed = time.perf_counter() - start
+            record_query(elapsed, max(self.rowcount, 0))
+            if elapsed >= query_log.SLOW_QUERY_SECONDS:
+                query_log.record_slow(self, query, None, elapsed)
+
+
+def render_metrics():
+    """Prometheus text exposition of all collected metrics"""
+    lines = [
+        "# HELP http_request_duration_seconds HTTP request latency by route and status",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    lines += request_latency.render("http_request_duration_seconds", ("method", "route", "status"))
+    lines += [
+        "# HELP http_request_db_seconds Database time spent per request",
+        "# TYPE http_request_db_seconds histogram",
+    ]
+    lines += request_db_time.render("http_request_db_seconds", ("route",))
+    lines += [
+        "# HELP db_queries_total Queries executed",
+        "# TYPE db_queries_total counter",
+    ]
+    lines += db_queries.render("db_queries_total", ("route",))
+    lines += [
+        "# HELP db_rows_total Rows returned or affected by queries",
+        "# TYPE db_rows_total counter",
+    ]
+    lines += db_rows.render("db_rows_total", ("route",))
+    lines += [
+        "# HELP db_connections_total Database connections opened",
+        "# TYPE db_connections_total counter",
+    ]
+    lines += db_connections.render("db_connections_total", ("route",))
+    for collector in _collectors:
+        lines += collector()
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,246 @@
+import argparse
+import csv
+import gzip
+import logging
+import os
+import re
+from datetime import datetime
+from decimal import Decimal
+
+from psycopg2.extras import execute_values
+
+from ..database import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Partition maintenance settings
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+ARCHIVE_AFTER_MONTHS = int(os.getenv("ARCHIVE_AFTER_MONTHS", "6"))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+
+_BOUND = re.compile(r"FROM \((?:MINVALUE|'([^']+)')\) TO \('([^']+)'\)")
+
+
+def ensure_partitions(months_ahead: int = PARTITION_MONTHS_AHEAD):
+    """
+    Create task_submissions partitions for the coming months, moving in rows
+    that landed in the default partition meanwhile
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT create_task_submission_partitions(%s) as created", (months_ahead,))
+    created = cur.fetchone()['created']
+    conn.commit()
+    cur.execute("""
+        SELECT COUNT(*) as count, MIN(created_at) as oldest, MAX(created_at) as newest
+        FROM task_submissions_default
+    """)
+    stray = cur.fetchone()
+    if stray['count']:
+        logger.error(
+            f"{stray['count']} submissions from {stray['oldest']} to {stray['newest']} are in "
+            f"task_submissions_default, outside any monthly partition; create partitions for "
+            f"those months by hand"
+        )
+    cur.close()
+    conn.close()
+    return created
+
+
+def list_partitions(cur):
+    """
+    Attached task_submissions partitions as (name, range_start, range_end)
+    """
+    cur.execute("""
+        SELECT c.relname as name, pg_get_expr(c.relpartbound, c.oid) as bound
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'task_submissions'::regclass
+    """)
+    partitions = []
+    for row in cur.fetchall():
+        match = _BOUND.search(row['bound'])
+        if not match:
+            continue
+        start = datetime.fromisoformat(match.group(1)) if match.group(1) else None
+        partitions.append((row['name'], start, datetime.fromisoformat(match.group(2))))
+    return sorted(partitions, key=lambda p: p[2])
+
+
+def archive_partitions(older_than_months: int = ARCHIVE_AFTER_MONTHS, archive_dir: str = ARCHIVE_DIR,
+                       keep_table: bool = False):
+    """
+    Export fully reviewed partitions that ended more than older_than_months
+    ago to gzipped CSV, then detach (and by default drop) them
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT date_trunc('month', NOW()) - make_interval(months => %s) as cutoff", (older_than_months,))
+    cutoff = cur.fetchone()['cutoff']
+
+    archived = []
+    for name, start, end in list_partitions(cur):
+        if end > cutoff:
+            continue
+        # Block reviews on this partition until it is exported and detached
+        cur.execute(f"LOCK TABLE {name} IN SHARE MODE")
+        cur.execute(f"SELECT 1 FROM {name} WHERE status = 'pending' LIMIT 1")
+        if cur.fetchone():
+            conn.rollback()
+            logger.info(f"Skipping {name}: still has pending submissions")
+            continue
+
+        path = os.path.join(archive_dir, f"{name}.csv.gz")
+        with gzip.open(path, "wt", newline="") as f:
+            cur.copy_expert(f"COPY (SELECT * FROM {name} ORDER BY created_at) TO STDOUT WITH CSV HEADER", f)
+        with gzip.open(path, "rt", newline="") as f:
+            exported = sum(1 for _ in csv.reader(f)) - 1
+        cur.execute(f"SELECT COUNT(*) as count FROM {name}")
+        if cur.fetchone()['count'] != exported:
+            conn.rollback()
+            raise RuntimeError(f"Row count mismatch exporting {name}; partition left attached")
+
+        # Carry the partition's totals over for the user_stats check, in the
+        # transaction that detaches it
+        cur.execute(f"""
+            INSERT INTO user_stats_archived (user_id, total_tasks, completed_tasks, total_earned)
+            SELECT ts.user_id,
+                   COUNT(*),
+                   COUNT(*) FILTER (WHERE ts.status = 'success'),
+                   COALESCE(SUM(ts.amount) FILTER (WHERE ts.status = 'success'), 0)
+            FROM {name} ts
+            JOIN users u ON u.id = ts.user_id
+            GROUP BY ts.user_id
+            ON CONFLICT (user_id) DO UPDATE
+            SET total_tasks = user_stats_archived.total_tasks + EXCLUDED.total_tasks,
+                completed_tasks = user_stats_archived.completed_tasks + EXCLUDED.completed_tasks,
+                total_earned = user_stats_archived.total_earned + EXCLUDED.total_earned
+        """)
+        cur.execute(f"ALTER TABLE task_submissions DETACH PARTITION {name}")
+        if not keep_table:
+            cur.execute(f"DROP TABLE {name}")
+        cur.execute("""
+            INSERT INTO task_submission_archives (partition_name, range_start, range_end, path, row_count)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (partition_name) DO UPDATE
+            SET path = EXCLUDED.path, row_count = EXCLUDED.row_count, archived_at = NOW()
+        """, (name, start, end, os.path.abspath(path), exported))
+        conn.commit()
+        archived.append({"partition": name, "rows": exported, "path": path})
+        logger.info(f"Archived {name} ({exported} rows) to {path}")
+
+    cur.close()
+    conn.close()
+    return archived
+
+
+def rebuild_archived_stats():
+    """
+    Recompute user_stats_archived from every archive export, for partitions
+    archived before the table existed. Returns the number of users written.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    # Keeps archive runs out until the rebuilt totals are committed
+    cur.execute("LOCK TABLE user_stats_archived IN EXCLUSIVE MODE")
+    cur.execute("SELECT partition_name, path FROM task_submission_archives")
+    totals = {}
+    for archive in cur.fetchall():
+        if not os.path.exists(archive['path']):
+            conn.rollback()
+            raise RuntimeError(f"Archive file missing for {archive['partition_name']}: {archive['path']}")
+        with gzip.open(archive['path'], "rt", newline="") as f:
+            for row in csv.DictReader(f):
+                if not row['user_id']:
+                    continue
+                entry = totals.setdefault(int(row['user_id']), [0, 0, Decimal(0)])
+                entry[0] += 1
+                if row['status'] == "success":
+                    entry[1] += 1
+                    entry[2] += Decimal(row['amount'])
+    cur.execute("DELETE FROM user_stats_archived")
+    execute_values(cur, """
+        INSERT INTO user_stats_archived (user_id, total_tasks, completed_tasks, total_earned)
+        SELECT v.user_id, v.total_tasks, v.completed_tasks, v.total_earned
+        FROM (VALUES %s) v (user_id, total_tasks, completed_tasks, total_earned)
+        JOIN users u ON u.id = v.user_id
+    """, [(user_id, *entry) for user_id, entry in totals.items()], page_size=1000)
+    conn.commit()
+    cur.close()
+    conn.close()
+    return len(totals)
+
+
+def read_archived_submissions(user_id: int = None, start: datetime = None, end: datetime = None,
+                              limit: int = 100):
+    """
+    Slow path for history that has been archived: scans the gzipped CSV
+    exports overlapping [start, end), newest archive first
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT * FROM task_submission_archives
+        WHERE (%s IS NULL OR range_end > %s)
+          AND (%s IS NULL OR range_start IS NULL OR range_start < %s)
+        ORDER BY range_end DESC
+    """, (start, start, end, end))
+    archives = cur.fetchall()
+    cur.close()
+    conn.close()
+
+    rows = []
+    for archive in archives:
+        if not os.path.exists(archive['path']):
+            logger.warning(f"Archive file missing: {archive['path']}")
+            continue
+        matches = []
+        with gzip.open(archive['path'], "rt", newline="") as f:
+            for row in csv.DictReader(f):
+                if user_id is not None and row['user_id'] != str(user_id):
+                    continue
+                created_at = datetime.fromisoformat(row['created_at'])
+                if (start and created_at < start) or (end and created_at >= end):
+                    continue
+                matches.append(row)
+        # Files are ordered oldest first; callers want newest first
+        rows.extend(reversed(matches))
+        if len(rows) >= limit:
+            break
+    return rows[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="task_submissions partition maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ensure = sub.add_parser("ensure", help="create partitions for the coming months")
+    ensure.add_argument("--months-ahead", type=int, default=PARTITION_MONTHS_AHEAD)
+    archive = sub.add_parser("archive", help="export and detach old reviewed partitions")
+    archive.add_argument("--older-than-months", type=int, default=ARCHIVE_AFTER_MONTHS)
+    archive.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    archive.add_argument("--keep-table", action="store_true", help="detach without dropping")
+    sub.add_parser("list", help="show attached partitions")
+    sub.add_parser("rebuild-stats", help="recompute archived per-user totals from the exports")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "ensure":
+        print(f"Created {ensure_partitions(args.months_ahead)} partitions")
+    elif args.command == "rebuild-stats":
+        print(f"Rebuilt archived totals for {rebuild_archived_stats()} users")
+    elif args.command == "archive":
+        for item in archive_partitions(args.older_than_months, args.archive_dir, args.keep_table):
+            print(f"{item['partition']}: {item['rows']} rows -> {item['path']}")
+    else:
+        conn = get_connection()
+        cur = conn.cursor()
+        for name, start, end in list_partitions(cur):
+            print(f"{name:40} {start or '-inf'} .. {end}")
+        cur.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    # Run with: python -m backend.utils.partitions ensure|archive|list
+    main()
@@ -0,0 +1,197 @@
+import hashlib
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Slow query settings
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_EXPLAIN_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_RATE", "0.1"))
+SLOW_QUERY_MAX_ENTRIES = int(os.getenv("SLOW_QUERY_MAX_ENTRIES", "500"))
+EXPLAIN_TIMEOUT_MS = int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_MS", "30000"))
+
+SLOW_QUERY_SECONDS = SLOW_QUERY_MS / 1000.0
+
+_entries = {}
+_slow_total = 0
+_lock = threading.Lock()
+_explain_queue = queue.Queue(maxsize=16)
+_explain_worker = None
+
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_SKIP_FILES = (os.path.abspath(__file__), os.path.join(_BACKEND_DIR, "utils", "metrics.py"))
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+# Statements that write, lock rows or have side effects. EXPLAIN ANALYZE would
+# really run them, taking the locks and firing the triggers of live work
+# before the rollback, so they get a plain EXPLAIN
+_MODIFYING = re.compile(
+    r"\b(?:INSERT|UPDATE|DELETE|MERGE|TRUNCATE|NEXTVAL|SETVAL|PG_NOTIFY|PG_ADVISORY_\w*)\b"
+    r"|\bFOR\s+(?:NO\s+KEY\s+)?(?:UPDATE|SHARE)\b|\bFOR\s+KEY\s+SHARE\b",
+    re.IGNORECASE,
+)
+
+
+def fingerprint(sql: str) -> str:
+    """
+    Normalise a statement so calls that differ only in literals group together
+    """
+    sql = _STRING.sub("?", sql)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _IN_LIST.sub("(?...)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+def params_shape(params) -> str:
+    if params is None:
+        return "()"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in sorted(params.items())) + "}"
+    return "(" + ", ".join(type(v).__name__ for v in params) + ")"
+
+
+def _call_site():
+    # First frame inside backend/ that is not the cursor machinery itself
+    frame = sys._getframe(2)
+    while frame:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename.startswith(_BACKEND_DIR) and filename not in _SKIP_FILES:
+            relative = os.path.relpath(filename, _BACKEND_DIR)
+            return f"{relative}:{frame.f_lineno} ({frame.f_code.co_name})"
+        frame = frame.f_back
+    return "unknown"
+
+
+def record_slow(cursor, query, params, seconds: float):
+    """
+    Record a statement that ran longer than SLOW_QUERY_MS
+    """
+    global _slow_total
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    elif not isinstance(query, str):
+        # psycopg2.sql.Composed and friends
+        query = query.as_string(cursor)
+
+    fp = fingerprint(query)
+    key = hashlib.md5(fp.encode()).hexdigest()[:16]
+    site = _call_site()
+    ms = seconds * 1000.0
+
+    with _lock:
+        _slow_total += 1
+        entry = _entries.get(key)
+        if entry is None:
+            if len(_entries) >= SLOW_QUERY_MAX_ENTRIES:
+                # Evict the entry with the least total time
+                del _entries[min(_entries, key=lambda k: _entries[k]["total_ms"])]
+            entry = _entries[key] = {
+                "id": key,
+                "fingerprint": fp,
+                "params_shape": params_shape(params),
+                "calls": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "call_sites": {},
+                "first_seen": datetime.now().isoformat(),
+                "last_seen": None,
+                "plan": None,
+                "plan_analyzed": None,
+                "plan_captured_at": None,
+            }
+        entry["calls"] += 1
+        entry["total_ms"] += ms
+        entry["max_ms"] = max(entry["max_ms"], ms)
+        entry["last_seen"] = datetime.now().isoformat()
+        entry["call_sites"][site] = entry["call_sites"].get(site, 0) + 1
+        want_plan = entry["plan"] is None and random.random() < SLOW_QUERY_EXPLAIN_RATE
+
+    if want_plan and fp.lstrip("( ").upper().startswith(("SELECT", "WITH")):
+        analyze = _MODIFYING.search(fp) is None
+        try:
+            _explain_queue.put_nowait((key, cursor.mogrify(query, params), analyze))
+            _ensure_explain_worker()
+        except queue.Full:
+            pass
+
+
+def _ensure_explain_worker():
+    global _explain_worker
+    if _explain_worker and _explain_worker.is_alive():
+        return
+    with _lock:
+        if _explain_worker and _explain_worker.is_alive():
+            return
+        _explain_worker = threading.Thread(target=_explain_loop, name="slow-query-explain", daemon=True)
+        _explain_worker.start()
+
+
+def _explain_loop():
+    import psycopg2.extensions
+
+    from ..database import get_connection
+
+    while True:
+        key, statement, analyze = _explain_queue.get()
+        try:
+            conn = get_connection()
+            try:
+                # Plain cursor so the EXPLAIN itself is not traced
+                cur = conn.cursor(cursor_factory=psycopg2.extensions.cursor)
+                cur.execute("SET LOCAL statement_timeout = %s", (EXPLAIN_TIMEOUT_MS,))
+                cur.execute((b"EXPLAIN (ANALYZE, BUFFERS) " if analyze else b"EXPLAIN ") + statement)
+                plan = "\n".join(row[0] for row in cur.fetchall())
+                cur.close()
+            finally:
+                conn.rollback()
+                conn.close()
+        except Exception as e:
+            logger.warning(f"EXPLAIN for slow query {key} failed: {e}")
+            continue
+
+        with _lock:
+            entry = _entries.get(key)
+            if entry is not None:
+                entry["plan"] = plan
+                entry["plan_analyzed"] = analyze
+                entry["plan_captured_at"] = datetime.now().isoformat()
+
+
+def top_queries(limit: int = 20, order_by: str = "total_ms"):
+    """
+    Top-N slow query fingerprints ordered by total_ms, max_ms or calls
+    """
+    if order_by not in ("total_ms", "max_ms", "calls"):
+        order_by = "total_ms"
+    with _lock:
+        entries = [dict(e, call_sites=dict(e["call_sites"])) for e in _entries.values()]
+    entries.sort(key=lambda e: e[order_by], reverse=True)
+    for entry in entries:
+        entry["avg_ms"] = round(entry["total_ms"] / entry["calls"], 3)
+        entry["total_ms"] = round(entry["total_ms"], 3)
+        entry["max_ms"] = round(entry["max_ms"], 3)
+    return entries[:limit]
+
+
+def reset():
+    with _lock:
+        _entries.clear()
+
+
+def render_metrics():
+    return [
+        "# HELP db_slow_queries_total Statements slower than the slow query threshold",
+        "# TYPE db_slow_queries_total counter",
+        f"db_slow_queries_total {_slow_total}",
+    ]
@@ -0,0 +1,357 @@
+"""
+Per-user and per-IP request limits for abuse-prone routes, shared by every
+worker and host through the UNLOGGED rate_limit_counters table.
+
+    @app.post("/api/submit-task")
+    @rate_limit(per_user=10, per_ip=30, window=60)
+
+Each key (route plus telegram_id, route plus client IP) has one counter row
+per fixed window. A request is weighed against a sliding window: this
+window's count plus the previous window's, scaled by how much of it still
+overlaps. Checks run on a few connections per process
+(RATE_LIMIT_CONNECTIONS) kept apart from the main pool, and a key that has
+been limited is remembered in memory until its Retry-After has
+passed, so repeated requests get a 429 without a query. If the counters
+can't be reached within RATE_LIMIT_TIMEOUT_MS, including waiting for one of those
+connections, the request is let through.
+
+telegram_id is read from the path or query, the X-Telegram-Id header, or a
+small urlencoded form body, in that order. Since the client picks it, the
+per-IP limit is the one that holds; the address is the hop appended by our
+own proxies (TRUSTED_PROXY_COUNT), never an X-Forwarded-For entry the client
+could have written itself.
+"""
+import json
+import logging
+import math
+import os
+import threading
+import time
+from urllib.parse import parse_qs
+
+import psycopg2
+from starlette.concurrency import run_in_threadpool
+
+from ..database import get_connection
+from .http_cache import match_route
+from .metrics import Counter, register_collector
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+RATE_LIMIT_TIMEOUT_MS = int(os.getenv("RATE_LIMIT_TIMEOUT_MS", "200"))
+# Connections per process for counter checks, outside DB_POOL_SIZE
+RATE_LIMIT_CONNECTIONS = int(os.getenv("RATE_LIMIT_CONNECTIONS", "3"))
+# Reverse proxies in front of the app that append to X-Forwarded-For (one on
+# Render); 0 when clients connect directly
+TRUSTED_PROXY_COUNT = int(os.getenv("TRUSTED_PROXY_COUNT", "1"))
+# Counter rows older than this are deleted by the purge_rate_limits job
+RATE_LIMIT_RETENTION_SECONDS = 3600
+# Limited keys remembered per process
+BLOCKED_KEYS_MAX = 100000
+# Larger form bodies aren't buffered to look for telegram_id
+MAX_FORM_BYTES = 4096
+# After a failed connect, let requests through without retrying for this long
+RECONNECT_DELAY = 5.0
+
+HIT_SQL = """
+    WITH now AS (SELECT EXTRACT(EPOCH FROM clock_timestamp())::float8 as at),
+    hit AS (
+        INSERT INTO rate_limit_counters (key, window_start, hits)
+        SELECT key, floor(now.at / %(window)s)::bigint * %(window)s, 1
+        FROM unnest(%(keys)s::text[]) key, now
+        ON CONFLICT (key, window_start) DO UPDATE SET hits = rate_limit_counters.hits + 1
+        RETURNING key, window_start, hits
+    )
+    SELECT hit.key, hit.hits, now.at - hit.window_start as elapsed, COALESCE(previous.hits, 0) as previous
+    FROM hit
+    CROSS JOIN now
+    LEFT JOIN rate_limit_counters previous
+        ON previous.key = hit.key AND previous.window_start = hit.window_start - %(window)s
+"""
+
+rate_limit_requests = Counter()
+
+
+class RateLimitPolicy:
+    def __init__(self, per_user: int, per_ip: int, window: int):
+        self.per_user = per_user
+        self.per_ip = per_ip
+        self.window = window
+
+
+def rate_limit(per_user: int, per_ip: int, window: int = 60):
+    """
+    Allow a route per_user requests per telegram_id and per_ip requests per
+    client address in any window seconds. RateLimitMiddleware answers the
+    rest with 429 before the handler runs.
+    """
+    def decorator(func):
+        func.rate_limit_policy = RateLimitPolicy(per_user, per_ip, window)
+        return func
+    return decorator
+
+
+def retry_after(previous: int, hits: int, elapsed: float, window: int, limit: int) -> float:
+    """Seconds until one more request fits under limit, if no others are counted meanwhile"""
+    room = limit - hits - 1
+    if room >= 0 and previous:
+        # Still this window, once enough of the previous one has slid out
+        return max((1 - room / previous) * window - elapsed, 1.0)
+    # Next window, once enough of this one has slid out
+    return window - elapsed + max(0.0, 1 - (limit - 1) / hits) * window
+
+
+class RateLimiter:
+    def __init__(self, size: int = RATE_LIMIT_CONNECTIONS):
+        self.size = size
+        self.idle = []
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(size)
+        self.blocked = {}
+        self.blocked_lock = threading.Lock()
+        self.retry_connect_at = 0.0
+
+    def blocked_for(self, keys) -> float:
+        """Seconds left on the longest in-memory block among keys, or 0"""
+        now = time.monotonic()
+        longest = 0.0
+        with self.blocked_lock:
+            for key in keys:
+                until = self.blocked.get(key)
+                if until is None:
+                    continue
+                if until <= now:
+                    del self.blocked[key]
+                else:
+                    longest = max(longest, until - now)
+        return longest
+
+    def _block(self, key, seconds: float):
+        with self.blocked_lock:
+            self.blocked.pop(key, None)
+            self.blocked[key] = time.monotonic() + seconds
+            while len(self.blocked) > BLOCKED_KEYS_MAX:
+                self.blocked.pop(next(iter(self.blocked)))
+
+    def _checkout(self):
+        # Own connections, outside the pool; a forked child starts afresh
+        # without touching the parent's sockets
+        with self.lock:
+            if self.pid != os.getpid():
+                self.idle = []
+                self.slots = threading.BoundedSemaphore(self.size)
+                self.pid = os.getpid()
+            slots = self.slots
+        if not slots.acquire(timeout=RATE_LIMIT_TIMEOUT_MS / 1000):
+            return slots, None
+        with self.lock:
+            while self.idle:
+                conn = self.idle.pop()
+                if not conn.closed:
+                    return slots, conn
+        try:
+            conn = psycopg2.connect(
+                os.getenv("DATABASE_URL"),
+                connect_timeout=2,
+                options=f"-c statement_timeout={RATE_LIMIT_TIMEOUT_MS}",
+            )
+        except psycopg2.Error:
+            slots.release()
+            raise
+        conn.autocommit = True
+        return slots, conn
+
+    def _checkin(self, slots, conn):
+        with self.lock:
+            if not conn.closed and slots is self.slots:
+                self.idle.append(conn)
+        slots.release()
+
+    def hit(self, limits: dict, window: int):
+        """
+        Count a request against each key in limits ({key: limit}). Returns
+        the seconds to wait if any key is over its limit, 0 if the request
+        is allowed, or None if the counters couldn't be reached.
+        """
+        if time.monotonic() < self.retry_connect_at:
+            return None
+        try:
+            slots, conn = self._checkout()
+        except psycopg2.Error as e:
+            logger.warning(f"Rate limit check failed, allowing request: {e}")
+            self.retry_connect_at = time.monotonic() + RECONNECT_DELAY
+            return None
+        if conn is None:
+            # Every connection busy for RATE_LIMIT_TIMEOUT_MS
+            return None
+        try:
+            cur = conn.cursor()
+            cur.execute(HIT_SQL, {"keys": list(limits), "window": window})
+            rows = cur.fetchall()
+            cur.close()
+        except psycopg2.Error as e:
+            logger.warning(f"Rate limit check failed, allowing request: {e}")
+            if conn.closed:
+                self.retry_connect_at = time.monotonic() + RECONNECT_DELAY
+            return None
+        finally:
+            self._checkin(slots, conn)
+        wait = 0.0
+        for key, hits, elapsed, previous in rows:
+            limit = limits[key]
+            if previous * (1 - elapsed / window) + hits > limit:
+                seconds = retry_after(previous, hits, elapsed, window, limit)
+                self._block(key, seconds)
+                wait = max(wait, seconds)
+        return wait
+
+
+def purge_expired(older_than: int = RATE_LIMIT_RETENTION_SECONDS) -> int:
+    """Delete counter rows for windows that started more than older_than seconds ago"""
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        DELETE FROM rate_limit_counters
+        WHERE window_start < EXTRACT(EPOCH FROM NOW()) - %s
+    """, (older_than,))
+    deleted = cur.rowcount
+    conn.commit()
+    cur.close()
+    conn.close()
+    return deleted
+
+
+def _telegram_id(scope, child_scope, body: bytes = None):
+    value = child_scope.get("path_params", {}).get("telegram_id")
+    if value is None:
+        value = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("telegram_id", [None])[0]
+    if value is None:
+        for name, header in scope["headers"]:
+            if name == b"x-telegram-id":
+                value = header.decode("latin-1")
+    if value is None and body:
+        value = parse_qs(body.decode("latin-1")).get("telegram_id", [None])[0]
+    value = str(value).strip() if value is not None else ""
+    return value if value.isdigit() else None
+
+
+def peer_ip(scope, trusted_proxies: int = TRUSTED_PROXY_COUNT):
+    """
+    Address that connected to our outermost proxy: the X-Forwarded-For entry
+    trusted_proxies from the end. Entries before it are client supplied.
+    """
+    client = scope.get("client")
+    address = client[0] if client else "unknown"
+    if trusted_proxies <= 0:
+        return address
+    forwarded = []
+    for name, value in scope["headers"]:
+        if name == b"x-forwarded-for":
+            forwarded += [part.strip() for part in value.decode("latin-1").split(",") if part.strip()]
+    if len(forwarded) >= trusted_proxies:
+        return forwarded[-trusted_proxies]
+    return address
+
+
+def _form_length(scope):
+    """Content length of a urlencoded body small enough to read, else None"""
+    content_type = length = None
+    for name, value in scope["headers"]:
+        if name == b"content-type":
+            content_type = value.split(b";")[0].strip().lower()
+        elif name == b"content-length":
+            length = int(value) if value.isdigit() else None
+    if content_type != b"application/x-www-form-urlencoded" or length is None or length > MAX_FORM_BYTES:
+        return None
+    return length
+
+
+class RateLimitMiddleware:
+    """
+    Pure ASGI middleware enforcing rate_limit policies. Sits inside
+    CORSMiddleware so browsers can read the 429, and outside everything
+    that takes a pooled connection.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not RATE_LIMIT_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        route, child_scope = match_route(scope)
+        policy = getattr(getattr(route, "endpoint", None), "rate_limit_policy", None)
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+
+        body = None
+        telegram_id = _telegram_id(scope, child_scope)
+        if telegram_id is None and _form_length(scope) is not None:
+            chunks = []
+            while True:
+                message = await receive()
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body"):
+                    break
+            body = b"".join(chunks)
+            telegram_id = _telegram_id(scope, child_scope, body)
+
+        limits = {f"{route.path}|ip:{peer_ip(scope)}": policy.per_ip}
+        if telegram_id is not None:
+            limits[f"{route.path}|user:{telegram_id}"] = policy.per_user
+
+        wait = limiter.blocked_for(limits)
+        if not wait:
+            wait = await run_in_threadpool(limiter.hit, limits, policy.window)
+        if wait:
+            rate_limit_requests.inc((route.path, "limited"))
+            await self._reject(send, wait)
+            return
+        rate_limit_requests.inc((route.path, "allowed" if wait is not None else "unavailable"))
+
+        if body is None:
+            await self.app(scope, receive, send)
+            return
+
+        sent = False
+
+        async def replay_body():
+            nonlocal sent
+            if sent:
+                return await receive()
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        await self.app(scope, replay_body, send)
+
+    async def _reject(self, send, wait: float):
+        seconds = math.ceil(wait)
+        body = json.dumps({"detail": f"Too many requests, retry in {seconds}s"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(seconds).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def render_metrics():
+    lines = [
+        "# HELP rate_limit_requests_total Requests to rate limited routes by outcome",
+        "# TYPE rate_limit_requests_total counter",
+    ]
+    lines += rate_limit_requests.render("rate_limit_requests_total", ("route", "result"))
+    return lines
+
+
+register_collector(render_metrics)
+
+limiter = RateLimiter()
@@ -0,0 +1,121 @@
+import logging
+import os
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from ..database import get_connection
+
+logger = logging.getLogger(__name__)
+
+REFERRAL_BONUS = Decimal(os.getenv("REFERRAL_BONUS", "5"))
+REFERRAL_SETTLEMENT_BATCH = int(os.getenv("REFERRAL_SETTLEMENT_BATCH", "500"))
+# processed_at is set inside the processing transaction, so a withdrawal can
+# commit after the watermark has already moved past it. Every run re-reads
+# this far behind the watermark; the pair index makes the overlap free.
+SETTLEMENT_LOOKBACK = timedelta(minutes=10)
+
+WATERMARK = "referral_bonuses"
+_EPOCH = datetime(1970, 1, 1)
+
+# One bonus per pair (the first completed withdrawal wins), a ledger row per
+# bonus and one aggregated balance UPDATE for every referrer in the batch
+SETTLE_SQL = """
+    WITH qualifying AS (
+        SELECT DISTINCT ON (r.id) ref.id as referrer_id, r.id as referred_id
+        FROM withdrawals w
+        JOIN users r ON r.id = w.user_id
+        JOIN users ref ON ref.refer_code = r.referred_by
+        WHERE w.id = ANY(%(withdrawal_ids)s) AND ref.id <> r.id
+        ORDER BY r.id, w.processed_at, w.id
+    ), bonuses AS (
+        INSERT INTO referral_bonuses (referrer_id, referred_id, amount, status, created_at, credited_at)
+        SELECT referrer_id, referred_id, %(bonus)s, 'credited', NOW(), NOW() FROM qualifying
+        ON CONFLICT (referrer_id, referred_id) DO NOTHING
+        RETURNING id, referrer_id, amount
+    ), ledger AS (
+        INSERT INTO transactions (user_id, type, amount, description, reference_id, created_at)
+        SELECT referrer_id, 'referral_bonus', amount, 'Referral bonus', 'RB-' || id, NOW() FROM bonuses
+    ), totals AS (
+        SELECT referrer_id, SUM(amount) as total, COUNT(*) as referrals
+        FROM bonuses
+        GROUP BY referrer_id
+    )
+    UPDATE users u
+    SET balance = u.balance + t.total
+    FROM totals t
+    WHERE u.id = t.referrer_id
+    RETURNING u.id as user_id, t.total, t.referrals
+"""
+
+
+def _watermark(cur):
+    cur.execute("""
+        INSERT INTO settlement_watermarks (name, last_processed_at, last_id)
+        VALUES (%s, %s, 0)
+        ON CONFLICT (name) DO NOTHING
+    """, (WATERMARK, _EPOCH))
+    # Row lock serialises concurrent settlement runs
+    cur.execute("""
+        SELECT last_processed_at, last_id FROM settlement_watermarks WHERE name = %s FOR UPDATE
+    """, (WATERMARK,))
+    row = cur.fetchone()
+    return row['last_processed_at'], row['last_id']
+
+
+def settle_batch(cur, after, batch_size: int = REFERRAL_SETTLEMENT_BATCH):
+    """
+    Credit bonuses for the next batch of completed withdrawals after the
+    (processed_at, id) position `after`. Returns (position of the last
+    withdrawal read or None when there are no more, credited referrers).
+    """
+    cur.execute("""
+        SELECT id, processed_at FROM withdrawals
+        WHERE status = 'completed' AND (processed_at, id) > (%s, %s)
+        ORDER BY processed_at, id
+        LIMIT %s
+    """, (after[0], after[1], batch_size))
+    batch = cur.fetchall()
+    if not batch:
+        return None, []
+    cur.execute(SETTLE_SQL, {"withdrawal_ids": [row['id'] for row in batch], "bonus": REFERRAL_BONUS})
+    credited = cur.fetchall()
+    last = (batch[-1]['processed_at'], batch[-1]['id'])
+    cur.execute("""
+        UPDATE settlement_watermarks
+        SET last_processed_at = %s, last_id = %s, updated_at = NOW()
+        WHERE name = %s AND (last_processed_at, last_id) < (%s, %s)
+    """, (last[0], last[1], WATERMARK, last[0], last[1]))
+    return last, credited
+
+
+def settle(batch_size: int = REFERRAL_SETTLEMENT_BATCH, on_credit=None):
+    """
+    Credit every referral bonus earned since the last run, one transaction
+    per batch. on_credit(cur, credited) runs inside each batch's transaction,
+    e.g. to queue notifications. Returns the number of bonuses credited.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    total = 0
+    try:
+        last_at, last_id = _watermark(cur)
+        position = (max(last_at - SETTLEMENT_LOOKBACK, _EPOCH), 0)
+        while True:
+            position, credited = settle_batch(cur, position, batch_size)
+            if credited and on_credit is not None:
+                on_credit(cur, credited)
+            conn.commit()
+            total += sum(row['referrals'] for row in credited)
+            if position is None:
+                break
+            # Re-take the row lock for the next batch
+            _watermark(cur)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+    if total:
+        logger.info(f"Credited {total} referral bonuses")
+    return total
@@ -0,0 +1,227 @@
+"""
+Routing of read-only queries to streaming replicas.
+
+    DATABASE_REPLICA_URLS=postgresql://...@replica1/db,postgresql://...@replica2/db
+
+get_read_connection() returns a connection to a healthy replica whose replay
+lag is within REPLICA_MAX_LAG_SECONDS, or to the primary when there is none.
+Write paths call mark_write(cur, key) in their transaction; reads for the same
+key (a telegram_id, or "admin") then stay on the primary for
+READ_YOUR_WRITES_SECONDS. Other workers learn about the write from the event
+bus, so a read landing on another worker in the few milliseconds before the
+NOTIFY arrives can still go to a replica.
+
+    python -m backend.utils.replicas status
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+
+import psycopg2
+
+from ..database import connect_to, get_connection
+from . import events
+from .metrics import Counter, register_collector
+
+logger = logging.getLogger(__name__)
+
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", "5"))
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "10"))
+# Recent writers remembered per process
+RECENT_WRITERS_MAX = 100000
+
+# Zero when everything received has been replayed, so an idle primary
+# doesn't read as a growing lag. That only holds while the WAL receiver is
+# streaming: a standby cut off from the primary has nothing new to receive
+# and would report zero forever, so it is checked separately.
+LAG_SQL = """
+    SELECT pg_is_in_recovery() as in_recovery,
+           EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') as streaming,
+           CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE COALESCE(EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp()), 0)
+           END as lag
+"""
+
+read_routes = Counter()
+
+
+def replica_urls():
+    return [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+
+
+class Replica:
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self.healthy = False
+        self.lag = None
+        self.checked_at = 0.0
+        self.error = None
+
+    @property
+    def name(self):
+        # Host part only; the DSN carries the password
+        return self.dsn.rsplit("@", 1)[-1]
+
+    def check(self):
+        conn = None
+        try:
+            conn = psycopg2.connect(self.dsn, connect_timeout=2)
+            cur = conn.cursor()
+            cur.execute(LAG_SQL)
+            in_recovery, streaming, lag = cur.fetchone()
+            cur.close()
+            self.lag = float(lag)
+            self.healthy = in_recovery and streaming and self.lag <= REPLICA_MAX_LAG_SECONDS
+            if not in_recovery:
+                self.error = "not in recovery (promoted?)"
+            elif not streaming:
+                self.error = "WAL receiver not streaming from the primary"
+            else:
+                self.error = None
+        except psycopg2.Error as e:
+            self.healthy = False
+            self.lag = None
+            self.error = str(e).strip()
+        finally:
+            if conn is not None:
+                conn.close()
+            self.checked_at = time.monotonic()
+        if not self.healthy:
+            logger.warning(f"Replica {self.name} unavailable: {self.error or f'lag {self.lag:.1f}s'}")
+
+
+class ReplicaRouter:
+    def __init__(self, urls=None):
+        self.replicas = [Replica(url) for url in (replica_urls() if urls is None else urls)]
+        self.recent_writers = {}
+        self.lock = threading.Lock()
+        self.check_lock = threading.Lock()
+        self.next_replica = 0
+
+    def mark_write(self, cur, key):
+        """
+        Pin reads for key to the primary for READ_YOUR_WRITES_SECONDS; call in
+        the writing transaction so other workers hear about it on commit
+        """
+        self._remember(key)
+        if self.replicas:
+            events.notify(cur, events.USER_WROTE, key=key)
+
+    def _remember(self, key):
+        with self.lock:
+            self.recent_writers.pop(key, None)
+            self.recent_writers[key] = time.monotonic() + READ_YOUR_WRITES_SECONDS
+            while len(self.recent_writers) > RECENT_WRITERS_MAX:
+                self.recent_writers.pop(next(iter(self.recent_writers)))
+
+    def _pinned(self, key) -> bool:
+        if key is None:
+            return False
+        with self.lock:
+            until = self.recent_writers.get(key)
+            if until is None:
+                return False
+            if until <= time.monotonic():
+                del self.recent_writers[key]
+                return False
+            return True
+
+    def _refresh(self):
+        # One thread re-checks at a time; the rest go on with the last result
+        if not self.check_lock.acquire(blocking=False):
+            return
+        try:
+            now = time.monotonic()
+            for replica in self.replicas:
+                if now - replica.checked_at >= REPLICA_CHECK_INTERVAL:
+                    replica.check()
+        finally:
+            self.check_lock.release()
+
+    def pick(self, key=None):
+        """The replica to read from, or None for the primary"""
+        if not self.replicas:
+            return None
+        if self._pinned(key):
+            read_routes.inc(("primary", "recent_write"))
+            return None
+        self._refresh()
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            read_routes.inc(("primary", "no_replica"))
+            return None
+        with self.lock:
+            self.next_replica = (self.next_replica + 1) % len(healthy)
+            replica = healthy[self.next_replica]
+        read_routes.inc((replica.name, "replica"))
+        return replica
+
+    def get_read_connection(self, key=None):
+        """
+        Connection for read-only queries on behalf of key. Falls back to the
+        primary if the chosen replica refuses the connection.
+        """
+        replica = self.pick(key)
+        if replica is not None:
+            try:
+                return connect_to(replica.dsn)
+            except psycopg2.OperationalError as e:
+                replica.healthy = False
+                replica.error = str(e).strip()
+                read_routes.inc(("primary", "replica_failed"))
+        return get_connection()
+
+    def attach(self, bus):
+        """Learn about writes committed by other workers"""
+        bus.subscribe(events.USER_WROTE, lambda event: self._remember(event.get("key")))
+
+    def render_metrics(self):
+        lines = [
+            "# HELP db_read_routes_total Read-only connections by target and reason",
+            "# TYPE db_read_routes_total counter",
+        ]
+        lines += read_routes.render("db_read_routes_total", ("target", "reason"))
+        lines += [
+            "# HELP db_replica_lag_seconds Replay lag at the last health check",
+            "# TYPE db_replica_lag_seconds gauge",
+        ]
+        for replica in self.replicas:
+            if replica.lag is not None:
+                lines.append(f'db_replica_lag_seconds{{replica="{replica.name}"}} {replica.lag:.3f}')
+        return lines
+
+
+replicas = ReplicaRouter()
+register_collector(replicas.render_metrics)
+
+
+def get_read_connection(key=None):
+    return replicas.get_read_connection(key)
+
+
+def mark_write(cur, key):
+    replicas.mark_write(cur, key)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="read replica routing")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="health and lag of each configured replica")
+    parser.parse_args()
+
+    if not replicas.replicas:
+        print("No replicas configured (DATABASE_REPLICA_URLS)")
+        return
+    for replica in replicas.replicas:
+        replica.check()
+        state = "healthy" if replica.healthy else "unhealthy"
+        lag = f"{replica.lag:.3f}s" if replica.lag is not None else "-"
+        print(f"{replica.name:40} {state:10} lag {lag:10} {replica.error or ''}")
+
+
+if __name__ == "__main__":
+    # Run with: python -m backend.utils.replicas status
+    main()
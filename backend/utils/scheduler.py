@@ -0,0 +1,283 @@
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from ..database import connect, get_connection
+from .metrics import Counter, Histogram, register_collector
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "1") == "1"
+SCHEDULER_TIMEZONE = os.getenv("SCHEDULER_TIMEZONE", "Asia/Dhaka")
+SCHEDULER_TICK = 5.0
+
+# First key of the two-key advisory locks, one lock per job name
+SCHEDULER_LOCK_ID = 720335
+
+JOB_DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+job_duration = Histogram(JOB_DURATION_BUCKETS)
+job_failures = Counter()
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+def _parse_field(spec: str, low: int, high: int):
+    values = set()
+    for part in spec.split(","):
+        step = 1
+        if "/" in part:
+            part, step = part.split("/")
+            step = int(step)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(x) for x in part.split("-"))
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if start < low or end > high:
+            raise ValueError(f"Cron field {spec!r} out of range {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class Cron:
+    """
+    Five-field cron expression (minute hour day month weekday), weekday 0 = Sunday
+    """
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Expected 5 cron fields, got {expression!r}")
+        self.expression = expression
+        self.minutes = _parse_field(fields[0], 0, 59)
+        self.hours = _parse_field(fields[1], 0, 23)
+        self.days = _parse_field(fields[2], 1, 31)
+        self.months = _parse_field(fields[3], 1, 12)
+        self.weekdays = {d % 7 for d in _parse_field(fields[4], 0, 7)}
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    def _day_matches(self, dt: datetime):
+        in_days = dt.day in self.days
+        in_weekdays = (dt.weekday() + 1) % 7 in self.weekdays
+        # Like cron: when both are restricted either one may match
+        if not self.any_day and not self.any_weekday:
+            return in_days or in_weekdays
+        return in_days and in_weekdays
+
+    def next_after(self, after: datetime):
+        dt = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = after + timedelta(days=366 * 5)
+        while dt <= limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+            elif dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+            elif dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+            else:
+                return dt
+        raise ValueError(f"Cron expression {self.expression!r} never fires")
+
+
+class Job:
+    def __init__(self, name: str, func, interval: float = None, cron: str = None, tz: str = SCHEDULER_TIMEZONE):
+        if (interval is None) == (cron is None):
+            raise ValueError("A job needs exactly one of interval or cron")
+        self.name = name
+        self.func = func
+        self.interval = timedelta(seconds=interval) if interval is not None else None
+        self.cron = Cron(cron) if cron is not None else None
+        self.tz = ZoneInfo(tz)
+
+    @property
+    def schedule(self):
+        if self.cron:
+            return f"cron '{self.cron.expression}' {self.tz.key}"
+        return f"every {self.interval.total_seconds():g}s"
+
+    def next_run(self, after: datetime):
+        if self.interval:
+            return after + self.interval
+        # Cron fields are wall-clock times in the job's timezone
+        local = self.cron.next_after(after.astimezone(self.tz).replace(tzinfo=None))
+        return local.replace(tzinfo=self.tz).astimezone(timezone.utc)
+
+    def first_run(self, now: datetime):
+        # Interval jobs run at startup unless another worker ran them recently
+        return now if self.interval else self.next_run(now)
+
+    def claimed(self, last_started_at, due_at: datetime, now: datetime):
+        """Whether another worker already ran the slot due at due_at"""
+        if last_started_at is None:
+            return False
+        if self.interval:
+            return now - last_started_at < self.interval * 0.9
+        return last_started_at >= due_at
+
+
+class Scheduler:
+    """
+    Runs registered jobs on a background thread. Every worker process runs
+    its own scheduler; a per-job advisory lock plus the scheduled_jobs table
+    make sure each slot is executed by only one of them.
+    """
+
+    def __init__(self):
+        self.jobs = {}
+        self.next_runs = {}
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.conn = None
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+
+    def add_job(self, name: str, func, interval: float = None, cron: str = None, tz: str = SCHEDULER_TIMEZONE):
+        self.jobs[name] = Job(name, func, interval=interval, cron=cron, tz=tz)
+        return func
+
+    def job(self, name: str = None, interval: float = None, cron: str = None, tz: str = SCHEDULER_TIMEZONE):
+        """Decorator form of add_job"""
+        def decorator(func):
+            return self.add_job(name or func.__name__, func, interval=interval, cron=cron, tz=tz)
+        return decorator
+
+    def _lock_connection(self):
+        # Session-level advisory locks live on this connection. It's held for
+        # the process lifetime, so it's opened outside the pool.
+        if self.conn is None or self.conn.closed:
+            self.conn = connect(os.getenv("DATABASE_URL"))
+            self.conn.autocommit = True
+        return self.conn
+
+    def run_job(self, name: str, due_at: datetime = None, force: bool = False):
+        """
+        Run a job if this worker wins its lock and the slot is unclaimed.
+        Returns "ok", "failed", "locked" (running elsewhere) or "skipped".
+        """
+        job = self.jobs[name]
+        now = _utcnow()
+        due_at = due_at or now
+        cur = self._lock_connection().cursor()
+        cur.execute("SELECT pg_try_advisory_lock(%s, hashtext(%s)) as locked", (SCHEDULER_LOCK_ID, name))
+        if not cur.fetchone()['locked']:
+            cur.close()
+            return "locked"
+        try:
+            cur.execute("SELECT last_started_at FROM scheduled_jobs WHERE name = %s", (name,))
+            row = cur.fetchone()
+            if not force and job.claimed(row['last_started_at'] if row else None, due_at, now):
+                return "skipped"
+            cur.execute("""
+                INSERT INTO scheduled_jobs (name, last_started_at, last_worker)
+                VALUES (%s, NOW(), %s)
+                ON CONFLICT (name) DO UPDATE
+                SET last_started_at = NOW(), last_worker = EXCLUDED.last_worker
+            """, (name, self.worker))
+
+            started = time.perf_counter()
+            error = None
+            try:
+                job.func()
+            except Exception as e:
+                logger.exception(f"Scheduled job {name} failed")
+                error = str(e)
+            elapsed = time.perf_counter() - started
+            status = "failed" if error else "ok"
+
+            job_duration.observe((name, status), elapsed)
+            if error:
+                job_failures.inc((name,))
+            cur.execute("""
+                UPDATE scheduled_jobs
+                SET last_finished_at = NOW(), last_duration_ms = %s, last_status = %s, last_error = %s,
+                    run_count = run_count + 1, failure_count = failure_count + %s
+                WHERE name = %s
+            """, (int(elapsed * 1000), status, error, 1 if error else 0, name))
+            logger.info(f"Scheduled job {name} {status} in {elapsed:.2f}s")
+            return status
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s, hashtext(%s))", (SCHEDULER_LOCK_ID, name))
+            cur.close()
+
+    def start(self):
+        if not SCHEDULER_ENABLED:
+            logger.info("Scheduler disabled by SCHEDULER_ENABLED")
+            return
+        if not os.getenv("DATABASE_URL"):
+            logger.warning("DATABASE_URL not set; scheduler disabled")
+            return
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=30)
+        if self.conn is not None and not self.conn.closed:
+            self.conn.close()
+
+    def _run(self):
+        now = _utcnow()
+        self.next_runs = {name: job.first_run(now) for name, job in self.jobs.items()}
+        while not self.stop_event.is_set():
+            for name, due_at in sorted(self.next_runs.items(), key=lambda item: item[1]):
+                if self.stop_event.is_set() or due_at > _utcnow():
+                    break
+                try:
+                    self.run_job(name, due_at)
+                except Exception as e:
+                    # Bookkeeping failed (usually the lock connection); retry next tick
+                    logger.error(f"Scheduler could not run {name}: {e}")
+                    if self.conn is not None:
+                        self.conn.close()
+                    break
+                self.next_runs[name] = self.jobs[name].next_run(_utcnow())
+
+            delay = (min(self.next_runs.values(), default=_utcnow()) - _utcnow()).total_seconds()
+            self.stop_event.wait(min(max(delay, 0.1), SCHEDULER_TICK))
+
+    def status(self):
+        """Registered jobs joined with their last recorded run"""
+        conn = get_connection()
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM scheduled_jobs")
+        runs = {row['name']: row for row in cur.fetchall()}
+        cur.close()
+        conn.close()
+        return [
+            {"name": name, "schedule": job.schedule, "next_run": self.next_runs.get(name), **(runs.get(name) or {})}
+            for name, job in self.jobs.items()
+        ]
+
+
+def render_metrics():
+    lines = [
+        "# HELP scheduler_job_duration_seconds Scheduled job run time by job and outcome",
+        "# TYPE scheduler_job_duration_seconds histogram",
+    ]
+    lines += job_duration.render("scheduler_job_duration_seconds", ("job", "status"))
+    lines += [
+        "# HELP scheduler_job_failures_total Scheduled job runs that raised",
+        "# TYPE scheduler_job_failures_total counter",
+    ]
+    lines += job_failures.render("scheduler_job_failures_total", ("job",))
+    return lines
+
+
+register_collector(render_metrics)
+
+scheduler = Scheduler()
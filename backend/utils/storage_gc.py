@@ -0,0 +1,280 @@
+"""
+Garbage collection of submission screenshots in Cloudinary.
+
+Screenshots of rejected submissions are deleted REJECTED_SCREENSHOT_DAYS after
+they were submitted (time for a dispute and a re-review), approved ones after
+APPROVED_SCREENSHOT_DAYS. Pending submissions are never touched. Eligible rows
+are streamed oldest first from a partial index of screenshots not yet deleted
+and removed up to 100 per Admin API call, paced by a token bucket and stopping
+early when Cloudinary reports its hourly budget nearly spent.
+
+The scheduled job runs every minute and never waits for the bucket: it makes
+the calls the bucket allows right now (CLOUDINARY_GC_BURST at most, about
+five a minute at the default rate) within CLOUDINARY_GC_MAX_SECONDS and leaves
+the rest for the next run, so it can't hold up the other scheduled jobs. The
+CLI waits for tokens instead.
+
+Each chunk's rows get screenshot_deleted_at in a transaction committed right
+after its API call, so an interrupted run resumes with exactly what is left.
+Deleting is idempotent (Cloudinary answers "not_found" for images already
+gone), so a crash between the call and the commit only repeats that chunk.
+
+    python -m backend.utils.storage_gc run [--dry-run] [--max-calls N]
+    python -m backend.utils.storage_gc status
+
+To run against a local fake instead of the real account:
+
+    python -m benchmarks.fake_cloudinary --port 8787 &
+    CLOUDINARY_API_URL=http://127.0.0.1:8787 python -m backend.utils.storage_gc run
+"""
+import argparse
+import logging
+import os
+import time
+
+from cloudinary.exceptions import RateLimited
+
+from ..database import get_connection
+from .cloudinary import bulk_delete_screenshots, public_id_from_url
+from .metrics import Counter, register_collector
+
+logger = logging.getLogger(__name__)
+
+REJECTED_SCREENSHOT_DAYS = int(os.getenv("REJECTED_SCREENSHOT_DAYS", "14"))
+# Well inside ARCHIVE_AFTER_MONTHS, so images are collected before their
+# partition is detached
+APPROVED_SCREENSHOT_DAYS = int(os.getenv("APPROVED_SCREENSHOT_DAYS", "90"))
+# Share of the Admin API budget (500 calls/hour on most plans) used by the GC
+CLOUDINARY_GC_CALLS_PER_HOUR = float(os.getenv("CLOUDINARY_GC_CALLS_PER_HOUR", "300"))
+CLOUDINARY_GC_BURST = int(os.getenv("CLOUDINARY_GC_BURST", "10"))
+CLOUDINARY_GC_MAX_CALLS = int(os.getenv("CLOUDINARY_GC_MAX_CALLS", "100"))
+# Stop when the account has this few Admin API calls left for the hour
+CLOUDINARY_GC_RESERVE_CALLS = int(os.getenv("CLOUDINARY_GC_RESERVE_CALLS", "50"))
+# Wall-clock budget of one scheduled run
+CLOUDINARY_GC_MAX_SECONDS = float(os.getenv("CLOUDINARY_GC_MAX_SECONDS", "30"))
+
+DELETE_BATCH = 100
+SCAN_BATCH = 1000
+
+RETENTION = (("rejected", REJECTED_SCREENSHOT_DAYS), ("success", APPROVED_SCREENSHOT_DAYS))
+
+gc_results = Counter()
+gc_calls = Counter()
+
+
+class TokenBucket:
+    """Allow rate calls per second on average and up to burst back to back"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def acquire(self, wait: bool = True) -> bool:
+        """Take a token, sleeping until one is available unless wait is False"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            if not wait:
+                return False
+            time.sleep((1 - self.tokens) / self.rate)
+            self.tokens = 1.0
+            self.updated = time.monotonic()
+        self.tokens -= 1
+        return True
+
+
+# Shared by every run in the process, so back-to-back runs can't exceed the rate
+limiter = TokenBucket(CLOUDINARY_GC_CALLS_PER_HOUR / 3600, CLOUDINARY_GC_BURST)
+
+
+def eligible(cur, status: str, days: int, batch_size: int = SCAN_BATCH):
+    """
+    Rows (id, created_at, screenshot_url) of status submissions older than
+    days whose screenshot is still stored, oldest first, read batch_size at a time
+    """
+    position = None
+    while True:
+        cur.execute("""
+            SELECT id, created_at, screenshot_url FROM task_submissions
+            WHERE status = %(status)s
+              AND screenshot_deleted_at IS NULL
+              AND created_at < NOW() - make_interval(days => %(days)s)
+              AND (%(after_at)s::timestamp IS NULL OR (created_at, id) > (%(after_at)s, %(after_id)s))
+            ORDER BY created_at, id
+            LIMIT %(limit)s
+        """, {
+            "status": status,
+            "days": days,
+            "after_at": position[0] if position else None,
+            "after_id": position[1] if position else 0,
+            "limit": batch_size,
+        })
+        rows = cur.fetchall()
+        if not rows:
+            return
+        yield from rows
+        position = (rows[-1]['created_at'], rows[-1]['id'])
+
+
+def chunks(rows, size: int = DELETE_BATCH):
+    """
+    Group rows into {public_id: [submission ids]} of up to size images.
+    Rows whose URL isn't a Cloudinary one are grouped under None.
+    """
+    chunk = {}
+    for row in rows:
+        chunk.setdefault(public_id_from_url(row['screenshot_url']), []).append(row['id'])
+        if len(chunk) - (None in chunk) >= size:
+            yield chunk
+            chunk = {}
+    if chunk:
+        yield chunk
+
+
+def _mark_deleted(cur, submission_ids, days: int):
+    cur.execute("""
+        UPDATE task_submissions SET screenshot_deleted_at = NOW()
+        WHERE id = ANY(%s) AND screenshot_deleted_at IS NULL
+          AND created_at < NOW() - make_interval(days => %s)
+    """, (submission_ids, days))
+
+
+def collect(max_calls: int = CLOUDINARY_GC_MAX_CALLS, dry_run: bool = False,
+            max_seconds: float = None, wait: bool = True):
+    """
+    Delete eligible screenshots using at most max_calls Admin API calls and,
+    if given, max_seconds. With wait False the run ends as soon as the token
+    bucket is empty instead of sleeping. Returns counts of images deleted,
+    failed and skipped (not a Cloudinary URL), the calls made and why the run
+    stopped early, if it did.
+    """
+    summary = {"deleted": 0, "failed": 0, "skipped": 0, "calls": 0, "stopped": None}
+    deadline = time.monotonic() + max_seconds if max_seconds is not None else None
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        for status, days in RETENTION:
+            for chunk in chunks(eligible(cur, status, days)):
+                skipped = chunk.pop(None, [])
+                summary["skipped"] += len(skipped)
+                if dry_run:
+                    summary["deleted"] += len(chunk)
+                    summary["calls"] += 1 if chunk else 0
+                    continue
+
+                done = list(skipped)
+                remaining = None
+                if chunk:
+                    if summary["calls"] >= max_calls:
+                        summary["stopped"] = "max_calls"
+                        break
+                    if deadline is not None and time.monotonic() >= deadline:
+                        summary["stopped"] = "max_seconds"
+                        break
+                    if not limiter.acquire(wait=wait):
+                        summary["stopped"] = "paced"
+                        break
+                    try:
+                        gone, failed, result = bulk_delete_screenshots(list(chunk))
+                    except RateLimited as e:
+                        gc_calls.inc(("rate_limited",))
+                        summary["stopped"] = f"rate limited: {e}"
+                        break
+                    gc_calls.inc(("ok",))
+                    summary["calls"] += 1
+                    remaining = result.rate_limit_remaining
+                    done += [submission_id for public_id in gone for submission_id in chunk[public_id]]
+                    if failed:
+                        logger.warning(f"Cloudinary kept {len(failed)} screenshots: {failed}")
+                    summary["deleted"] += len(gone)
+                    summary["failed"] += len(failed)
+                    gc_results.inc(("deleted",), len(gone))
+                    gc_results.inc(("failed",), len(failed))
+                gc_results.inc(("skipped",), len(skipped))
+                if done:
+                    _mark_deleted(cur, done, days)
+                conn.commit()
+                if remaining is not None and remaining <= CLOUDINARY_GC_RESERVE_CALLS:
+                    summary["stopped"] = f"{remaining} Admin API calls left this hour"
+                    break
+            if summary["stopped"]:
+                break
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+    if summary["deleted"] or summary["failed"]:
+        logger.info(f"Screenshot GC: {summary}")
+    return summary
+
+
+def status():
+    """Per status: screenshots deleted and screenshots eligible but still stored"""
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT status,
+               COUNT(*) FILTER (WHERE screenshot_deleted_at IS NOT NULL) as deleted,
+               COUNT(*) FILTER (
+                   WHERE screenshot_deleted_at IS NULL
+                     AND created_at < NOW() - make_interval(days => CASE status
+                         WHEN 'rejected' THEN %s ELSE %s END)
+               ) as eligible
+        FROM task_submissions
+        WHERE status IN ('rejected', 'success')
+        GROUP BY status
+        ORDER BY status
+    """, (REJECTED_SCREENSHOT_DAYS, APPROVED_SCREENSHOT_DAYS))
+    rows = cur.fetchall()
+    cur.close()
+    conn.close()
+    return rows
+
+
+def render_metrics():
+    lines = [
+        "# HELP storage_gc_screenshots_total Screenshots handled by the storage GC by result",
+        "# TYPE storage_gc_screenshots_total counter",
+    ]
+    lines += gc_results.render("storage_gc_screenshots_total", ("result",))
+    lines += [
+        "# HELP storage_gc_api_calls_total Cloudinary bulk delete calls made by the storage GC",
+        "# TYPE storage_gc_api_calls_total counter",
+    ]
+    lines += gc_calls.render("storage_gc_api_calls_total", ("result",))
+    return lines
+
+
+register_collector(render_metrics)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cloudinary screenshot garbage collection")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="delete eligible screenshots")
+    run.add_argument("--dry-run", action="store_true", help="count what would be deleted")
+    run.add_argument("--max-calls", type=int, default=CLOUDINARY_GC_MAX_CALLS)
+    sub.add_parser("status", help="deleted and eligible screenshots per status")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "run":
+        summary = collect(max_calls=args.max_calls, dry_run=args.dry_run)
+        verb = "Would delete" if args.dry_run else "Deleted"
+        print(f"{verb} {summary['deleted']} screenshots in {summary['calls']} calls "
+              f"({summary['failed']} failed, {summary['skipped']} not on Cloudinary)")
+        if summary["stopped"]:
+            print(f"Stopped early: {summary['stopped']}")
+    else:
+        for row in status():
+            print(f"{row['status']:10} deleted {row['deleted']:8} eligible {row['eligible']:8}")
+
+
+if __name__ == "__main__":
+    # Run with: python -m backend.utils.storage_gc run|status
+    main()
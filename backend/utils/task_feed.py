@@ -0,0 +1,137 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from . import events
+from .replicas import get_read_connection
+from .scheduler import SCHEDULER_TIMEZONE
+
+logger = logging.getLogger(__name__)
+
+TASK_FEED_TTL = float(os.getenv("TASK_FEED_TTL", "60"))
+TASK_FEED_MAX_USERS = int(os.getenv("TASK_FEED_MAX_USERS", "10000"))
+TASK_FEED_LIMIT = 50
+
+# Active tasks minus those that are globally full or that this user has
+# already submitted daily_limit times today (one anti-join on the counters)
+FEED_SQL = """
+    SELECT mj.*
+    FROM micro_jobs mj
+    WHERE mj.status = 'active'
+      AND mj.total_submissions < mj.max_submissions
+      AND (mj.expires_at IS NULL OR mj.expires_at > NOW())
+      AND NOT EXISTS (
+          SELECT 1 FROM user_task_counters c
+          WHERE c.user_id = (SELECT id FROM users WHERE telegram_id = %(telegram_id)s)
+            AND c.day = (NOW() AT TIME ZONE %(tz)s)::date
+            AND c.task_id = mj.task_id
+            AND c.submissions >= mj.daily_limit
+      )
+    ORDER BY mj.created_at DESC
+    LIMIT %(limit)s
+"""
+
+
+def record_submission(cur, user_id: int, task_id: str):
+    """
+    Count a submission against the user's daily limit for the task; call in
+    the submitting transaction. The task's own counters on micro_jobs are
+    left to refresh_task_counters so submitters of a popular task don't
+    queue on its row lock.
+    """
+    cur.execute("""
+        INSERT INTO user_task_counters (user_id, day, task_id, submissions)
+        VALUES (%s, (NOW() AT TIME ZONE %s)::date, %s, 1)
+        ON CONFLICT (user_id, day, task_id) DO UPDATE
+        SET submissions = user_task_counters.submissions + 1
+    """, (user_id, SCHEDULER_TIMEZONE, task_id))
+
+
+class TaskFeedCache:
+    """
+    Per-user feed cache keyed by telegram_id. Entries are dropped when that
+    user submits, and all of them when the task catalog changes; the TTL
+    bounds staleness from changes nobody announces (other users filling a task).
+    """
+
+    def __init__(self, ttl: float = TASK_FEED_TTL, max_users: int = TASK_FEED_MAX_USERS):
+        self.ttl = ttl
+        self.max_users = max_users
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Bumped by full invalidations only
+        self.generation = 0
+        # Misses being queried, per user: [queries in flight, invalidated meanwhile]
+        self.inflight = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, telegram_id: int, cur=None):
+        """Feed for telegram_id, queried on cur (or a read connection of its own) on a miss"""
+        with self.lock:
+            entry = self.entries.get(telegram_id)
+            if entry and entry[0] > time.monotonic():
+                self.entries.move_to_end(telegram_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self.generation
+            self.inflight.setdefault(telegram_id, [0, False])[0] += 1
+
+        try:
+            feed = self._query(telegram_id, cur)
+        finally:
+            with self.lock:
+                pending = self.inflight[telegram_id]
+                pending[0] -= 1
+                invalidated = pending[1]
+                if not pending[0]:
+                    del self.inflight[telegram_id]
+
+        with self.lock:
+            if invalidated or generation != self.generation:
+                # Invalidated while we were querying; don't cache what may be stale
+                return feed
+            self.entries[telegram_id] = (time.monotonic() + self.ttl, feed)
+            self.entries.move_to_end(telegram_id)
+            while len(self.entries) > self.max_users:
+                self.entries.popitem(last=False)
+        return feed
+
+    def _query(self, telegram_id: int, cur=None):
+        if cur is None:
+            conn = get_read_connection(telegram_id)
+            own_cur = conn.cursor()
+            own_cur.execute(FEED_SQL, {"telegram_id": telegram_id, "tz": SCHEDULER_TIMEZONE, "limit": TASK_FEED_LIMIT})
+            feed = own_cur.fetchall()
+            own_cur.close()
+            conn.close()
+        else:
+            cur.execute(FEED_SQL, {"telegram_id": telegram_id, "tz": SCHEDULER_TIMEZONE, "limit": TASK_FEED_LIMIT})
+            feed = cur.fetchall()
+        return feed
+
+    def invalidate(self, telegram_id: int = None):
+        with self.lock:
+            if telegram_id is None:
+                self.generation += 1
+                self.entries.clear()
+            else:
+                self.entries.pop(telegram_id, None)
+                if telegram_id in self.inflight:
+                    self.inflight[telegram_id][1] = True
+
+    def _on_event(self, event: dict):
+        if event.get("type") == events.SUBMISSION_CREATED:
+            self.invalidate(event.get("telegram_id"))
+        else:
+            self.invalidate()
+
+    def attach(self, bus):
+        """Invalidate on changes made by any worker"""
+        bus.subscribe([events.SUBMISSION_CREATED, events.TASK_CHANGED, events.RECONNECTED], self._on_event)
+
+
+task_feed = TaskFeedCache()
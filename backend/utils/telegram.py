@@ -0,0 +1,44 @@
+import json
+import os
+import urllib.error
+import urllib.request
+
+TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+TELEGRAM_TIMEOUT = 10
+
+
+class TelegramError(Exception):
+    def __init__(self, message: str, retry_after: float = None, permanent: bool = False):
+        super().__init__(message)
+        # Seconds Telegram asked us to wait (HTTP 429)
+        self.retry_after = retry_after
+        # The chat can't be reached (bot blocked, chat not found); retrying won't help
+        self.permanent = permanent
+
+
+def send_message(chat_id: int, text: str):
+    """
+    Send text to chat_id through the Bot API, raising TelegramError on failure
+    """
+    if not TELEGRAM_BOT_TOKEN:
+        raise TelegramError("TELEGRAM_BOT_TOKEN not set", permanent=True)
+    request = urllib.request.Request(
+        f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/sendMessage",
+        data=json.dumps({"chat_id": chat_id, "text": text}).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=TELEGRAM_TIMEOUT) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        try:
+            body = json.loads(e.read())
+        except ValueError:
+            body = {}
+        description = body.get("description", str(e))
+        if e.code == 429:
+            raise TelegramError(description, retry_after=body.get("parameters", {}).get("retry_after", 30))
+        raise TelegramError(description, permanent=e.code in (400, 403))
+    except (urllib.error.URLError, TimeoutError) as e:
+        raise TelegramError(str(e))
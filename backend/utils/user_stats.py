@@ -0,0 +1,168 @@
+import logging
+import os
+from decimal import Decimal
+
+from psycopg2.extras import execute_values
+
+from ..database import get_connection
+from .metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+USER_STATS_CHECK_BATCH = int(os.getenv("USER_STATS_CHECK_BATCH", "1000"))
+
+STAT_COLUMNS = ("total_tasks", "completed_tasks", "total_earned", "withdrawals_count", "referrals_count")
+
+_repaired_total = 0
+
+
+def _apply(cur, user_id: int, **deltas):
+    # Upsert so a missing row (e.g. a user inserted by another writer) is created
+    columns = [c for c in STAT_COLUMNS if deltas.get(c)]
+    if not columns:
+        return
+    cur.execute(f"""
+        INSERT INTO user_stats (user_id, {", ".join(columns)})
+        VALUES (%s, {", ".join(["%s"] * len(columns))})
+        ON CONFLICT (user_id) DO UPDATE
+        SET {", ".join(f"{c} = user_stats.{c} + EXCLUDED.{c}" for c in columns)}, updated_at = NOW()
+    """, [user_id] + [deltas[c] for c in columns])
+
+
+# Write-path hooks. Each must run on the caller's cursor, inside the same
+# transaction as the change it accounts for.
+
+def create_row(cur, user_id: int):
+    cur.execute("INSERT INTO user_stats (user_id) VALUES (%s) ON CONFLICT (user_id) DO NOTHING", (user_id,))
+
+
+def record_submission(cur, user_id: int):
+    _apply(cur, user_id, total_tasks=1)
+
+
+def record_review(cur, user_id: int, old_status: str, old_amount, new_status: str, new_amount):
+    old_amount, new_amount = Decimal(str(old_amount)), Decimal(str(new_amount))
+    was_paid = old_status == "success"
+    is_paid = new_status == "success"
+    _apply(
+        cur, user_id,
+        completed_tasks=int(is_paid) - int(was_paid),
+        total_earned=(new_amount if is_paid else 0) - (old_amount if was_paid else 0),
+    )
+
+
+def record_withdrawal(cur, user_id: int, old_status: str, new_status: str):
+    _apply(cur, user_id, withdrawals_count=int(new_status == "completed") - int(old_status == "completed"))
+
+
+def record_referral(cur, refer_code: str):
+    cur.execute("""
+        INSERT INTO user_stats (user_id, referrals_count)
+        SELECT id, 1 FROM users WHERE refer_code = %s
+        ON CONFLICT (user_id) DO UPDATE
+        SET referrals_count = user_stats.referrals_count + 1, updated_at = NOW()
+    """, (refer_code,))
+
+
+def check_batch(cur, after_id: int, batch_size: int = USER_STATS_CHECK_BATCH, repair: bool = True):
+    """
+    Recompute stats for the next batch of users after after_id and fix rows
+    that drifted. Returns (last user id in the batch or None, drifted user ids).
+    """
+    global _repaired_total
+    cur.execute("SELECT id FROM users WHERE id > %s ORDER BY id LIMIT %s", (after_id, batch_size))
+    ids = [row['id'] for row in cur.fetchall()]
+    if not ids:
+        return None, []
+    low, high = ids[0], ids[-1]
+
+    # Lock the batch's rows first so concurrent write-path deltas either land
+    # before the recount (and are visible to it) or wait until after it
+    cur.execute("SELECT user_id FROM user_stats WHERE user_id BETWEEN %s AND %s FOR UPDATE", (low, high))
+    cur.execute(f"""
+        WITH expected AS (
+            SELECT
+                u.id as user_id,
+                COALESCE(ts.total, 0) + COALESCE(a.total_tasks, 0) as total_tasks,
+                COALESCE(ts.completed, 0) + COALESCE(a.completed_tasks, 0) as completed_tasks,
+                COALESCE(ts.earned, 0) + COALESCE(a.total_earned, 0) as total_earned,
+                COALESCE(w.completed, 0) as withdrawals_count,
+                COALESCE(r.referrals, 0) as referrals_count
+            FROM users u
+            LEFT JOIN (
+                SELECT user_id,
+                       COUNT(*) as total,
+                       COUNT(*) FILTER (WHERE status = 'success') as completed,
+                       SUM(amount) FILTER (WHERE status = 'success') as earned
+                FROM task_submissions
+                WHERE user_id BETWEEN %(low)s AND %(high)s
+                GROUP BY user_id
+            ) ts ON ts.user_id = u.id
+            -- Submissions in archived (detached) partitions
+            LEFT JOIN user_stats_archived a ON a.user_id = u.id
+            LEFT JOIN (
+                SELECT user_id, COUNT(*) as completed
+                FROM withdrawals
+                WHERE status = 'completed' AND user_id BETWEEN %(low)s AND %(high)s
+                GROUP BY user_id
+            ) w ON w.user_id = u.id
+            LEFT JOIN (
+                SELECT referred_by, COUNT(*) as referrals
+                FROM users
+                WHERE referred_by IN (SELECT refer_code FROM users WHERE id BETWEEN %(low)s AND %(high)s)
+                GROUP BY referred_by
+            ) r ON r.referred_by = u.refer_code
+            WHERE u.id BETWEEN %(low)s AND %(high)s
+        )
+        SELECT e.*
+        FROM expected e
+        LEFT JOIN user_stats s ON s.user_id = e.user_id
+        WHERE s.user_id IS NULL
+           OR ({", ".join(f"s.{c}" for c in STAT_COLUMNS)}) IS DISTINCT FROM ({", ".join(f"e.{c}" for c in STAT_COLUMNS)})
+    """, {"low": low, "high": high})
+    drifted = cur.fetchall()
+
+    if drifted and repair:
+        execute_values(cur, f"""
+            INSERT INTO user_stats (user_id, {", ".join(STAT_COLUMNS)})
+            VALUES %s
+            ON CONFLICT (user_id) DO UPDATE
+            SET {", ".join(f"{c} = EXCLUDED.{c}" for c in STAT_COLUMNS)}, updated_at = NOW()
+        """, [[row['user_id']] + [row[c] for c in STAT_COLUMNS] for row in drifted])
+        _repaired_total += len(drifted)
+    return high, [row['user_id'] for row in drifted]
+
+
+def check_consistency(batch_size: int = USER_STATS_CHECK_BATCH, repair: bool = True):
+    """
+    Walk all users in id order, one short transaction per batch
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    after_id = 0
+    drifted_total = 0
+    try:
+        while after_id is not None:
+            after_id, drifted = check_batch(cur, after_id, batch_size, repair)
+            if repair:
+                conn.commit()
+            else:
+                conn.rollback()
+            if drifted:
+                drifted_total += len(drifted)
+                logger.warning(f"user_stats drift for {len(drifted)} users (first ids {drifted[:10]})")
+    finally:
+        cur.close()
+        conn.close()
+    return drifted_total
+
+
+def render_metrics():
+    return [
+        "# HELP user_stats_repaired_total user_stats rows corrected by the consistency check",
+        "# TYPE user_stats_repaired_total counter",
+        f"user_stats_repaired_total {_repaired_total}",
+    ]
+
+
+register_collector(render_metrics)
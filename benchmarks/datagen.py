@@ -0,0 +1,336 @@
+"""
+Deterministic synthetic dataset generator for performance testing.
+
+Loads production-shaped volumes through COPY into a database migrated with
+`python -m backend.migrations`, using one process and connection per worker:
+
+    python -m benchmarks.datagen --database-url postgresql://... \\
+        --users 1000000 --submissions 10000000 --workers 8 --seed 42 --truncate
+
+Every user id range is generated from its own seeded RNG, so the same
+arguments always produce the same rows regardless of the worker count.
+Distributions are configurable: power-law referrers and per-user activity,
+a daily (Asia/Dhaka) activity curve, submission/withdrawal status ratios and
+withdrawal method skew.
+
+The tables the write paths maintain alongside those rows are derived once
+everything is loaded: user_stats from the users' submissions, withdrawals
+and referrals, and user_task_counters from the last two days of history.
+History is pinned to fixed dates so runs repeat, so its last two days are
+counted as yesterday and today, giving the task feed a realistic set of
+users who have already hit a task's daily limit.
+"""
+import argparse
+import io
+import os
+import random
+import time
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from itertools import accumulate
+from multiprocessing import Pool
+
+import psycopg2
+
+CHUNK_USERS = 20000
+TIMEZONE = "Asia/Dhaka"
+
+# Same aggregate as the 006 backfill and backend.utils.user_stats.check_batch
+USER_STATS_SQL = """
+    INSERT INTO user_stats (user_id, total_tasks, completed_tasks, total_earned, withdrawals_count, referrals_count)
+    SELECT
+        u.id,
+        COALESCE(ts.total, 0),
+        COALESCE(ts.completed, 0),
+        COALESCE(ts.earned, 0),
+        COALESCE(w.completed, 0),
+        COALESCE(r.referrals, 0)
+    FROM users u
+    LEFT JOIN (
+        SELECT user_id,
+               COUNT(*) as total,
+               COUNT(*) FILTER (WHERE status = 'success') as completed,
+               SUM(amount) FILTER (WHERE status = 'success') as earned
+        FROM task_submissions
+        GROUP BY user_id
+    ) ts ON ts.user_id = u.id
+    LEFT JOIN (
+        SELECT user_id, COUNT(*) as completed
+        FROM withdrawals
+        WHERE status = 'completed'
+        GROUP BY user_id
+    ) w ON w.user_id = u.id
+    LEFT JOIN (
+        SELECT referred_by, COUNT(*) as referrals
+        FROM users
+        WHERE referred_by IS NOT NULL
+        GROUP BY referred_by
+    ) r ON r.referred_by = u.refer_code
+    ON CONFLICT (user_id) DO UPDATE
+    SET total_tasks = EXCLUDED.total_tasks, completed_tasks = EXCLUDED.completed_tasks,
+        total_earned = EXCLUDED.total_earned, withdrawals_count = EXCLUDED.withdrawals_count,
+        referrals_count = EXCLUDED.referrals_count, updated_at = NOW()
+"""
+
+# Per-user daily counts of the last two local days of history, moved onto
+# yesterday and today
+USER_TASK_COUNTERS_SQL = """
+    WITH history AS (
+        SELECT MAX(created_at) as last_at,
+               (MAX(created_at)::timestamptz AT TIME ZONE %(tz)s)::date as last_day
+        FROM task_submissions
+    )
+    INSERT INTO user_task_counters (user_id, day, task_id, submissions)
+    SELECT ts.user_id,
+           (ts.created_at::timestamptz AT TIME ZONE %(tz)s)::date - h.last_day + (NOW() AT TIME ZONE %(tz)s)::date,
+           ts.task_id,
+           COUNT(*)
+    FROM task_submissions ts, history h
+    WHERE ts.created_at >= h.last_at - INTERVAL '3 days'
+      AND (ts.created_at::timestamptz AT TIME ZONE %(tz)s)::date >= h.last_day - 1
+    GROUP BY 1, 2, 3
+    ON CONFLICT (user_id, day, task_id) DO UPDATE SET submissions = EXCLUDED.submissions
+"""
+
+# Relative activity per hour of day, Asia/Dhaka: quiet at night, evening peak
+HOURLY_CURVE = (
+    2, 1, 1, 1, 1, 2, 3, 4, 5, 6, 6, 6,
+    7, 7, 6, 6, 7, 8, 10, 12, 13, 12, 9, 5,
+)
+
+
+def parse_ratios(value: str):
+    ratios = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        ratios[name.strip()] = float(weight)
+    return ratios
+
+
+class Distribution:
+    """Weighted choice with precomputed cumulative weights"""
+
+    def __init__(self, weights: dict):
+        self.names = list(weights)
+        self.cum = list(accumulate(weights.values()))
+
+    def pick(self, rng):
+        return self.names[bisect_left(self.cum, rng.random() * self.cum[-1])]
+
+
+HOURS = Distribution({h: w for h, w in enumerate(HOURLY_CURVE)})
+
+
+def timestamp(rng, start: datetime, lo_day: float, hi_day: float):
+    day = int(lo_day + (hi_day - lo_day) * rng.random())
+    return start + timedelta(days=day, hours=HOURS.pick(rng), seconds=rng.randrange(3600))
+
+
+def fmt(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return str(value)
+
+
+def copy_rows(cur, table: str, columns: tuple, rows):
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(fmt(v) for v in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+
+def generate_chunk(job):
+    """
+    Generate and COPY users, submissions and withdrawals for one user id range
+    """
+    args, chunk, first_user, last_user, bases = job
+    rng = random.Random(f"{args['seed']}:{chunk}")
+    start = datetime.fromisoformat(args["start"])
+    days = args["days"]
+    total_users = args["users"]
+    task_ids = bases["task_ids"]
+    sub_status = Distribution(args["submission_status"])
+    wd_status = Distribution(args["withdrawal_status"])
+    methods = Distribution(args["methods"])
+
+    # Pareto scale so the mean submissions per user matches the target
+    alpha = args["activity_alpha"]
+    mean = args["submissions"] / total_users
+    scale = mean * (alpha - 1) / alpha
+
+    users, submissions, withdrawals = [], [], []
+
+    for n in range(first_user, last_user + 1):
+        user_id = bases["user_id"] + n
+        # Signups grow over time: later days see more registrations
+        joined_day = days * (n / total_users) ** 0.5
+        created_at = timestamp(rng, start, max(0, joined_day - 1), joined_day)
+
+        referred_by = None
+        if n > 1 and rng.random() < args["referral_rate"]:
+            # Power-law: small ids (early users) refer most of the others
+            referrer = 1 + int((n - 1) * rng.random() ** args["referrer_skew"])
+            referred_by = f"SYN-{bases['user_id'] + referrer}"
+
+        cash_wallet = rng.randrange(0, 50) * 10
+        users.append((
+            user_id, 7000000000 + user_id, f"user{user_id}", "Synthetic",
+            round(rng.random() * 200, 2), cash_wallet, f"SYN-{user_id}", referred_by, created_at, created_at,
+        ))
+
+        count = min(args["max_per_user"], int(scale * rng.paretovariate(alpha)))
+        for i in range(count):
+            submitted_at = timestamp(rng, start, joined_day, days)
+            if days - (submitted_at - start).days <= args["pending_days"]:
+                status = "pending" if rng.random() < args["recent_pending_ratio"] else sub_status.pick(rng)
+            else:
+                status = sub_status.pick(rng)
+            reviewed_at = None if status == "pending" else submitted_at + timedelta(hours=rng.randrange(1, 48))
+            submissions.append((
+                user_id, rng.choice(task_ids),
+                f"https://res.cloudinary.com/dvt-cloud/image/upload/dvt-screenshots/user-{user_id}/syn-{i}.jpg",
+                status, None, rng.choice((2.5, 3.0, 3.5, 4.0, 5.0)), submitted_at, reviewed_at,
+            ))
+
+        if rng.random() < args["withdrawal_rate"]:
+            count = min(args["max_withdrawals"], int(rng.paretovariate(2.0)))
+            for i in range(count):
+                amount = 100 * rng.choice((1, 1, 1, 2, 3, 5))
+                is_first = i == 0
+                charges = amount * 0.10 + (10 if is_first else 0)
+                requested_at = timestamp(rng, start, joined_day, days)
+                status = wd_status.pick(rng)
+                processed_at = None if status == "pending" else requested_at + timedelta(hours=rng.randrange(1, 72))
+                withdrawals.append((
+                    user_id, amount, amount - charges, charges, methods.pick(rng),
+                    f"017{rng.randrange(10**8):08d}", status, is_first, requested_at, processed_at,
+                ))
+
+    conn = psycopg2.connect(args["database_url"])
+    cur = conn.cursor()
+    copy_rows(cur, "users", (
+        "id", "telegram_id", "username", "first_name", "balance", "cash_wallet",
+        "refer_code", "referred_by", "created_at", "updated_at",
+    ), users)
+    # Submission and withdrawal ids come from their sequences
+    copy_rows(cur, "task_submissions", (
+        "user_id", "task_id", "screenshot_url", "status", "admin_review",
+        "amount", "created_at", "reviewed_at",
+    ), submissions)
+    copy_rows(cur, "withdrawals", (
+        "user_id", "amount", "net_amount", "charges", "method",
+        "account_number", "status", "is_first_withdrawal", "created_at", "processed_at",
+    ), withdrawals)
+    conn.commit()
+    cur.close()
+    conn.close()
+    return len(users), len(submissions), len(withdrawals)
+
+
+def load_tasks(cur, args, base_id: int):
+    rng = random.Random(f"{args['seed']}:tasks")
+    start = datetime.fromisoformat(args["start"])
+    rows = []
+    task_ids = []
+    for n in range(1, args["tasks"] + 1):
+        task_id = f"SYN-{base_id + n:06d}"
+        task_ids.append(task_id)
+        created_at = timestamp(rng, start, 0, args["days"])
+        status = "active" if rng.random() < 0.6 else rng.choice(("paused", "expired"))
+        rows.append((
+            base_id + n, task_id, f"Synthetic task {n}", "Complete the offer and upload a screenshot.",
+            f"https://cpa-lead.com/syn-{n}", rng.choice((2.5, 3.0, 3.5, 4.0, 5.0)), status,
+            rng.choice((50, 100, 200, 500)), rng.choice((1, 2, 3, 5)), created_at, created_at,
+        ))
+    copy_rows(cur, "micro_jobs", (
+        "id", "task_id", "title", "description", "cpa_link", "amount", "status",
+        "max_submissions", "daily_limit", "created_at", "updated_at",
+    ), rows)
+    return task_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--users", type=int, default=1000000)
+    parser.add_argument("--submissions", type=int, default=10000000, help="target total task_submissions")
+    parser.add_argument("--tasks", type=int, default=500)
+    parser.add_argument("--days", type=int, default=365, help="history length")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--referral-rate", type=float, default=0.4, help="share of users with a referrer")
+    parser.add_argument("--referrer-skew", type=float, default=3.0, help=">1 concentrates referrals on few users")
+    parser.add_argument("--activity-alpha", type=float, default=1.5, help="Pareto shape of submissions per user")
+    parser.add_argument("--max-per-user", type=int, default=2000)
+    parser.add_argument("--withdrawal-rate", type=float, default=0.3, help="share of users who withdraw")
+    parser.add_argument("--max-withdrawals", type=int, default=50)
+    parser.add_argument("--submission-status", type=parse_ratios, default="success=0.8,rejected=0.2")
+    parser.add_argument("--withdrawal-status", type=parse_ratios, default="completed=0.85,cancelled=0.05,pending=0.1")
+    parser.add_argument("--methods", type=parse_ratios, default="bkash=0.7,nagad=0.25,rocket=0.05")
+    parser.add_argument("--pending-days", type=int, default=2, help="recent days that still have pending reviews")
+    parser.add_argument("--recent-pending-ratio", type=float, default=0.6)
+    parser.add_argument("--truncate", action="store_true", help="empty the tables first")
+    args = parser.parse_args()
+
+    if not args.database_url:
+        parser.error("--database-url or DATABASE_URL is required")
+
+    settings = vars(args).copy()
+    settings["start"] = (datetime(2025, 1, 1)).isoformat()
+
+    conn = psycopg2.connect(args.database_url)
+    cur = conn.cursor()
+    if args.truncate:
+        cur.execute("TRUNCATE users, micro_jobs, task_submissions, withdrawals, referral_bonuses RESTART IDENTITY CASCADE")
+
+    bases = {}
+    for key, table in (("user_id", "users"), ("task_id", "micro_jobs")):
+        cur.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+        bases[key] = cur.fetchone()[0]
+
+    started = time.perf_counter()
+    bases["task_ids"] = load_tasks(cur, settings, bases.pop("task_id"))
+    conn.commit()
+
+    jobs = []
+    for chunk, first in enumerate(range(1, args.users + 1, CHUNK_USERS)):
+        last = min(args.users, first + CHUNK_USERS - 1)
+        jobs.append((settings, chunk, first, last, bases))
+
+    totals = [0, 0, 0]
+    with Pool(args.workers) as pool:
+        for done, counts in enumerate(pool.imap_unordered(generate_chunk, jobs), 1):
+            totals = [a + b for a, b in zip(totals, counts)]
+            rows = sum(totals)
+            elapsed = time.perf_counter() - started
+            print(f"[{done}/{len(jobs)}] {rows:,} rows in {elapsed:.0f}s ({rows / elapsed:,.0f} rows/s)")
+
+    # User and task ids were assigned explicitly; move the sequences past them
+    for table in ("users", "micro_jobs"):
+        cur.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1)) FROM {table}")
+    conn.commit()
+
+    derived = time.perf_counter()
+    cur.execute(USER_STATS_SQL)
+    cur.execute(USER_TASK_COUNTERS_SQL, {"tz": TIMEZONE})
+    conn.commit()
+    print(f"Derived user_stats and user_task_counters in {time.perf_counter() - derived:.0f}s")
+
+    conn.autocommit = True
+    for table in ("users", "micro_jobs", "task_submissions", "withdrawals", "user_stats", "user_task_counters"):
+        cur.execute(f"ANALYZE {table}")
+    cur.close()
+    conn.close()
+
+    print(f"Loaded {totals[0]:,} users, {totals[1]:,} submissions, {totals[2]:,} withdrawals "
+          f"and {args.tasks} tasks in {time.perf_counter() - started:.0f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Local stand-in for the Cloudinary Admin API bulk delete endpoint.
+
+    python -m benchmarks.fake_cloudinary --port 8787 --limit 500
+    CLOUDINARY_API_URL=http://127.0.0.1:8787 python -m backend.utils.storage_gc run
+
+Answers DELETE /v1_1/<cloud>/resources/image/upload with "deleted" for a
+public id seen for the first time and "not_found" after that, plus the
+X-FeatureRateLimit-* headers the real API sends. Past --limit calls in the
+current hour it returns 420 like Cloudinary does. --fail-rate reports that
+share of ids as not deleted. GET /stats returns the counters as JSON.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+MAX_IDS_PER_CALL = 100
+
+
+class FakeCloudinary:
+    def __init__(self, limit: int, fail_rate: float, seed: int):
+        self.limit = limit
+        self.fail_rate = fail_rate
+        self.random = random.Random(seed)
+        self.deleted = set()
+        self.calls = 0
+        self.rejected_calls = 0
+        self.hour = int(time.time() // 3600)
+        self.calls_this_hour = 0
+        self.lock = threading.Lock()
+
+    def delete(self, public_ids):
+        """(HTTP status, body, rate limit headers) for one bulk delete call"""
+        with self.lock:
+            hour = int(time.time() // 3600)
+            if hour != self.hour:
+                self.hour, self.calls_this_hour = hour, 0
+            headers = {
+                "X-FeatureRateLimit-Limit": str(self.limit),
+                "X-FeatureRateLimit-Reset": formatdate((hour + 1) * 3600, usegmt=True),
+            }
+            if self.calls_this_hour >= self.limit:
+                self.rejected_calls += 1
+                headers["X-FeatureRateLimit-Remaining"] = "0"
+                return 420, {"error": {"message": "Rate Limit Exceeded"}}, headers
+            self.calls_this_hour += 1
+            self.calls += 1
+            headers["X-FeatureRateLimit-Remaining"] = str(self.limit - self.calls_this_hour)
+            if len(public_ids) > MAX_IDS_PER_CALL:
+                return 400, {"error": {"message": f"At most {MAX_IDS_PER_CALL} public ids per call"}}, headers
+            statuses = {}
+            for public_id in public_ids:
+                if self.random.random() < self.fail_rate:
+                    statuses[public_id] = "error"
+                elif public_id in self.deleted:
+                    statuses[public_id] = "not_found"
+                else:
+                    self.deleted.add(public_id)
+                    statuses[public_id] = "deleted"
+            return 200, {"deleted": statuses, "partial": False}, headers
+
+    def stats(self):
+        with self.lock:
+            return {"calls": self.calls, "rejected_calls": self.rejected_calls, "deleted": len(self.deleted)}
+
+
+def make_handler(fake: FakeCloudinary):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, body: dict, headers: dict = None):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_DELETE(self):
+            url = urlparse(self.path)
+            if not url.path.rstrip("/").endswith("/resources/image/upload"):
+                self._send(404, {"error": {"message": f"Unsupported path {url.path}"}})
+                return
+            # The SDK sends public_ids[0]=..&public_ids[1]=.., older clients public_ids[]=..
+            public_ids = [value for key, values in parse_qs(url.query).items()
+                          if key.startswith("public_ids[") for value in values]
+            self._send(*fake.delete(public_ids))
+
+        def do_GET(self):
+            if urlparse(self.path).path == "/stats":
+                self._send(200, fake.stats())
+            else:
+                self._send(404, {"error": {"message": "Not found"}})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--limit", type=int, default=500, help="Admin API calls allowed per hour")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of ids reported as not deleted")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    fake = FakeCloudinary(args.limit, args.fail_rate, args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(fake))
+    print(f"Fake Cloudinary on http://{args.host}:{args.port} ({args.limit} calls/hour)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(fake.stats()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""
+Asyncio load generator for the Mini App and admin flows.
+
+Run from the repository root against a local backend and Postgres:
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.loadtest --start-server --rate 50 --duration 60 --save baseline.json
+    python -m benchmarks.loadtest --rate 50 --duration 60 --baseline baseline.json
+
+Requests arrive open-loop (Poisson) at --rate scenarios per second. Each
+scenario is picked from --mix, e.g. "list_tasks=40,submit_task=20,withdraw=5".
+The report lists throughput, p50/p95/p99 and errors per endpoint, and the
+deltas against a saved baseline when one is given.
+
+Every scenario comes from one IP, so per-IP rate limits would turn most
+submit/upload traffic into 429s. --start-server runs the backend with
+RATE_LIMIT_ENABLED=0; start an external server the same way. 429s that
+still happen are counted separately and kept out of the latency numbers.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+
+ADMIN_HEADERS = {"Authorization": "Bearer admin_token"}
+
+DEFAULT_MIX = {
+    "register": 5,
+    "list_tasks": 40,
+    "submit_task": 20,
+    "transfer": 10,
+    "withdraw": 5,
+    "admin_review": 10,
+    "admin_process": 5,
+    "profile": 5,
+}
+
+# 1x1 transparent PNG used when --with-upload is set
+TINY_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d00000000"
+    "49454e44ae426082"
+)
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.rate_limited = {}
+
+    def record(self, endpoint: str, seconds: float, status):
+        if status == 429:
+            # Answered by the rate limiter without reaching the handler
+            self.rate_limited[endpoint] = self.rate_limited.get(endpoint, 0) + 1
+            return
+        self.latencies.setdefault(endpoint, []).append(seconds)
+        if status is None or status >= 400:
+            key = f"{endpoint} {status or 'exception'}"
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+    def report(self, elapsed: float):
+        endpoints = {}
+        for endpoint, samples in sorted(self.latencies.items()):
+            samples.sort()
+            endpoints[endpoint] = {
+                "requests": len(samples),
+                "throughput": round(len(samples) / elapsed, 2),
+                "p50_ms": round(percentile(samples, 50) * 1000, 2),
+                "p95_ms": round(percentile(samples, 95) * 1000, 2),
+                "p99_ms": round(percentile(samples, 99) * 1000, 2),
+            }
+        total = sum(len(s) for s in self.latencies.values())
+        return {
+            "elapsed_s": round(elapsed, 2),
+            "total_requests": total,
+            "throughput": round(total / elapsed, 2) if elapsed else 0,
+            "errors": dict(sorted(self.errors.items())),
+            "rate_limited": dict(sorted(self.rate_limited.items())),
+            "endpoints": endpoints,
+        }
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, max(0, int(round(pct / 100.0 * len(samples))) - 1))
+    return samples[index]
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, stats: Stats, users: list, with_upload: bool):
+        self.client = client
+        self.stats = stats
+        self.users = users
+        self.with_upload = with_upload
+        self.task_ids = []
+
+    async def call(self, endpoint: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        status = None
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            status = response.status_code
+            return response
+        except httpx.HTTPError:
+            return None
+        finally:
+            self.stats.record(endpoint, time.perf_counter() - start, status)
+
+    def random_user(self):
+        return random.choice(self.users)
+
+    async def register(self):
+        telegram_id = random.randint(10**9, 10**10)
+        response = await self.call("POST /api/user", "POST", "/api/user", json={
+            "telegram_id": telegram_id,
+            "username": f"load_{telegram_id}",
+            "first_name": "Load",
+        })
+        if response is not None and response.status_code == 200:
+            self.users.append(telegram_id)
+
+    async def list_tasks(self):
+        response = await self.call("GET /api/tasks", "GET", "/api/tasks")
+        if response is not None and response.status_code == 200:
+            self.task_ids = [t["task_id"] for t in response.json()] or self.task_ids
+
+    async def profile(self):
+        await self.call("GET /api/user/{id}", "GET", f"/api/user/{self.random_user()}")
+
+    async def submit_task(self):
+        if not self.task_ids:
+            await self.list_tasks()
+            if not self.task_ids:
+                return
+        screenshot_url = "https://res.cloudinary.com/demo/image/upload/loadtest.png"
+        if self.with_upload:
+            response = await self.call("POST /api/upload-screenshot", "POST", "/api/upload-screenshot",
+                                       files={"file": ("shot.png", TINY_PNG, "image/png")})
+            if response is None or response.status_code != 200:
+                return
+            screenshot_url = response.json()["url"]
+        await self.call("POST /api/submit-task", "POST", "/api/submit-task", data={
+            "telegram_id": self.random_user(),
+            "task_id": random.choice(self.task_ids),
+            "screenshot_url": screenshot_url,
+        })
+
+    async def transfer(self):
+        user = self.random_user()
+        await self.call("POST /api/users/{id}/transfer", "POST", f"/api/users/{user}/transfer",
+                        json={"amount": 10})
+
+    async def withdraw(self):
+        user = self.random_user()
+        await self.call("POST /api/withdrawals/request/{id}", "POST", f"/api/withdrawals/request/{user}",
+                        json={"amount": 100, "method": random.choice(["bkash", "nagad", "rocket"]),
+                              "account_number": "01700000000"})
+
+    async def admin_review(self):
+        # Each scenario is its own reviewer: claim one submission, review it
+        headers = {**ADMIN_HEADERS, "X-Reviewer": f"load-{random.getrandbits(48):x}"}
+        response = await self.call("POST /api/admin/submissions/claim", "POST",
+                                   "/api/admin/submissions/claim", headers=headers, params={"limit": 1})
+        if response is None or response.status_code != 200 or not response.json():
+            return
+        submission = response.json()[0]
+        await self.call("POST /api/admin/submissions/{id}/review", "POST",
+                        f"/api/admin/submissions/{submission['id']}/review", headers=headers,
+                        json={"status": random.choice(["success", "success", "rejected"])})
+
+    async def admin_process(self):
+        response = await self.call("GET /api/admin/withdrawals/pending", "GET",
+                                   "/api/admin/withdrawals/pending", headers=ADMIN_HEADERS)
+        if response is None or response.status_code != 200 or not response.json():
+            return
+        withdrawal = random.choice(response.json()[:20])
+        await self.call("POST /api/admin/withdrawals/{id}/process", "POST",
+                        f"/api/admin/withdrawals/{withdrawal['id']}/process", headers=ADMIN_HEADERS,
+                        json={"status": random.choice(["completed", "completed", "cancelled"])})
+
+
+async def setup_users(client: httpx.AsyncClient, count: int):
+    """Register a pool of users and fund both wallets so money flows succeed"""
+    users = []
+    base = random.randint(10**9, 9 * 10**9)
+    for i in range(count):
+        telegram_id = base + i
+        try:
+            await client.post("/api/user", json={"telegram_id": telegram_id, "username": f"load_{telegram_id}"})
+            for wallet in ("balance", "cash_wallet"):
+                await client.put(f"/api/users/{telegram_id}/balance",
+                                 json={"amount": 100000, "action": "add", "wallet_type": wallet},
+                                 headers=ADMIN_HEADERS)
+        except httpx.HTTPError as e:
+            print(f"Setup failed for user {telegram_id}: {e!r}")
+        users.append(telegram_id)
+    return users
+
+
+async def run(args, mix: dict):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        users = await setup_users(client, args.users)
+        stats = Stats()
+        test = LoadTest(client, stats, users, args.with_upload)
+        await test.list_tasks()
+        stats.latencies.clear()
+
+        names = list(mix)
+        weights = [mix[n] for n in names]
+        semaphore = asyncio.Semaphore(args.concurrency)
+        pending = set()
+
+        async def one(name):
+            async with semaphore:
+                await getattr(test, name)()
+
+        start = time.perf_counter()
+        deadline = start + args.duration
+        next_arrival = start
+        while True:
+            next_arrival += random.expovariate(args.rate)
+            if next_arrival >= deadline:
+                break
+            await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+            task = asyncio.create_task(one(random.choices(names, weights)[0]))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+
+        if pending:
+            await asyncio.wait(pending)
+        return stats.report(time.perf_counter() - start)
+
+
+def parse_mix(value: str):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if not hasattr(LoadTest, name) or name in ("call", "random_user"):
+            raise argparse.ArgumentTypeError(f"Unknown scenario: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def print_report(report: dict, baseline: dict = None):
+    print(f"\n{report['total_requests']} requests in {report['elapsed_s']}s "
+          f"({report['throughput']} req/s)\n")
+    header = f"{'endpoint':48} {'reqs':>7} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    print(header)
+    print("-" * len(header))
+    for endpoint, row in report["endpoints"].items():
+        line = (f"{endpoint:48} {row['requests']:7} {row['throughput']:8} "
+                f"{row['p50_ms']:9} {row['p95_ms']:9} {row['p99_ms']:9}")
+        old = (baseline or {}).get("endpoints", {}).get(endpoint)
+        if old and old["p95_ms"]:
+            change = (row["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100
+            line += f"   p95 {change:+.1f}% vs baseline"
+        print(line)
+    if report["errors"]:
+        print("\nErrors:")
+        for key, count in report["errors"].items():
+            print(f"  {key}: {count}")
+    if report.get("rate_limited"):
+        print("\nRate limited (429, excluded from latencies; run the server with RATE_LIMIT_ENABLED=0):")
+        for endpoint, count in report["rate_limited"].items():
+            print(f"  {endpoint}: {count}")
+
+
+def start_server(args):
+    env = dict(os.environ)
+    if args.database_url:
+        env["DATABASE_URL"] = args.database_url
+    # All load comes from one address; per-IP limits would reject most of it
+    env["RATE_LIMIT_ENABLED"] = "0"
+    port = args.url.rsplit(":", 1)[-1].strip("/")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.app:app", "--port", port, "--log-level", "warning"],
+        env=env,
+    )
+    for _ in range(100):
+        try:
+            if httpx.get(f"{args.url}/api/health", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    process.terminate()
+    raise SystemExit("Backend did not become healthy")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--rate", type=float, default=20.0, help="scenarios started per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument("--concurrency", type=int, default=100, help="max scenarios in flight")
+    parser.add_argument("--users", type=int, default=50, help="pre-registered, funded users")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX)
+    parser.add_argument("--with-upload", action="store_true", help="upload a real image through Cloudinary")
+    parser.add_argument("--start-server", action="store_true", help="launch backend.app with uvicorn")
+    parser.add_argument("--database-url", help="DATABASE_URL for --start-server")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--save", help="write the report as JSON")
+    parser.add_argument("--baseline", help="compare against a saved JSON report")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    server = start_server(args) if args.start_server else None
+    try:
+        report = asyncio.run(run(args, args.mix))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.save:
+        report["config"] = {"rate": args.rate, "duration": args.duration, "mix": args.mix}
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
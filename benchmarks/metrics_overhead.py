@@ -0,0 +1,69 @@
+"""
+Measure the per-request cost of MetricsMiddleware and TrackedCursor.
+
+Run from the repository root:
+    python -m benchmarks.metrics_overhead [--requests 20000] [--max-overhead-us 50]
+
+Calls a tiny ASGI app directly (no sockets, no database) with and without
+the middleware and exits non-zero if the added latency per request is above
+the allowed budget.
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from backend.utils.metrics import MetricsMiddleware, record_query
+
+
+async def bare_app(scope, receive, send):
+    # Simulate a handler that runs three queries
+    for _ in range(3):
+        record_query(0.0005, 1)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def run(app, requests: int) -> float:
+    scope = {"type": "http", "method": "GET", "path": "/bench", "app": None, "endpoint": bare_app}
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--max-overhead-us", type=float, default=50.0)
+    args = parser.parse_args()
+
+    wrapped = MetricsMiddleware(bare_app)
+    base_times, wrapped_times = [], []
+    for _ in range(args.rounds):
+        base_times.append(asyncio.run(run(bare_app, args.requests)))
+        wrapped_times.append(asyncio.run(run(wrapped, args.requests)))
+
+    base_us = min(base_times) / args.requests * 1e6
+    wrapped_us = min(wrapped_times) / args.requests * 1e6
+    overhead = wrapped_us - base_us
+
+    print(f"baseline:   {base_us:8.2f} us/request")
+    print(f"with metrics: {wrapped_us:6.2f} us/request")
+    print(f"overhead:   {overhead:8.2f} us/request (budget {args.max_overhead_us} us)")
+
+    if overhead > args.max_overhead_us:
+        print("FAIL: metrics overhead above budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Before/after query plan check for the index pack (migration 003).
+
+Runs EXPLAIN (ANALYZE, BUFFERS) for the hot queries from backend/routes
+against a database loaded with benchmarks.datagen and reports execution
+time, buffers touched and the scan nodes used:
+
+    python -m backend.migrations --target 2
+    python -m benchmarks.datagen --users 1000000 --submissions 10000000 --truncate
+    python -m benchmarks.plan_check --save before.json
+    python -m backend.migrations
+    python -m benchmarks.plan_check --compare before.json
+"""
+import argparse
+import json
+import os
+
+import psycopg2
+
+# (name, sql) - %(user_id)s and %(refer_code)s are sampled from the data
+QUERIES = [
+    ("pending_submissions", """
+        SELECT ts.*, u.telegram_id, u.username, u.first_name, mj.title as task_title, mj.amount
+        FROM task_submissions ts
+        JOIN users u ON ts.user_id = u.id
+        JOIN micro_jobs mj ON ts.task_id = mj.task_id
+        WHERE ts.status = 'pending'
+        ORDER BY ts.created_at ASC
+    """),
+    ("pending_withdrawals", """
+        SELECT w.*, u.telegram_id, u.username, u.first_name
+        FROM withdrawals w
+        JOIN users u ON w.user_id = u.id
+        WHERE w.status = 'pending'
+        ORDER BY w.created_at ASC
+    """),
+    ("user_submissions", """
+        SELECT ts.*, mj.title as task_title
+        FROM task_submissions ts
+        JOIN micro_jobs mj ON ts.task_id = mj.task_id
+        WHERE ts.user_id = %(user_id)s
+        ORDER BY ts.created_at DESC
+    """),
+    ("user_withdrawals", """
+        SELECT * FROM withdrawals
+        WHERE user_id = %(user_id)s
+        ORDER BY created_at DESC
+        LIMIT 50
+    """),
+    ("user_referrals", """
+        SELECT u.*,
+               (SELECT COUNT(*) FROM withdrawals w WHERE w.user_id = u.id) as withdrawals_count
+        FROM users u
+        WHERE u.referred_by = %(refer_code)s
+        ORDER BY u.created_at DESC
+    """),
+    ("admin_users_page", """
+        SELECT
+            u.*,
+            (SELECT COUNT(*) FROM task_submissions ts WHERE ts.user_id = u.id AND ts.status = 'success') as completed_tasks,
+            (SELECT COUNT(*) FROM withdrawals w WHERE w.user_id = u.id AND w.status = 'completed') as withdrawals_count,
+            (SELECT COUNT(*) FROM users u2 WHERE u2.referred_by = u.refer_code) as referrals_count
+        FROM users u
+        ORDER BY u.created_at DESC
+        LIMIT 20 OFFSET 0
+    """),
+    ("today_submissions", """
+        SELECT COUNT(*) FROM task_submissions WHERE created_at >= CURRENT_DATE
+    """),
+    ("active_tasks", """
+        SELECT * FROM micro_jobs WHERE status = 'active' ORDER BY created_at DESC LIMIT 50
+    """),
+]
+
+
+def sample_params(cur):
+    # The heaviest referrer and an active user make the per-user queries meaningful
+    cur.execute("""
+        SELECT referred_by FROM users WHERE referred_by IS NOT NULL
+        GROUP BY referred_by ORDER BY COUNT(*) DESC LIMIT 1
+    """)
+    row = cur.fetchone()
+    refer_code = row[0] if row else ""
+    cur.execute("SELECT user_id FROM task_submissions ORDER BY id DESC LIMIT 1")
+    row = cur.fetchone()
+    return {"user_id": row[0] if row else 0, "refer_code": refer_code}
+
+
+def scan_nodes(plan, found=None):
+    found = found if found is not None else []
+    node = plan.get("Node Type")
+    if "Scan" in node:
+        found.append(f"{node}({plan.get('Index Name') or plan.get('Relation Name')})")
+    for child in plan.get("Plans", []):
+        scan_nodes(child, found)
+    return found
+
+
+def explain(cur, sql: str, params: dict):
+    cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, params)
+    result = cur.fetchone()[0][0]
+    plan = result["Plan"]
+    buffers = plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0)
+    return {
+        "execution_ms": round(result["Execution Time"], 2),
+        "buffers": buffers,
+        "scans": sorted(set(scan_nodes(plan))),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--runs", type=int, default=3, help="best of N executions")
+    parser.add_argument("--save", help="write results as JSON")
+    parser.add_argument("--compare", help="JSON results from an earlier run")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(args.database_url)
+    conn.autocommit = True
+    cur = conn.cursor()
+    params = sample_params(cur)
+
+    results = {}
+    for name, sql in QUERIES:
+        runs = [explain(cur, sql, params) for _ in range(args.runs)]
+        results[name] = min(runs, key=lambda r: r["execution_ms"])
+    cur.close()
+    conn.close()
+
+    before = {}
+    if args.compare:
+        with open(args.compare) as f:
+            before = json.load(f)
+
+    for name, result in results.items():
+        line = f"{name:22} {result['execution_ms']:10.2f} ms {result['buffers']:10} buffers"
+        old = before.get(name)
+        if old:
+            speedup = old["execution_ms"] / result["execution_ms"] if result["execution_ms"] else float("inf")
+            line += f"   was {old['execution_ms']:.2f} ms ({speedup:.1f}x)"
+        print(line)
+        print(f"{'':22} {', '.join(result['scans'])}")
+        if old and old["scans"] != result["scans"]:
+            print(f"{'':22} before: {', '.join(old['scans'])}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
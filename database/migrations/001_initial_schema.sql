@@ -1,4 +1,5 @@
 -- Database schema for DVT Mini App
+-- Baseline migration: safe to apply to databases created from the old schema.sql
 
 -- Enable UUID extension
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
@@ -124,9 +125,11 @@ END;
 $$ language 'plpgsql';
 
 -- Create triggers for updated_at
+DROP TRIGGER IF EXISTS update_users_updated_at ON users;
 CREATE TRIGGER update_users_updated_at BEFORE UPDATE ON users
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+DROP TRIGGER IF EXISTS update_micro_jobs_updated_at ON micro_jobs;
 CREATE TRIGGER update_micro_jobs_updated_at BEFORE UPDATE ON micro_jobs
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
@@ -172,5 +175,5 @@ SELECT
     (SELECT COUNT(*) FROM micro_jobs WHERE status = 'active') as active_tasks,
     (SELECT COUNT(*) FROM task_submissions WHERE status = 'pending') as pending_reviews,
     (SELECT COUNT(*) FROM withdrawals WHERE status = 'pending') as pending_withdrawals,
-    (SELECT COALESCE(SUM(amount), 0) FROM withdrawals WHERE status = 'completed' AND DATE(created_at) = CURRENT_DATE) as today_revenue,
-    (SELECT COUNT(*) FROM users WHERE DATE(created_at) = CURRENT_DATE) as today_users;
+    (SELECT COALESCE(SUM(amount), 0) FROM withdrawals WHERE status = 'completed' AND created_at >= CURRENT_DATE) as today_revenue,
+    (SELECT COUNT(*) FROM users WHERE created_at >= CURRENT_DATE) as today_users;
@@ -0,0 +1,14 @@
+-- Lookup tables referenced by init_data.sql
+
+CREATE TABLE IF NOT EXISTS transaction_types (
+    type VARCHAR(50) PRIMARY KEY,
+    description TEXT
+);
+
+CREATE TABLE IF NOT EXISTS withdrawal_methods (
+    method VARCHAR(50) PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    min_amount DECIMAL(10,2) NOT NULL DEFAULT 100,
+    fee_percent DECIMAL(5,2) NOT NULL DEFAULT 10,
+    fixed_fee DECIMAL(10,2) NOT NULL DEFAULT 0
+);
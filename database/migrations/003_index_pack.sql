@@ -0,0 +1,45 @@
+-- migrate: no-transaction
+-- Indexes matched to the queries the API actually runs. Built CONCURRENTLY
+-- so writes keep flowing while they are created on a live database.
+
+-- Admin review queues: only pending rows, in queue order
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_task_submissions_pending
+    ON task_submissions (created_at) WHERE status = 'pending';
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_withdrawals_pending
+    ON withdrawals (created_at) WHERE status = 'pending';
+
+-- Per-user history, newest first (also serves the per-user counts)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_task_submissions_user_created
+    ON task_submissions (user_id, created_at DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_withdrawals_user_created
+    ON withdrawals (user_id, created_at DESC);
+
+-- Joins and counts by task
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_task_submissions_task_id
+    ON task_submissions (task_id);
+
+-- Referral lookups (most users have no referrer)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_referred_by
+    ON users (referred_by) WHERE referred_by IS NOT NULL;
+
+-- Admin user list and "today" counters
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_created_at
+    ON users (created_at DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_task_submissions_created_at
+    ON task_submissions (created_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_withdrawals_created_at
+    ON withdrawals (created_at);
+
+-- Task feed: filter by status, newest first
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_micro_jobs_status_created
+    ON micro_jobs (status, created_at DESC);
+
+-- Superseded: low-selectivity status indexes, prefixes of the composites
+-- above, and duplicates of the UNIQUE constraints
+DROP INDEX CONCURRENTLY IF EXISTS idx_task_submissions_status;
+DROP INDEX CONCURRENTLY IF EXISTS idx_task_submissions_user_id;
+DROP INDEX CONCURRENTLY IF EXISTS idx_withdrawals_status;
+DROP INDEX CONCURRENTLY IF EXISTS idx_withdrawals_user_id;
+DROP INDEX CONCURRENTLY IF EXISTS idx_micro_jobs_status;
+DROP INDEX CONCURRENTLY IF EXISTS idx_users_telegram_id;
+DROP INDEX CONCURRENTLY IF EXISTS idx_users_refer_code;
@@ -0,0 +1,105 @@
+-- Monthly range partitioning of task_submissions on created_at.
+--
+-- The existing table is attached unchanged as the first partition (all rows
+-- up to the end of the current month) so no data is copied. New months get
+-- their own partitions, created ahead of time by create_task_submission_partitions(),
+-- and old reviewed partitions can be exported and detached by the archival job.
+
+ALTER TABLE task_submissions RENAME TO task_submissions_legacy;
+ALTER TABLE task_submissions_legacy RENAME CONSTRAINT task_submissions_pkey TO task_submissions_legacy_pkey;
+ALTER INDEX IF EXISTS idx_task_submissions_pending RENAME TO idx_task_submissions_legacy_pending;
+ALTER INDEX IF EXISTS idx_task_submissions_user_created RENAME TO idx_task_submissions_legacy_user_created;
+ALTER INDEX IF EXISTS idx_task_submissions_task_id RENAME TO idx_task_submissions_legacy_task_id;
+ALTER INDEX IF EXISTS idx_task_submissions_created_at RENAME TO idx_task_submissions_legacy_created_at;
+
+-- Range partition keys cannot be NULL
+UPDATE task_submissions_legacy SET created_at = COALESCE(reviewed_at, NOW()) WHERE created_at IS NULL;
+ALTER TABLE task_submissions_legacy ALTER COLUMN created_at SET NOT NULL;
+
+CREATE TABLE task_submissions (
+    id INTEGER NOT NULL DEFAULT nextval('task_submissions_id_seq'),
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    task_id VARCHAR(50) NOT NULL,
+    screenshot_url TEXT NOT NULL,
+    status VARCHAR(20) DEFAULT 'pending',
+    admin_review TEXT,
+    amount DECIMAL(10,2) NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    reviewed_at TIMESTAMP,
+    reviewed_by INTEGER,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+ALTER SEQUENCE task_submissions_id_seq OWNED BY task_submissions.id;
+
+-- Registry of partitions exported to disk and detached
+CREATE TABLE IF NOT EXISTS task_submission_archives (
+    partition_name VARCHAR(100) PRIMARY KEY,
+    range_start TIMESTAMP,
+    range_end TIMESTAMP NOT NULL,
+    path TEXT NOT NULL,
+    row_count BIGINT NOT NULL,
+    archived_at TIMESTAMP DEFAULT NOW()
+);
+
+DO $$
+DECLARE
+    legacy_end TIMESTAMP;
+BEGIN
+    SELECT date_trunc('month', GREATEST(MAX(created_at), NOW())) + INTERVAL '1 month'
+    INTO legacy_end
+    FROM task_submissions_legacy;
+
+    -- A validated CHECK lets ATTACH skip its own full-table scan
+    EXECUTE format(
+        'ALTER TABLE task_submissions_legacy ADD CONSTRAINT task_submissions_legacy_range CHECK (created_at < %L)',
+        legacy_end
+    );
+    EXECUTE format(
+        'ALTER TABLE task_submissions ATTACH PARTITION task_submissions_legacy FOR VALUES FROM (MINVALUE) TO (%L)',
+        legacy_end
+    );
+END $$;
+
+-- Same definitions as the 003 index pack; matching indexes on the legacy
+-- partition are attached instead of rebuilt
+CREATE INDEX IF NOT EXISTS idx_task_submissions_pending
+    ON task_submissions (created_at) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_task_submissions_user_created
+    ON task_submissions (user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_task_submissions_task_id
+    ON task_submissions (task_id);
+CREATE INDEX IF NOT EXISTS idx_task_submissions_created_at
+    ON task_submissions (created_at);
+
+-- Create monthly partitions from the current month up to months_ahead.
+-- Months already covered by another partition (the legacy one) are skipped.
+CREATE OR REPLACE FUNCTION create_task_submission_partitions(months_ahead INTEGER DEFAULT 3)
+RETURNS INTEGER AS $$
+DECLARE
+    month_start TIMESTAMP;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    FOR i IN 0..months_ahead LOOP
+        month_start := date_trunc('month', NOW()) + make_interval(months => i);
+        partition_name := 'task_submissions_' || to_char(month_start, '"y"YYYY"m"MM');
+        IF to_regclass(partition_name) IS NOT NULL THEN
+            CONTINUE;
+        END IF;
+        BEGIN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF task_submissions FOR VALUES FROM (%L) TO (%L)',
+                partition_name, month_start, month_start + INTERVAL '1 month'
+            );
+            created := created + 1;
+        EXCEPTION WHEN invalid_object_definition THEN
+            -- Overlaps an existing partition
+            NULL;
+        END;
+    END LOOP;
+    RETURN created;
+END;
+$$ language 'plpgsql';
+
+SELECT create_task_submission_partitions(3);
@@ -0,0 +1,15 @@
+-- Bookkeeping for the in-process job scheduler (backend/utils/scheduler.py).
+-- last_started_at doubles as the de-duplication mark between workers: a job
+-- slot already claimed by another worker is skipped.
+
+CREATE TABLE IF NOT EXISTS scheduled_jobs (
+    name VARCHAR(100) PRIMARY KEY,
+    last_started_at TIMESTAMPTZ,
+    last_finished_at TIMESTAMPTZ,
+    last_duration_ms INTEGER,
+    last_status VARCHAR(20),
+    last_error TEXT,
+    last_worker VARCHAR(200),
+    run_count BIGINT DEFAULT 0,
+    failure_count BIGINT DEFAULT 0
+);
@@ -0,0 +1,49 @@
+-- Replace the user_stats view with a per-user aggregate table.
+--
+-- The view joined task_submissions, withdrawals and referred users at once,
+-- multiplying rows before the GROUP BY. The table is kept current by the
+-- write paths (backend/utils/user_stats.py) and repaired by the periodic
+-- consistency check; the backfill below aggregates each source separately.
+
+DROP VIEW IF EXISTS user_stats;
+
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    total_tasks INTEGER NOT NULL DEFAULT 0,
+    completed_tasks INTEGER NOT NULL DEFAULT 0,
+    total_earned DECIMAL(12,2) NOT NULL DEFAULT 0,
+    withdrawals_count INTEGER NOT NULL DEFAULT 0,
+    referrals_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+INSERT INTO user_stats (user_id, total_tasks, completed_tasks, total_earned, withdrawals_count, referrals_count)
+SELECT
+    u.id,
+    COALESCE(ts.total, 0),
+    COALESCE(ts.completed, 0),
+    COALESCE(ts.earned, 0),
+    COALESCE(w.completed, 0),
+    COALESCE(r.referrals, 0)
+FROM users u
+LEFT JOIN (
+    SELECT user_id,
+           COUNT(*) as total,
+           COUNT(*) FILTER (WHERE status = 'success') as completed,
+           SUM(amount) FILTER (WHERE status = 'success') as earned
+    FROM task_submissions
+    GROUP BY user_id
+) ts ON ts.user_id = u.id
+LEFT JOIN (
+    SELECT user_id, COUNT(*) as completed
+    FROM withdrawals
+    WHERE status = 'completed'
+    GROUP BY user_id
+) w ON w.user_id = u.id
+LEFT JOIN (
+    SELECT referred_by, COUNT(*) as referrals
+    FROM users
+    WHERE referred_by IS NOT NULL
+    GROUP BY referred_by
+) r ON r.referred_by = u.refer_code
+ON CONFLICT (user_id) DO NOTHING;
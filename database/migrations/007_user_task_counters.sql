@@ -0,0 +1,18 @@
+-- Per-user, per-task submission counts by local (Asia/Dhaka) day, maintained
+-- by the submit path. The personalized task feed anti-joins against today's
+-- rows to hide tasks the user has already done daily_limit times.
+
+CREATE TABLE IF NOT EXISTS user_task_counters (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    task_id VARCHAR(50) NOT NULL,
+    submissions INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day, task_id)
+);
+
+INSERT INTO user_task_counters (user_id, day, task_id, submissions)
+SELECT user_id, (created_at::timestamptz AT TIME ZONE 'Asia/Dhaka')::date, task_id, COUNT(*)
+FROM task_submissions
+WHERE created_at >= NOW() - INTERVAL '2 days'
+GROUP BY 1, 2, 3
+ON CONFLICT DO NOTHING;
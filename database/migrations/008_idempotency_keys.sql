@@ -0,0 +1,15 @@
+-- Stored results of mutating requests sent with an Idempotency-Key header.
+-- The first request commits the row with status_code NULL while it runs;
+-- duplicates poll it and replay the stored response once it is filled in.
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key VARCHAR(200) PRIMARY KEY,
+    route VARCHAR(200) NOT NULL,
+    request_hash VARCHAR(64) NOT NULL,
+    status_code INTEGER,
+    content_type VARCHAR(100),
+    response_body BYTEA,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created_at ON idempotency_keys (created_at);
@@ -0,0 +1,37 @@
+-- Durable background job queue (backend/utils/job_queue.py). Workers claim
+-- ready rows with FOR UPDATE SKIP LOCKED and lease them through locked_until;
+-- a worker that dies mid-job just lets the lease run out. Jobs that keep
+-- failing move to job_queue_dead.
+
+CREATE TABLE IF NOT EXISTS job_queue (
+    id BIGSERIAL PRIMARY KEY,
+    kind VARCHAR(100) NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}',
+    -- Lower runs first
+    priority SMALLINT NOT NULL DEFAULT 100,
+    run_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    locked_until TIMESTAMPTZ,
+    locked_by VARCHAR(200),
+    last_error TEXT,
+    -- Optional; a second enqueue with the same key is dropped
+    dedupe_key VARCHAR(200) UNIQUE,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_job_queue_ready ON job_queue (priority, run_at);
+
+CREATE TABLE IF NOT EXISTS job_queue_dead (
+    id BIGINT PRIMARY KEY,
+    kind VARCHAR(100) NOT NULL,
+    payload JSONB NOT NULL,
+    priority SMALLINT NOT NULL,
+    attempts INTEGER NOT NULL,
+    last_error TEXT,
+    dedupe_key VARCHAR(200),
+    created_at TIMESTAMPTZ NOT NULL,
+    failed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_job_queue_dead_kind ON job_queue_dead (kind, failed_at DESC);
@@ -0,0 +1,27 @@
+-- migrate: no-transaction
+-- Referral bonus settlement (backend/utils/referrals.py). One bonus per
+-- (referrer, referred) pair, found by walking completed withdrawals in
+-- processed_at order from a stored watermark.
+
+DELETE FROM referral_bonuses b
+USING referral_bonuses keep
+WHERE b.referrer_id = keep.referrer_id
+  AND b.referred_id = keep.referred_id
+  AND b.id > keep.id;
+
+-- Settlement walks processed_at; older completed rows may predate it being set
+UPDATE withdrawals SET processed_at = created_at
+WHERE status = 'completed' AND processed_at IS NULL;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_referral_bonuses_pair
+    ON referral_bonuses (referrer_id, referred_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_withdrawals_completed_processed
+    ON withdrawals (processed_at, id) WHERE status = 'completed';
+
+CREATE TABLE IF NOT EXISTS settlement_watermarks (
+    name VARCHAR(50) PRIMARY KEY,
+    last_processed_at TIMESTAMP NOT NULL,
+    last_id INTEGER NOT NULL,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
@@ -0,0 +1,12 @@
+-- Garbage collection of screenshots in Cloudinary (backend/utils/storage_gc.py).
+-- screenshot_deleted_at is set once a submission's image is gone, so the
+-- partial index only holds screenshots still to be collected and an
+-- interrupted run picks up where it stopped.
+--
+-- CONCURRENTLY isn't supported on a partitioned table; the build takes a
+-- write lock on each partition in turn.
+
+ALTER TABLE task_submissions ADD COLUMN IF NOT EXISTS screenshot_deleted_at TIMESTAMP;
+
+CREATE INDEX IF NOT EXISTS idx_task_submissions_screenshot_gc
+    ON task_submissions (status, created_at, id) WHERE screenshot_deleted_at IS NULL;
@@ -0,0 +1,7 @@
+-- Review leases: POST /api/admin/submissions/claim hands each reviewer the
+-- next pending submissions and records who holds them until when. Expired
+-- leases are claimable again; reviews are accepted only from the holder.
+-- Claims walk idx_task_submissions_pending, so no new index is needed.
+
+ALTER TABLE task_submissions ADD COLUMN IF NOT EXISTS claimed_by VARCHAR(100);
+ALTER TABLE task_submissions ADD COLUMN IF NOT EXISTS claimed_until TIMESTAMP;
@@ -0,0 +1,11 @@
+-- Request counters for backend/utils/rate_limit.py: one row per key and
+-- fixed window, shared by all workers. UNLOGGED: no WAL, not replicated and
+-- emptied after a crash, which for rate limits only means a fresh start.
+-- The purge_rate_limits job drops windows older than an hour.
+
+CREATE UNLOGGED TABLE IF NOT EXISTS rate_limit_counters (
+    key VARCHAR(200) NOT NULL,
+    window_start BIGINT NOT NULL,
+    hits INTEGER NOT NULL,
+    PRIMARY KEY (key, window_start)
+);
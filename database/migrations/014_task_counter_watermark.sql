@@ -0,0 +1,10 @@
+-- Incremental task submission counters (refresh_task_counters in
+-- backend/jobs.py). settled_submissions holds each task's submissions
+-- created before the 'task_counters' watermark in settlement_watermarks;
+-- every run adds the submissions between the old and new watermark and
+-- only recounts rows newer than that, instead of scanning the whole table.
+--
+-- The first run after this migration finds no watermark, starts from the
+-- epoch and settles the full history once.
+
+ALTER TABLE micro_jobs ADD COLUMN IF NOT EXISTS settled_submissions INTEGER NOT NULL DEFAULT 0;
@@ -0,0 +1,68 @@
+-- DEFAULT partition for task_submissions, so a submission whose month has no
+-- partition yet (ensure_partitions not run, clock skew) is stored instead of
+-- failing with "no partition of relation found for row".
+--
+-- A note on 004, which partitioned the table: it runs in one transaction
+-- and its first statement, the RENAME, takes ACCESS EXCLUSIVE on the
+-- original table. That lock is held to COMMIT, so task_submissions can't be
+-- read or written for the whole migration, which includes:
+--   * SET NOT NULL on created_at: a full scan;
+--   * the validated CHECK constraint: another full scan. It spares ATTACH
+--     a scan of its own, but it doesn't shorten the lock window;
+--   * ATTACH PARTITION: the parent's PRIMARY KEY (id, created_at) has no
+--     matching index on the old table (its key is id alone), so a new
+--     unique index on (id, created_at) is built over every row. The other
+--     four indexes match the 003 ones and are attached without a rebuild.
+-- Expect the outage to be about two sequential scans plus one index build
+-- of the table as it was then; run 004 in a maintenance window.
+--
+-- create_task_submission_partitions() now builds each month as a standalone
+-- table, moves in any rows of that month sitting in the default partition
+-- and then attaches it. Writes to the default partition wait while a month
+-- is moved out of it. ensure_partitions logs an error while the default
+-- partition holds rows no monthly partition will take.
+
+CREATE TABLE IF NOT EXISTS task_submissions_default PARTITION OF task_submissions DEFAULT;
+
+CREATE OR REPLACE FUNCTION create_task_submission_partitions(months_ahead INTEGER DEFAULT 3)
+RETURNS INTEGER AS $$
+DECLARE
+    month_start TIMESTAMP;
+    month_end TIMESTAMP;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    FOR i IN 0..months_ahead LOOP
+        month_start := date_trunc('month', NOW()) + make_interval(months => i);
+        month_end := month_start + INTERVAL '1 month';
+        partition_name := 'task_submissions_' || to_char(month_start, '"y"YYYY"m"MM');
+        IF to_regclass(partition_name) IS NOT NULL THEN
+            CONTINUE;
+        END IF;
+        BEGIN
+            EXECUTE format(
+                'CREATE TABLE %I (LIKE task_submissions INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                partition_name
+            );
+            -- Keep new rows for this month out of the default partition
+            -- until the month's own partition is attached
+            LOCK TABLE task_submissions_default IN EXCLUSIVE MODE;
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM task_submissions_default WHERE created_at >= %L AND created_at < %L RETURNING *) '
+                'INSERT INTO %I SELECT * FROM moved',
+                month_start, month_end, partition_name
+            );
+            EXECUTE format(
+                'ALTER TABLE task_submissions ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                partition_name, month_start, month_end
+            );
+            created := created + 1;
+        EXCEPTION WHEN invalid_object_definition THEN
+            -- Overlaps an existing partition; the table and any moved rows
+            -- are rolled back with the block
+            NULL;
+        END;
+    END LOOP;
+    RETURN created;
+END;
+$$ language 'plpgsql';
@@ -0,0 +1,14 @@
+-- Per-user submission totals of task_submissions partitions that have been
+-- archived (exported and detached by backend/utils/partitions.py). The
+-- user_stats consistency check adds these to what it counts in the live
+-- partitions, so archiving doesn't look like lost history to it.
+--
+-- Partitions archived before this table existed are not in it; rebuild it
+-- from the exports with `python -m backend.utils.partitions rebuild-stats`.
+
+CREATE TABLE IF NOT EXISTS user_stats_archived (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    total_tasks INTEGER NOT NULL DEFAULT 0,
+    completed_tasks INTEGER NOT NULL DEFAULT 0,
+    total_earned DECIMAL(12,2) NOT NULL DEFAULT 0
+);
@@ -0,0 +1,84 @@
+"""
+Build the Mini App for serving from the backend.
+
+Copies frontend/ into frontend/dist/ with script.js and style.css renamed
+to content-hashed names under assets/ (so they can be cached forever), the
+HTML rewritten to reference them, and .gz/.br siblings for every text file:
+
+    python frontend/build.py
+
+Brotli output needs the optional `brotli` package; without it only gzip
+variants are written.
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+FRONTEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DIST_DIR = os.path.join(FRONTEND_DIR, "dist")
+
+ASSETS = ["script.js", "style.css"]
+PAGES = ["index.html"] + [os.path.join("pages", name) for name in sorted(os.listdir(os.path.join(FRONTEND_DIR, "pages")))]
+
+# Files smaller than this are not worth a compressed variant
+MIN_COMPRESS_SIZE = 256
+
+
+def fingerprint(name: str, content: bytes) -> str:
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:10]}{ext}"
+
+
+def write(path: str, content: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+    if len(content) < MIN_COMPRESS_SIZE:
+        return
+    # mtime=0 keeps the .gz bytes identical between builds of the same input
+    with open(path + ".gz", "wb") as f:
+        f.write(gzip.compress(content, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(brotli.compress(content, quality=11))
+
+
+def build():
+    if os.path.isdir(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+
+    manifest = {}
+    for name in ASSETS:
+        with open(os.path.join(FRONTEND_DIR, name), "rb") as f:
+            content = f.read()
+        hashed = "assets/" + fingerprint(name, content)
+        write(os.path.join(DIST_DIR, hashed), content)
+        manifest[name] = hashed
+
+    for page in PAGES:
+        with open(os.path.join(FRONTEND_DIR, page), "r", encoding="utf-8") as f:
+            html = f.read()
+        # Pages under pages/ reference assets one directory up
+        prefix = "../" * page.count(os.sep)
+        for name, hashed in manifest.items():
+            html = html.replace(f'"{name}"', f'"{prefix}{hashed}"')
+        write(os.path.join(DIST_DIR, page), html.encode("utf-8"))
+
+    with open(os.path.join(DIST_DIR, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    for name, hashed in manifest.items():
+        print(f"{name:12} -> {hashed}")
+    if brotli is None:
+        print("brotli not installed; wrote gzip variants only")
+
+
+if __name__ == "__main__":
+    build()
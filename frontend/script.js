@@ -8,6 +8,8 @@ let currentPage = 'home';
 let selectedTask = null;
 let selectedWithdrawalAmount = null;
 let selectedWithdrawalMethod = null;
+let bootstrapData = null;
+let bootstrapEtag = null;
 
 // Initialize Telegram Web App
 const tg = window.Telegram.WebApp;
@@ -81,6 +83,36 @@ async function registerUser(telegramUser) {
     }
 }
 
+// Key for one user action; the backend replays the first response to retries
+// that carry the same Idempotency-Key instead of running them again.
+function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+}
+
+// Load user, balances, tasks, referrals and recent activity in one request.
+// Revalidates with the last ETag, so unchanged data costs an empty 304.
+async function getBootstrap() {
+    const headers = bootstrapEtag ? {'If-None-Match': bootstrapEtag} : {};
+    const response = await fetch(`${API_URL}/api/bootstrap/${currentUser.id}`, {
+        headers,
+        cache: 'no-store'
+    });
+    
+    if (response.status === 304 && bootstrapData) {
+        return bootstrapData;
+    }
+    if (!response.ok) {
+        throw new Error('Failed to load account data');
+    }
+    
+    bootstrapEtag = response.headers.get('ETag');
+    bootstrapData = await response.json();
+    return bootstrapData;
+}
+
 // Update balance display
 function updateBalance(balance) {
     document.getElementById('userBalance').textContent = `৳${balance.toFixed(2)}`;
@@ -127,9 +159,7 @@ function getNavIndex(page) {
 // Load Home Page
 async function loadHomePage(container) {
     try {
-        // Get user stats
-        const response = await fetch(`${API_URL}/api/user/${currentUser.id}`);
-        const data = await response.json();
+        const data = await getBootstrap();
         
         container.innerHTML = `
             <div class="welcome-section">
@@ -201,8 +231,7 @@ async function loadHomePage(container) {
 // Load Tasks Page
 async function loadTasksPage(container) {
     try {
-        const response = await fetch(`${API_URL}/api/tasks`);
-        const tasks = await response.json();
+        const { tasks } = await getBootstrap();
         
         if (tasks.length === 0) {
             container.innerHTML = `
@@ -298,13 +327,15 @@ async function uploadScreenshot() {
         // Upload to backend
         const uploadResponse = await fetch(`${API_URL}/api/upload-screenshot`, {
             method: 'POST',
+            // Multipart bodies aren't parsed for rate limiting; identify the user here
+            headers: {'X-Telegram-Id': currentUser.id},
             body: formData
         });
         
         const uploadResult = await uploadResponse.json();
         
         if (!uploadResult.success) {
-            throw new Error(uploadResult.error || 'Upload failed');
+            throw new Error(uploadResult.error || uploadResult.detail || 'Upload failed');
         }
         
         uploadProgress.innerHTML = '✅ Uploaded! Submitting task...';
@@ -314,6 +345,7 @@ async function uploadScreenshot() {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/x-www-form-urlencoded',
+                'Idempotency-Key': newIdempotencyKey(),
             },
             body: new URLSearchParams({
                 telegram_id: currentUser.id,
@@ -343,10 +375,9 @@ async function uploadScreenshot() {
 // Load Referral Page
 async function loadReferPage(container) {
     try {
-        const response = await fetch(`${API_URL}/api/user/${currentUser.id}/referrals`);
-        const data = await response.json();
+        const data = await getBootstrap();
         
-        const referralCode = data.user?.refer_code || `DVT-${currentUser.id}`;
+        const referralCode = data.referrals?.refer_code || `DVT-${currentUser.id}`;
         const referralLink = `https://t.me/digitalvishon_1235bot?start=${referralCode}`;
         
         container.innerHTML = `
@@ -357,15 +388,15 @@ async function loadReferPage(container) {
             
             <div class="referral-stats">
                 <div class="stat-card">
-                    <div class="stat-value">${data.stats?.total_referrals || 0}</div>
+                    <div class="stat-value">${data.referrals?.total_referrals || 0}</div>
                     <div class="stat-label">Total Referrals</div>
                 </div>
                 <div class="stat-card">
-                    <div class="stat-value">${data.stats?.active_referrals || 0}</div>
+                    <div class="stat-value">${data.referrals?.active_referrals || 0}</div>
                     <div class="stat-label">Active Referrals</div>
                 </div>
                 <div class="stat-card">
-                    <div class="stat-value">৳${(data.stats?.total_bonus_earned || 0).toFixed(2)}</div>
+                    <div class="stat-value">৳${(data.referrals?.total_bonus_earned || 0).toFixed(2)}</div>
                     <div class="stat-label">Bonus Earned</div>
                 </div>
             </div>
@@ -459,8 +490,7 @@ function shareToOthers() {
 // Load Withdrawal Page
 async function loadWithdrawPage(container) {
     try {
-        const response = await fetch(`${API_URL}/api/user/${currentUser.id}`);
-        const userData = await response.json();
+        const userData = await getBootstrap();
         
         const cashWallet = userData.user?.cash_wallet || 0;
         
@@ -699,6 +729,7 @@ async function submitWithdrawal() {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
+                'Idempotency-Key': newIdempotencyKey(),
             },
             body: JSON.stringify({
                 amount: selectedWithdrawalAmount,
@@ -730,8 +761,7 @@ async function submitWithdrawal() {
 // Load Profile Page
 async function loadProfilePage(container) {
     try {
-        const response = await fetch(`${API_URL}/api/user/${currentUser.id}`);
-        const data = await response.json();
+        const data = await getBootstrap();
         
         container.innerHTML = `
             <div class="page-header">
@@ -795,7 +825,7 @@ async function loadProfilePage(container) {
                     <div class="stat-label">Referrals</div>
                 </div>
                 <div class="stat-card">
-                    <div class="stat-value">৳${(data.stats?.total_bonus_earned || 0).toFixed(2)}</div>
+                    <div class="stat-value">৳${(data.referrals?.total_bonus_earned || 0).toFixed(2)}</div>
                     <div class="stat-label">Referral Bonus</div>
                 </div>
             </div>
@@ -821,9 +851,8 @@ async function loadRecentActivities() {
     try {
         const container = document.getElementById('recentActivities');
         
-        // Get user's recent task submissions
-        const response = await fetch(`${API_URL}/api/tasks/user/${currentUser.id}/submissions`);
-        const submissions = await response.json();
+        // Recent task submissions come with the bootstrap payload
+        const { submissions } = await getBootstrap();
         
         if (submissions.length === 0) {
             container.innerHTML = '<p>No recent activity</p>';
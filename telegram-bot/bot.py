@@ -3,6 +3,11 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
 import requests
 import os
+import json
+import select
+import threading
+import asyncio
+import psycopg2
 from datetime import datetime
 
 # Enable logging
@@ -16,6 +21,10 @@ logger = logging.getLogger(__name__)
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "8506336833:AAHqTala7chpEiJJ2W1s6lSN5qgwdJpC5b8")
 ADMIN_ID = int(os.getenv("TELEGRAM_ADMIN_ID", "6561117046"))
 BACKEND_URL = os.getenv("BACKEND_URL", "https://dvt-backend.onrender.com")
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+# Channel the backend publishes events on (backend/utils/events.py)
+EVENTS_CHANNEL = "dvt_events"
 
 # Start command
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -103,10 +112,11 @@ async def admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 # Withdrawal notification
-async def notify_withdrawal_request(user_id: int, amount: float, method: str, account: str):
+async def notify_withdrawal_request(user_id: int, amount: float, method: str, account: str, bot=None):
     """Send notification to admin about new withdrawal request"""
     try:
-        app = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+        if bot is None:
+            bot = Application.builder().token(TELEGRAM_BOT_TOKEN).build().bot
         
         message = (
             "💰 New Withdrawal Request\n\n"
@@ -117,7 +127,7 @@ async def notify_withdrawal_request(user_id: int, amount: float, method: str, ac
             f"⏰ Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
         )
         
-        await app.bot.send_message(
+        await bot.send_message(
             chat_id=ADMIN_ID,
             text=message,
             reply_markup=InlineKeyboardMarkup([
@@ -128,6 +138,76 @@ async def notify_withdrawal_request(user_id: int, amount: float, method: str, ac
     except Exception as e:
         logger.error(f"Error sending withdrawal notification: {e}")
 
+# Withdrawal listener
+def fetch_pending_withdrawals(cur, after_id: int):
+    cur.execute("""
+        SELECT w.id, w.amount, w.method, w.account_number, u.telegram_id
+        FROM withdrawals w
+        JOIN users u ON w.user_id = u.id
+        WHERE w.id > %s AND w.status = 'pending'
+        ORDER BY w.id
+    """, (after_id,))
+    return cur.fetchall()
+
+def listen_for_withdrawals(application: Application, loop):
+    """
+    Notify the admin about new withdrawals as the backend publishes them.
+    Runs on its own thread with one LISTEN connection; after a reconnect it
+    catches up on withdrawals requested while it was disconnected.
+    """
+    last_id = None
+    backoff = 1
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(DATABASE_URL)
+            conn.autocommit = True
+            cur = conn.cursor()
+            cur.execute(f"LISTEN {EVENTS_CHANNEL}")
+            backoff = 1
+            
+            if last_id is None:
+                cur.execute("SELECT COALESCE(MAX(id), 0) FROM withdrawals")
+                last_id = cur.fetchone()[0]
+            
+            pending = fetch_pending_withdrawals(cur, last_id)
+            while True:
+                for wd_id, amount, method, account, telegram_id in pending:
+                    asyncio.run_coroutine_threadsafe(
+                        notify_withdrawal_request(telegram_id, amount, method, account, bot=application.bot),
+                        loop
+                    )
+                    last_id = max(last_id, wd_id)
+                
+                if select.select([conn], [], [], 30) == ([], [], []):
+                    cur.execute("SELECT 1")
+                    pending = []
+                    continue
+                conn.poll()
+                created = False
+                while conn.notifies:
+                    event = json.loads(conn.notifies.pop(0).payload)
+                    created = created or event.get("type") == "withdrawal_created"
+                pending = fetch_pending_withdrawals(cur, last_id) if created else []
+        except Exception as e:
+            logger.error(f"Withdrawal listener error: {e}; reconnecting in {backoff}s")
+            threading.Event().wait(backoff)
+            backoff = min(backoff * 2, 60)
+        finally:
+            if conn is not None:
+                conn.close()
+
+async def start_withdrawal_listener(application: Application):
+    if not DATABASE_URL:
+        logger.warning("DATABASE_URL not set; withdrawal notifications disabled")
+        return
+    threading.Thread(
+        target=listen_for_withdrawals,
+        args=(application, asyncio.get_running_loop()),
+        name="withdrawal-listener",
+        daemon=True
+    ).start()
+
 # Callback query handler
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -198,7 +278,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # Main function
 def main():
     # Create application
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    application = Application.builder().token(TELEGRAM_BOT_TOKEN).post_init(start_withdrawal_listener).build()
     
     # Add handlers
     application.add_handler(CommandHandler("start", start))